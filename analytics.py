@@ -0,0 +1,290 @@
+"""
+Análises de progresso sobre o histórico de séries (workout_sets).
+
+Para cada aluno calcula:
+- tendência do 1RM estimado: melhor 1RM de cada exercício por semana ISO e a
+  inclinação da reta (kg por semana);
+- tonelagem semanal (repetições x carga);
+- equilíbrio entre grupos musculares (fração das séries de cada grupo, segundo
+  master_exercises.muscle_group);
+- recordes pessoais: séries cujo 1RM estimado supera todas as anteriores do
+  mesmo exercício.
+
+O histórico é carregado em lote, uma coluna por array, e as métricas são
+calculadas com operações vetorizadas do NumPy, sem laços por série. O mesmo
+cálculo serve para um aluno (member_report) ou para todos (batch_report, usado
+nos relatórios noturnos, que processa os alunos em faixas de ids).
+
+O NumPy é opcional: sem ele, as mesmas métricas são calculadas pela
+implementação linha a linha (compute_metrics_naive), bem mais lenta, que também
+é a referência do benchmark em benchmarks/bench_analytics.py.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import database
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional
+    np = None
+
+SECONDS_PER_DAY = 86400
+# 1970-01-01 foi uma quinta-feira: (dia + 3) // 7 numera as semanas de segunda a domingo
+_EPOCH_MONDAY = datetime(1969, 12, 29, tzinfo=timezone.utc)
+OTHER_GROUP = "Outros"
+
+# Séries carregadas do banco, uma sequência por coluna (arrays do NumPy, se disponível)
+TrainingColumns = namedtuple("TrainingColumns", ["user_id", "master_exercise_id", "reps", "load_kg", "performed_at"])
+
+PersonalRecord = namedtuple(
+    "PersonalRecord", ["master_exercise_id", "performed_at", "reps", "load_kg", "estimated_1rm", "previous_best"]
+)
+
+_week_labels = {}
+
+
+def week_label(week_number):
+    """Semana ISO ('AAAA-Www') do número de semana usado internamente."""
+    label = _week_labels.get(week_number)
+    if label is None:
+        label = _week_labels[week_number] = database.iso_week(_EPOCH_MONDAY + timedelta(weeks=int(week_number)))
+    return label
+
+
+def _timestamp_text(seconds):
+    return datetime.fromtimestamp(int(seconds), timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _muscle_groups():
+    """(nomes dos grupos em ordem, mapa master_exercise_id -> índice do grupo)."""
+    catalog = database.get_all_master_exercises()
+    groups = sorted(catalog) + [OTHER_GROUP]
+    code_by_id = {ex.master_exercise_id: code for code, group in enumerate(groups[:-1]) for ex in catalog[group]}
+    return groups, code_by_id
+
+
+# --- Carga ---
+
+def load_columns(first_user_id, last_user_id, since=None):
+    """Carrega o histórico de uma faixa de usuários como TrainingColumns."""
+    columns = database.get_workout_set_columns(first_user_id, last_user_id, since)
+    if np is None:
+        return TrainingColumns(*columns)
+    user_id, master_exercise_id, reps, load_kg, performed_at = columns
+    return TrainingColumns(
+        np.array(user_id, dtype=np.int64),
+        np.array(master_exercise_id, dtype=np.int64),
+        np.array(reps, dtype=np.float64),
+        np.array(load_kg, dtype=np.float64),
+        np.array(performed_at, dtype=np.int64),
+    )
+
+
+# --- Implementação vetorizada ---
+
+def _group_boundaries(sorted_keys):
+    """Índices onde começa cada grupo de chaves iguais em um array ordenado."""
+    if len(sorted_keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+
+
+def compute_metrics(columns):
+    """
+    Calcula as métricas de todos os usuários presentes em `columns` (ordenadas
+    por usuário e data, como em load_columns). Retorna {user_id: métricas}.
+    """
+    if np is None:
+        return compute_metrics_naive(columns)
+    if len(columns.user_id) == 0:
+        return {}
+
+    groups, code_by_id = _muscle_groups()
+    user_id, master, reps, load, performed_at = columns
+
+    e1rm = np.where(reps == 1, load, load * (1 + reps / 30))
+    tonnage = reps * load
+    week = (performed_at // SECONDS_PER_DAY + 3) // 7
+
+    users, user_idx = np.unique(user_id, return_inverse=True)
+    n_users = len(users)
+
+    # Tonelagem por (usuário, semana)
+    weeks, week_idx = np.unique(week, return_inverse=True)
+    user_week, user_week_idx = np.unique(user_idx * len(weeks) + week_idx, return_inverse=True)
+    weekly_tonnage = np.bincount(user_week_idx, weights=tonnage)
+    weekly_user = user_week // len(weeks)
+
+    # Equilíbrio muscular: fração das séries por grupo
+    lookup = np.full(int(master.max()) + 1, len(groups) - 1, dtype=np.int64)
+    for master_exercise_id, code in code_by_id.items():
+        if master_exercise_id < len(lookup):
+            lookup[master_exercise_id] = code
+    group_code = lookup[master]
+    group_sets = np.bincount(user_idx * len(groups) + group_code, minlength=n_users * len(groups))
+    group_sets = group_sets.reshape(n_users, len(groups)).astype(np.float64)
+    balance = group_sets / group_sets.sum(axis=1, keepdims=True)
+
+    # Melhor 1RM por (usuário, exercício, semana) e inclinação por (usuário, exercício)
+    user_exercise, user_exercise_idx = np.unique(user_idx * (len(lookup)) + master, return_inverse=True)
+    cell_key = user_exercise_idx * len(weeks) + week_idx
+    order = np.argsort(cell_key, kind="stable")
+    sorted_cells = cell_key[order]
+    starts = _group_boundaries(sorted_cells)
+    cell_best = np.maximum.reduceat(e1rm[order], starts)
+    cell_user_exercise = sorted_cells[starts] // len(weeks)
+    cell_week = weeks[sorted_cells[starts] % len(weeks)].astype(np.float64)
+
+    n = np.bincount(cell_user_exercise, minlength=len(user_exercise)).astype(np.float64)
+    sx = np.bincount(cell_user_exercise, weights=cell_week, minlength=len(user_exercise))
+    sy = np.bincount(cell_user_exercise, weights=cell_best, minlength=len(user_exercise))
+    sxy = np.bincount(cell_user_exercise, weights=cell_week * cell_best, minlength=len(user_exercise))
+    sxx = np.bincount(cell_user_exercise, weights=cell_week * cell_week, minlength=len(user_exercise))
+    denominator = n * sxx - sx * sx
+    slope = np.divide(n * sxy - sx * sy, denominator, out=np.zeros_like(denominator), where=denominator != 0)
+
+    # Recordes: 1RM acima do máximo acumulado das séries anteriores do mesmo exercício.
+    # Somar um deslocamento crescente por grupo permite um único maximum.accumulate global.
+    order = np.lexsort((performed_at, user_exercise_idx))
+    group = user_exercise_idx[order]
+    values = e1rm[order]
+    offset = group * (float(values.max()) + 1)
+    running_best = np.maximum.accumulate(values + offset) - offset
+    previous_best = np.r_[np.nan, running_best[:-1]]
+    first_of_group = np.r_[True, group[1:] != group[:-1]]
+    is_record = ~first_of_group & (values > previous_best + 1e-9)
+    record_rows = order[is_record]
+
+    # --- Montagem do resultado ---
+    # Tudo está ordenado por usuário (e exercício), então cada aluno é uma fatia
+    # contígua dos arrays; os valores são convertidos fatia a fatia com tolist().
+    labels = np.array([week_label(week_number) for week_number in weeks.tolist()], dtype=object)
+    user_range = np.arange(n_users + 1)
+    tonnage_bounds = np.searchsorted(weekly_user, user_range).tolist()
+    tonnage_labels = labels[user_week % len(weeks)]
+
+    trend_user_idx = user_exercise // len(lookup)
+    trend_master = (user_exercise % len(lookup)).tolist()
+    trend_bounds = np.searchsorted(trend_user_idx, user_range).tolist()
+    cell_bounds = np.searchsorted(cell_user_exercise, np.arange(len(user_exercise) + 1)).tolist()
+    cell_labels = labels[sorted_cells[starts] % len(weeks)]
+    slope_values = slope.tolist()
+
+    record_user_idx = user_idx[record_rows]
+    record_bounds = np.searchsorted(record_user_idx, user_range).tolist()
+    record_times = np.char.replace(
+        np.datetime_as_string(performed_at[record_rows].astype("datetime64[s]"), unit="s").astype(str), "T", " "
+    )
+    record_columns = list(zip(
+        master[record_rows].tolist(), record_times.tolist(), reps[record_rows].astype(np.int64).tolist(),
+        load[record_rows].tolist(), e1rm[record_rows].tolist(), previous_best[is_record].tolist(),
+    ))
+
+    results = {}
+    for position, uid in enumerate(users.tolist()):
+        start, stop = tonnage_bounds[position], tonnage_bounds[position + 1]
+        weekly = list(zip(tonnage_labels[start:stop].tolist(), weekly_tonnage[start:stop].tolist()))
+
+        trends = {}
+        for index in range(trend_bounds[position], trend_bounds[position + 1]):
+            first, last = cell_bounds[index], cell_bounds[index + 1]
+            trends[trend_master[index]] = {
+                "weeks": cell_labels[first:last].tolist(),
+                "best_e1rm": cell_best[first:last].tolist(),
+                "slope_kg_per_week": slope_values[index],
+            }
+
+        shares = balance[position]
+        records = record_columns[record_bounds[position]:record_bounds[position + 1]]
+        results[uid] = {
+            "weekly_tonnage": weekly,
+            "e1rm_trends": trends,
+            "muscle_balance": {groups[code]: share for code, share in enumerate(shares.tolist()) if share > 0},
+            "personal_records": [PersonalRecord._make(record) for record in records],
+        }
+    return results
+
+
+# --- Implementação linha a linha (referência e alternativa sem NumPy) ---
+
+def compute_metrics_naive(columns):
+    """Mesmas métricas de compute_metrics, percorrendo as séries uma a uma."""
+    groups, code_by_id = _muscle_groups()
+    results = {}
+    state = {}
+
+    for uid, master_exercise_id, reps, load_kg, performed_at in zip(*columns):
+        uid, master_exercise_id, reps = int(uid), int(master_exercise_id), int(reps)
+        load_kg, performed_at = float(load_kg), int(performed_at)
+        user_state = state.get(uid)
+        if user_state is None:
+            user_state = state[uid] = {"tonnage": {}, "group_sets": {}, "cells": {}, "best": {}, "records": []}
+
+        e1rm = database.estimated_1rm(reps, load_kg)
+        week = (performed_at // SECONDS_PER_DAY + 3) // 7
+        user_state["tonnage"][week] = user_state["tonnage"].get(week, 0.0) + reps * load_kg
+
+        group = groups[code_by_id.get(master_exercise_id, len(groups) - 1)]
+        user_state["group_sets"][group] = user_state["group_sets"].get(group, 0) + 1
+
+        cell = (master_exercise_id, week)
+        if e1rm > user_state["cells"].get(cell, -1.0):
+            user_state["cells"][cell] = e1rm
+
+        previous = user_state["best"].get(master_exercise_id)
+        if previous is not None and e1rm > previous + 1e-9:
+            user_state["records"].append(PersonalRecord(
+                master_exercise_id, _timestamp_text(performed_at), reps, load_kg, e1rm, previous,
+            ))
+        if previous is None or e1rm > previous:
+            user_state["best"][master_exercise_id] = e1rm
+
+    for uid in sorted(state):
+        user_state = state[uid]
+        total_sets = sum(user_state["group_sets"].values())
+        trends = {}
+        for (master_exercise_id, week), best in sorted(user_state["cells"].items()):
+            trend = trends.setdefault(master_exercise_id, {"weeks": [], "best_e1rm": [], "_x": []})
+            trend["weeks"].append(week_label(week))
+            trend["best_e1rm"].append(best)
+            trend["_x"].append(float(week))
+        for trend in trends.values():
+            xs, ys = trend.pop("_x"), trend["best_e1rm"]
+            n = len(xs)
+            sx, sy = sum(xs), sum(ys)
+            sxy = sum(x * y for x, y in zip(xs, ys))
+            sxx = sum(x * x for x in xs)
+            denominator = n * sxx - sx * sx
+            trend["slope_kg_per_week"] = (n * sxy - sx * sy) / denominator if denominator else 0.0
+
+        results[uid] = {
+            "weekly_tonnage": [(week_label(week), total) for week, total in sorted(user_state["tonnage"].items())],
+            "e1rm_trends": trends,
+            "muscle_balance": {
+                group: count / total_sets for group, count in sorted(user_state["group_sets"].items(), key=lambda item: groups.index(item[0]))
+            },
+            "personal_records": sorted(user_state["records"], key=lambda record: record.master_exercise_id),
+        }
+    return results
+
+
+# --- Relatórios ---
+
+def member_report(user_id, since=None):
+    """Métricas de um aluno (ou None se ele não tiver séries registradas)."""
+    return compute_metrics(load_columns(user_id, user_id, since)).get(user_id)
+
+
+def batch_report(chunk_size=1000, since=None):
+    """
+    Métricas de todos os alunos, para relatórios noturnos. Processa faixas de
+    `chunk_size` ids por vez (memória limitada) e gera pares (user_id, métricas).
+    """
+    first_user_id, last_user_id = database.get_workout_set_user_range()
+    if first_user_id is None:
+        return
+    for start in range(first_user_id, last_user_id + 1, chunk_size):
+        metrics = compute_metrics(load_columns(start, start + chunk_size - 1, since))
+        for user_id in sorted(metrics):
+            yield user_id, metrics[user_id]
@@ -0,0 +1,504 @@
+"""
+Serviço HTTP/JSON local sobre a camada de dados, para quiosques dos
+professores, o app móvel e os relatórios.
+
+Roda sozinho (sem o Flet) em cima de asyncio.start_server: as consultas vão
+para o executor de async_database, que usa o pool de conexões de database.py,
+e o hash das senhas para o pool de processos de password_hashing.
+
+HTTP/1.1 com keep-alive e pipelining: as requisições de uma conexão são lidas
+em sequência e atendidas em paralelo, mas as respostas saem na ordem em que
+chegaram. Uma requisição que escreve (POST/PUT) espera as anteriores terminarem,
+e as seguintes esperam por ela. Catálogo e fichas respondem com ETag e aceitam
+If-None-Match (304); corpos grandes vão com gzip se o cliente aceitar.
+
+Rotas (autenticação por "Authorization: Bearer <token>", exceto login e health):
+    POST /api/login              {"identifier": ..., "password": ...} -> {"token", "user_id"}
+    POST /api/logout
+    GET  /api/workouts           fichas do usuário, com a contagem de exercícios
+    GET  /api/workouts/<id>      exercícios de uma ficha
+    PUT  /api/workouts/<id>      {"title": ..., "exercises": [{"user_exercise_id", "master_exercise_id", "series"}]}
+    GET  /api/exercises[?q=...]  catálogo agrupado por músculo, ou busca
+    GET  /api/health
+    GET  /metrics                formato Prometheus, com CHAMPS_DB_INSTRUMENTATION ligado
+
+Uso (a partir da raiz do repositório):
+    python -m api_server [--host 127.0.0.1] [--port 8765] [--db champs_gym.db] [--pool-size 8]
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import re
+from collections import namedtuple
+from urllib.parse import parse_qs, urlsplit
+
+import async_database
+import auth
+import database
+import db_instrumentation
+import password_hashing
+import session_tokens
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+MAX_HEADER_LINES = 100
+MAX_BODY_BYTES = 1024 * 1024
+MAX_PIPELINED = 32            # requisições em andamento por conexão
+KEEP_ALIVE_TIMEOUT = 15.0     # segundos de conexão ociosa antes de fechar
+GZIP_MIN_BYTES = 1024         # corpos menores não compensam a compressão
+GZIP_LEVEL = 6
+
+REASONS = {
+    200: "OK", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+    405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error", 501: "Not Implemented",
+}
+
+SAFE_METHODS = ("GET", "HEAD")
+
+Request = namedtuple("Request", ["method", "path", "query", "version", "headers", "body"])
+
+# Resposta de um handler; `gzipped` é o corpo já comprimido, quando vem de um cache
+Response = namedtuple("Response", ["status", "body", "etag", "content_type", "gzipped"])
+Response.__new__.__defaults__ = (None, "application/json; charset=utf-8", None)
+
+
+class HttpError(Exception):
+    """Erro que vira uma resposta JSON {"error": message} com o status informado."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _dumps(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _etag(body):
+    # ETag fraca: vale para o conteúdo, com ou sem gzip
+    return f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+
+def json_response(payload, status=200, with_etag=False):
+    body = _dumps(payload)
+    return Response(status, body, _etag(body) if with_etag else None)
+
+
+def error_response(status, message):
+    return json_response({"error": message}, status)
+
+
+# --- Leitura das requisições ---
+
+async def read_request(reader):
+    """Lê uma requisição da conexão; retorna None se o cliente encerrou."""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    if not request_line:
+        return None
+
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Linha de requisição inválida.")
+    if not version.startswith("HTTP/1."):
+        raise HttpError(400, f"Versão não suportada: {version}")
+
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, separator, value = line.decode("latin-1").partition(":")
+        if not separator:
+            raise HttpError(400, "Cabeçalho inválido.")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HttpError(400, "Cabeçalhos demais.")
+
+    if "transfer-encoding" in headers:
+        raise HttpError(501, "Transfer-Encoding não suportado; envie Content-Length.")
+    body = b""
+    length = headers.get("content-length")
+    if length is not None:
+        if not length.isdigit():
+            raise HttpError(400, "Content-Length inválido.")
+        if int(length) > MAX_BODY_BYTES:
+            raise HttpError(413, f"Corpo maior que {MAX_BODY_BYTES} bytes.")
+        body = await reader.readexactly(int(length))
+
+    url = urlsplit(target)
+    return Request(method.upper(), url.path, parse_qs(url.query), version, headers, body)
+
+
+def wants_keep_alive(request):
+    connection = request.headers.get("connection", "").lower()
+    if request.version == "HTTP/1.0":
+        return connection == "keep-alive"
+    return connection != "close"
+
+
+def accepts_gzip(request):
+    for item in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def json_body(request):
+    try:
+        payload = json.loads(request.body or b"null")
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise HttpError(400, "Corpo JSON inválido.")
+    if not isinstance(payload, dict):
+        raise HttpError(400, "O corpo deve ser um objeto JSON.")
+    return payload
+
+
+# --- Montagem das respostas ---
+
+def render(request, response, keep_alive):
+    """Serializa a resposta, aplicando If-None-Match e gzip."""
+    status, body = response.status, response.body
+    headers = [("Content-Type", response.content_type)]
+    if response.etag:
+        headers.append(("ETag", response.etag))
+        headers.append(("Cache-Control", "private, no-cache"))
+        if_none_match = request.headers.get("if-none-match") if request else None
+        if if_none_match and (if_none_match.strip() == "*" or response.etag in (tag.strip() for tag in if_none_match.split(","))):
+            status, body = 304, b""
+
+    if body and len(body) >= GZIP_MIN_BYTES:
+        headers.append(("Vary", "Accept-Encoding"))
+        if request and accepts_gzip(request):
+            body = response.gzipped or gzip.compress(body, GZIP_LEVEL)
+            headers.append(("Content-Encoding", "gzip"))
+
+    if status != 304:
+        headers.append(("Content-Length", str(len(body))))
+    headers.append(("Connection", "keep-alive" if keep_alive else "close"))
+    if request and request.method == "HEAD":
+        body = b""
+
+    head = f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+    head += "".join(f"{name}: {value}\r\n" for name, value in headers)
+    return head.encode("latin-1") + b"\r\n" + body
+
+
+# --- Autenticação ---
+
+async def authenticated_user_id(request):
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        raise HttpError(401, "Informe o token: Authorization: Bearer <token>.")
+    user_id = await session_tokens.validate_token_async(token.strip())
+    if not user_id:
+        raise HttpError(401, "Token inválido ou expirado.")
+    return user_id
+
+
+# --- Handlers ---
+
+async def handle_health(request, match):
+    return json_response({"status": "ok"})
+
+
+async def handle_metrics(request, match):
+    if not db_instrumentation.is_enabled():
+        raise HttpError(404, "Instrumentação desligada (CHAMPS_DB_INSTRUMENTATION).")
+    return Response(200, db_instrumentation.to_prometheus().encode(), None, "text/plain; version=0.0.4")
+
+
+async def handle_login(request, match):
+    payload = json_body(request)
+    identifier, password = payload.get("identifier"), payload.get("password")
+    if not isinstance(identifier, str) or not isinstance(password, str):
+        raise HttpError(400, "Informe identifier e password.")
+    user_id = await auth.login(identifier, password)
+    if not user_id:
+        raise HttpError(401, "Usuário ou senha inválidos.")
+    token = await session_tokens.issue_token_async(user_id)
+    return json_response({"token": token, "user_id": user_id})
+
+
+async def handle_logout(request, match):
+    await authenticated_user_id(request)
+    token = request.headers["authorization"].partition(" ")[2].strip()
+    await session_tokens.revoke_token_async(token)
+    return json_response({"status": "ok"})
+
+
+async def handle_workouts(request, match):
+    user_id = await authenticated_user_id(request)
+    home = await async_database.get_home_payload(user_id)
+    if home is None:
+        raise HttpError(404, "Usuário não encontrado.")
+    return json_response({
+        "username": home["username"],
+        "workouts": [
+            {"user_workout_id": row["user_workout_id"], "title": row["title"], "exercise_count": row["exercise_count"]}
+            for row in home["workouts"]
+        ],
+    }, with_etag=True)
+
+
+async def _owned_workout_title(user_id, user_workout_id):
+    """Título da ficha, se ela pertencer ao usuário (404 caso contrário)."""
+    for row in await async_database.get_user_workouts(user_id):
+        if row["user_workout_id"] == user_workout_id:
+            return row["title"]
+    raise HttpError(404, "Ficha não encontrada.")
+
+
+async def _workout_response(user_workout_id, title):
+    exercises = await async_database.get_user_workout_details(user_workout_id)
+    return json_response({
+        "user_workout_id": user_workout_id,
+        "title": title,
+        "exercises": [dict(row) for row in exercises],
+    }, with_etag=True)
+
+
+async def handle_workout_details(request, match):
+    user_id = await authenticated_user_id(request)
+    user_workout_id = int(match.group(1))
+    title = await _owned_workout_title(user_id, user_workout_id)
+    return await _workout_response(user_workout_id, title)
+
+
+async def handle_save_workout(request, match):
+    user_id = await authenticated_user_id(request)
+    user_workout_id = int(match.group(1))
+    await _owned_workout_title(user_id, user_workout_id)
+
+    payload = json_body(request)
+    title = payload.get("title")
+    if not isinstance(title, str) or not title.strip():
+        raise HttpError(400, "title deve ser um texto não vazio.")
+    raw_exercises = payload.get("exercises")
+    if not isinstance(raw_exercises, list):
+        raise HttpError(400, "exercises deve ser uma lista.")
+
+    valid_ids = (await catalog_cache.get())[1]
+    exercises = []
+    for index, ex in enumerate(raw_exercises):
+        if not isinstance(ex, dict):
+            raise HttpError(400, f"exercises[{index}] deve ser um objeto.")
+        master_exercise_id, series = ex.get("master_exercise_id"), ex.get("series")
+        user_exercise_id = ex.get("user_exercise_id")
+        if type(master_exercise_id) is not int or master_exercise_id not in valid_ids:
+            raise HttpError(400, f"exercises[{index}]: master_exercise_id desconhecido.")
+        if not isinstance(series, str) or not series.strip():
+            raise HttpError(400, f"exercises[{index}]: series deve ser um texto não vazio.")
+        if user_exercise_id is not None and type(user_exercise_id) is not int:
+            raise HttpError(400, f"exercises[{index}]: user_exercise_id deve ser inteiro.")
+        exercises.append({
+            "user_exercise_id": user_exercise_id,
+            "master_exercise_id": master_exercise_id,
+            "series": series.strip(),
+        })
+
+    title = title.strip()
+    if not await async_database.update_workout(user_workout_id, {"details": {"title": title}, "exercises": exercises}):
+        raise HttpError(500, "Não foi possível salvar o treino.")
+    return await _workout_response(user_workout_id, await _owned_workout_title(user_id, user_workout_id))
+
+
+class CatalogCache:
+    """
+    Resposta do catálogo serializada (e comprimida) uma vez por versão do
+    catálogo: database.get_all_master_exercises devolve o mesmo objeto enquanto
+    o cache dele é válido, então basta comparar a identidade.
+    """
+
+    def __init__(self):
+        self._source = None
+        self._entry = None  # (Response, ids válidos)
+
+    async def get(self):
+        grouped = await async_database.get_all_master_exercises()
+        if grouped is not self._source:
+            body = _dumps({
+                group: [{"master_exercise_id": ex.master_exercise_id, "name": ex.name} for ex in items]
+                for group, items in grouped.items()
+            })
+            response = Response(200, body, _etag(body), gzipped=gzip.compress(body, GZIP_LEVEL))
+            valid_ids = frozenset(ex.master_exercise_id for items in grouped.values() for ex in items)
+            self._source, self._entry = grouped, (response, valid_ids)
+        return self._entry
+
+
+catalog_cache = CatalogCache()
+
+
+async def handle_exercises(request, match):
+    await authenticated_user_id(request)
+    query = request.query.get("q", [""])[0].strip()
+    if not query:
+        return (await catalog_cache.get())[0]
+    matches = await async_database.search_master_exercises(query)
+    return json_response([
+        {"master_exercise_id": ex["master_exercise_id"], "name": ex["name"], "muscle_group": ex["muscle_group"]}
+        for ex in matches
+    ], with_etag=True)
+
+
+ROUTES = [
+    ("GET", re.compile(r"^/api/health$"), handle_health),
+    ("GET", re.compile(r"^/metrics$"), handle_metrics),
+    ("POST", re.compile(r"^/api/login$"), handle_login),
+    ("POST", re.compile(r"^/api/logout$"), handle_logout),
+    ("GET", re.compile(r"^/api/workouts$"), handle_workouts),
+    ("GET", re.compile(r"^/api/workouts/(\d+)$"), handle_workout_details),
+    ("PUT", re.compile(r"^/api/workouts/(\d+)$"), handle_save_workout),
+    ("GET", re.compile(r"^/api/exercises$"), handle_exercises),
+]
+
+
+async def dispatch(request):
+    """Encaminha a requisição ao handler da rota; erros viram respostas JSON."""
+    method = "GET" if request.method == "HEAD" else request.method
+    path_matched = False
+    try:
+        for route_method, pattern, handler in ROUTES:
+            match = pattern.match(request.path)
+            if not match:
+                continue
+            path_matched = True
+            if route_method == method:
+                return await handler(request, match)
+        if path_matched:
+            raise HttpError(405, f"Método {request.method} não permitido em {request.path}.")
+        raise HttpError(404, f"Rota desconhecida: {request.path}")
+    except HttpError as e:
+        return error_response(e.status, e.message)
+    except Exception:
+        logging.exception(f"Erro ao atender {request.method} {request.path}")
+        return error_response(500, "Erro interno.")
+
+
+# --- Conexões ---
+
+async def _run_after(previous, request):
+    """Atende `request` depois que as requisições em `previous` terminarem."""
+    if previous:
+        await asyncio.wait(previous)
+    return await dispatch(request)
+
+
+async def _write_responses(pending, writer):
+    """
+    Escreve as respostas na ordem das requisições, conforme ficam prontas. Se a
+    conexão cair (ou for encerrada), continua consumindo a fila até o fim,
+    cancelando o que falta, para que quem enfileira nunca fique bloqueado.
+    """
+    closed = False
+    while True:
+        item = await pending.get()
+        if item is None:
+            return
+        request, task, keep_alive = item
+        if closed:
+            task.cancel()
+            continue
+        response = await task
+        try:
+            writer.write(render(request, response, keep_alive))
+            await writer.drain()
+        except ConnectionError:
+            closed = True
+        if not keep_alive:
+            closed = True
+
+
+async def handle_connection(reader, writer):
+    pending = asyncio.Queue(maxsize=MAX_PIPELINED)
+    writer_task = asyncio.create_task(_write_responses(pending, writer))
+    in_flight = []   # tarefas ainda sem resposta escrita, na ordem de chegada
+    barrier = None   # última escrita: as requisições seguintes esperam por ela
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except HttpError as e:
+                response_task = asyncio.create_task(asyncio.sleep(0, error_response(e.status, e.message)))
+                await pending.put((None, response_task, False))
+                break
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            if request is None:
+                break
+
+            keep_alive = wants_keep_alive(request)
+            in_flight = [task for task in in_flight if not task.done()]
+            if request.method in SAFE_METHODS:
+                task = asyncio.create_task(_run_after([barrier] if barrier and not barrier.done() else [], request))
+            else:
+                task = asyncio.create_task(_run_after(list(in_flight), request))
+                barrier = task
+            in_flight.append(task)
+            await pending.put((request, task, keep_alive))
+            if not keep_alive:
+                break
+        await pending.put(None)
+        await writer_task
+    except ConnectionError:
+        pass
+    finally:
+        for task in in_flight:
+            task.cancel()
+        writer_task.cancel()
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Inicia o servidor e atende até ser cancelado."""
+    await async_database.init_db()
+    # Antes de aceitar conexões, para que o primeiro login não espere o pool de hash subir
+    await asyncio.get_running_loop().run_in_executor(None, password_hashing.warm_up)
+    server = await asyncio.start_server(handle_connection, host, port, reuse_address=True)
+    addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+    logging.info(f"Servidor da API ouvindo em {addresses}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=DEFAULT_HOST, help="use 127.0.0.1 para aceitar só conexões locais")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--db", help=f"arquivo do banco (padrão: {database.DB_FILE})")
+    parser.add_argument("--pool-size", type=int, help="conexões do pool e threads do executor do banco")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.db:
+        database.DB_FILE = args.db
+    if args.pool_size:
+        database.configure_pool(size=args.pool_size)
+        async_database.DB_EXECUTOR_WORKERS = args.pool_size
+
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        async_database.shutdown()
+        password_hashing.shutdown()
+        database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+API assíncrona da camada de dados, para os handlers async do Flet.
+
+Cada função espelha a de mesmo nome em database.py e roda em um executor de
+threads limitado, de modo que uma consulta lenta de uma sessão não atrasa a
+interface das demais sessões do mesmo worker. O número de threads acompanha o
+tamanho do pool de conexões, para que nenhuma thread fique esperando conexão.
+
+Para login e cadastro prefira auth.login / auth.register, que calculam o hash da
+senha no pool de processos em vez de ocupar uma thread deste executor.
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+
+DB_EXECUTOR_WORKERS = int(os.environ.get("CHAMPS_DB_EXECUTOR_WORKERS", str(database.DB_POOL_SIZE)))
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="champs-db")
+    return _executor
+
+
+async def run(func, *args, **kwargs):
+    """Executa uma função bloqueante da camada de dados no executor do banco."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def _mirror(func):
+    """Cria a versão assíncrona de uma função de database.py."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run(func, *args, **kwargs)
+    return wrapper
+
+
+def shutdown():
+    """Encerra o executor (ex.: ao finalizar o app)."""
+    global _executor, _schema_check
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    _schema_check = None
+
+
+init_db = _mirror(database.init_db)
+
+# (DB_FILE, Future) da verificação do schema em segundo plano
+_schema_check = None
+
+
+def start_schema_check():
+    """
+    Inicia database.init_db no executor sem esperar por ela e retorna o Future
+    (concurrent.futures). Chamadas seguintes, com o mesmo DB_FILE, retornam o
+    mesmo Future; assim o app desenha a primeira tela enquanto o schema é
+    verificado (ou migrado) e só quem vai ao banco espera.
+    """
+    global _schema_check
+    if _schema_check is None or _schema_check[0] != database.DB_FILE:
+        _schema_check = (database.DB_FILE, _get_executor().submit(database.init_db))
+    return _schema_check[1]
+
+
+async def schema_ready():
+    """Espera a verificação iniciada por start_schema_check (e a inicia, se preciso)."""
+    await asyncio.wrap_future(start_schema_check())
+
+# --- Usuários ---
+add_user = _mirror(database.add_user)
+add_users_bulk = _mirror(database.add_users_bulk)
+identity_exists = _mirror(database.identity_exists)
+create_user = _mirror(database.create_user)
+verify_user = _mirror(database.verify_user)
+get_user_credentials = _mirror(database.get_user_credentials)
+update_user_password_hash = _mirror(database.update_user_password_hash)
+get_user_by_id = _mirror(database.get_user_by_id)
+
+# --- Tokens ---
+add_user_token = _mirror(database.add_user_token)
+get_user_token = _mirror(database.get_user_token)
+delete_user_token = _mirror(database.delete_user_token)
+delete_user_tokens = _mirror(database.delete_user_tokens)
+purge_expired_user_tokens = _mirror(database.purge_expired_user_tokens)
+
+# --- Fichas de treino ---
+get_user_workouts = _mirror(database.get_user_workouts)
+ensure_default_workouts = _mirror(database.ensure_default_workouts)
+get_home_payload = _mirror(database.get_home_payload)
+get_user_workout_by_id = _mirror(database.get_user_workout_by_id)
+get_user_workout_details = _mirror(database.get_user_workout_details)
+update_exercise_series = _mirror(database.update_exercise_series)
+replace_exercise_in_workout = _mirror(database.replace_exercise_in_workout)
+add_exercise_to_workout = _mirror(database.add_exercise_to_workout)
+remove_exercise_from_workout = _mirror(database.remove_exercise_from_workout)
+update_workout = _mirror(database.update_workout)
+
+# --- Registro de treinos e progresso ---
+log_workout_sets = _mirror(database.log_workout_sets)
+get_weekly_muscle_volume = _mirror(database.get_weekly_muscle_volume)
+get_exercise_best_sets = _mirror(database.get_exercise_best_sets)
+get_planned_sets_by_muscle_group = _mirror(database.get_planned_sets_by_muscle_group)
+
+# --- Biblioteca de exercícios ---
+get_all_master_exercises = _mirror(database.get_all_master_exercises)
+add_master_exercise = _mirror(database.add_master_exercise)
+search_master_exercises = _mirror(database.search_master_exercises)
@@ -0,0 +1,56 @@
+"""
+Login e cadastro assíncronos usados pelas telas do Flet.
+
+O hash das senhas roda no pool de processos de password_hashing e as consultas
+no executor de async_database, de modo que um pico de logins não trava as outras
+sessões do mesmo worker.
+"""
+import password_hashing
+from async_database import (
+    create_user,
+    ensure_default_workouts,
+    get_user_credentials,
+    identity_exists,
+    schema_ready,
+    update_user_password_hash,
+)
+
+
+async def login(identifier, password):
+    """
+    Autentica pelo nome de usuário ou e-mail.
+
+    Retorna o user_id em caso de sucesso, None caso contrário. Hashes legados
+    (SHA-256) ou com custo desatualizado são refeitos de forma transparente, e
+    contas sem fichas de treino recebem os treinos padrão.
+    """
+    await schema_ready()
+    user = await get_user_credentials(identifier)
+    if not user:
+        return None
+
+    if not await password_hashing.verify_password_async(password, user['password_hash'], user['salt']):
+        return None
+
+    if password_hashing.needs_rehash(user['password_hash']):
+        salt = password_hashing.new_salt()
+        password_hash = await password_hashing.hash_password_async(password, salt)
+        await update_user_password_hash(user['user_id'], password_hash, salt)
+
+    await ensure_default_workouts(user['user_id'])
+    return user['user_id']
+
+
+async def register(username, email, password):
+    """
+    Cadastra um novo usuário.
+
+    Retorna True se o usuário for criado, False se o nome de usuário ou e-mail já existir.
+    """
+    await schema_ready()
+    if await identity_exists(username, email):
+        return False
+
+    salt = password_hashing.new_salt()
+    password_hash = await password_hashing.hash_password_async(password, salt)
+    return await create_user(username, email, password_hash, salt)
@@ -0,0 +1,117 @@
+"""
+Benchmark das análises de progresso: versão vetorizada (NumPy) contra a
+implementação linha a linha.
+
+Gera um histórico sintético (alunos x meses de treino, registrado por
+log_workout_sets), carrega as colunas uma vez e mede cada implementação sobre
+os mesmos dados, conferindo que os resultados coincidem.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.bench_analytics [--members 2000] [--months 6] [--repeat 3]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import analytics
+import database
+
+SETS_PER_SESSION = 18
+SESSIONS_PER_WEEK = 3
+
+
+def generate_history(members, months, seed):
+    """Cria `members` alunos, cada um com `months` meses de sessões registradas."""
+    rng = random.Random(seed)
+    exercise_ids = [ex.master_exercise_id for items in database.get_all_master_exercises().values() for ex in items]
+    start = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=30 * months)
+    sessions = int(months * 30 / 7 * SESSIONS_PER_WEEK)
+
+    for index in range(members):
+        username = f"analytics{index:07d}"
+        if not database.create_user(username, f"{username}@bench.local", "hash", "salt"):
+            continue
+        # create_user só informa se criou; o id vem da busca pelo nome
+        user_id = database.get_user_credentials(username)['user_id']
+        favorites = rng.sample(exercise_ids, 12)
+        strength = {master_exercise_id: rng.uniform(20, 100) for master_exercise_id in favorites}
+        sets = []
+        for session in range(sessions):
+            performed_at = start + timedelta(days=session * 7 / SESSIONS_PER_WEEK, minutes=rng.randint(0, 600))
+            for _ in range(SETS_PER_SESSION):
+                master_exercise_id = rng.choice(favorites)
+                # Progressão lenta com ruído, para gerar recordes ao longo do tempo
+                load_kg = round(strength[master_exercise_id] * (1 + session / sessions * 0.3) * rng.uniform(0.85, 1.05) / 2.5) * 2.5
+                sets.append((None, master_exercise_id, rng.randint(3, 12), load_kg, performed_at))
+        database.log_workout_sets(user_id, sets)
+
+
+def best_of(func, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def same_results(left, right):
+    """Compara os resultados, tolerando diferenças de arredondamento em ponto flutuante."""
+    if isinstance(left, dict):
+        return left.keys() == right.keys() and all(same_results(left[key], right[key]) for key in left)
+    if isinstance(left, (list, tuple)):
+        return len(left) == len(right) and all(same_results(a, b) for a, b in zip(left, right))
+    if isinstance(left, float) or isinstance(right, float):
+        if math.isnan(left):
+            return math.isnan(right)
+        return math.isclose(left, right, rel_tol=1e-9, abs_tol=1e-6)
+    return left == right
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--months", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=3, help="repetições de cada medição (vale a melhor)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if analytics.np is None:
+        print("NumPy não está instalado; a versão vetorizada não pode ser medida.")
+        return 1
+
+    database.DB_FILE = os.path.join(tempfile.mkdtemp(prefix="champs-analytics-"), "bench.db")
+    database.init_db()
+
+    started = time.perf_counter()
+    generate_history(args.members, args.months, args.seed)
+    print(f"Histórico gerado em {time.perf_counter() - started:.1f}s")
+
+    load_seconds, columns = best_of(lambda: analytics.load_columns(1, args.members), args.repeat)
+    rows = len(columns.user_id)
+    plain_columns = analytics.TrainingColumns(*(column.tolist() for column in columns))
+    print(f"{rows} séries de {args.members} alunos carregadas em {load_seconds:.3f}s")
+
+    vectorized_seconds, vectorized = best_of(lambda: analytics.compute_metrics(columns), args.repeat)
+    naive_seconds, naive = best_of(lambda: analytics.compute_metrics_naive(plain_columns), args.repeat)
+
+    print(f"{'implementação':<16} {'segundos':>10} {'séries/s':>14}")
+    print(f"{'vetorizada':<16} {vectorized_seconds:>10.3f} {rows / vectorized_seconds:>14.0f}")
+    print(f"{'linha a linha':<16} {naive_seconds:>10.3f} {rows / naive_seconds:>14.0f}")
+    print(f"Ganho: {naive_seconds / vectorized_seconds:.1f}x")
+
+    if not same_results(vectorized, naive):
+        print("ERRO: as implementações divergem.")
+        return 1
+    print("Resultados idênticos nas duas implementações.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
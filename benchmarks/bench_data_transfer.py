@@ -0,0 +1,89 @@
+"""
+Benchmark da exportação e importação em lote (data_transfer.py).
+
+Gera uma base sintética com N alunos (pelo caminho em lote do bench_database),
+exporta em NDJSON e CSV medindo a vazão e o pico de memória do Python (que deve
+ficar constante, independente de N) e importa cada arquivo em um banco vazio.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.bench_data_transfer [--members 100000] [--chunk-size 500]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import data_transfer
+import database
+from benchmarks.bench_database import provision_bulk_path
+
+
+def timed_export(path, fmt):
+    started = time.perf_counter()
+    with open(path, "w", encoding="utf-8", newline="") as out:
+        records = data_transfer.export_members(out, fmt, include_credentials=True)
+    return records, time.perf_counter() - started
+
+
+def export_peak_memory(path, fmt):
+    """Pico de memória alocada pelo Python durante uma exportação completa."""
+    tracemalloc.start()
+    try:
+        with open(path, "w", encoding="utf-8", newline="") as out:
+            data_transfer.export_members(out, fmt, include_credentials=True)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def timed_import(path, fmt, chunk_size):
+    def progress(report):
+        print(f"  {report.read:>9} lidos, {report.imported:>9} importados", end="\r", flush=True)
+
+    started = time.perf_counter()
+    with open(path, encoding="utf-8", newline="") as source:
+        report = data_transfer.import_members(source, fmt, chunk_size, progress)
+    print(" " * 50, end="\r")
+    return report, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--chunk-size", type=int, default=500, help="alunos por transação na importação")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="champs-transfer-")
+    source_db = os.path.join(workdir, "origem.db")
+    database.DB_FILE = source_db
+    database.init_db()
+    started = time.perf_counter()
+    provision_bulk_path(0, args.members)
+    print(f"{args.members} alunos gerados em {time.perf_counter() - started:.1f}s ({workdir})")
+
+    print(f"{'operação':<18} {'registros':>10} {'segundos':>9} {'alunos/s':>10} {'registros/s':>12} {'pico MiB':>9}")
+    for fmt in data_transfer.FORMATS:
+        path = os.path.join(workdir, f"export.{fmt}")
+
+        database.DB_FILE = source_db
+        records, seconds = timed_export(path, fmt)
+        peak = export_peak_memory(path, fmt)
+        print(
+            f"{'exportar ' + fmt:<18} {records:>10} {seconds:>9.2f} {args.members / seconds:>10.0f}"
+            f" {records / seconds:>12.0f} {peak / 2 ** 20:>9.1f}"
+        )
+
+        database.DB_FILE = os.path.join(workdir, f"destino_{fmt}.db")
+        database.init_db()
+        report, seconds = timed_import(path, fmt, args.chunk_size)
+        print(
+            f"{'importar ' + fmt:<18} {report.read:>10} {seconds:>9.2f} {report.imported / seconds:>10.0f}"
+            f" {report.read / seconds:>12.0f} {'':>9}"
+        )
+        if report.invalid or report.imported != args.members:
+            print(f"  atenção: {report.imported} importados, {len(report.invalid)} inválidos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Benchmark da camada de dados (database.py) em várias escalas de alunos.
+
+Gera uma base sintética que cresce de escala em escala (ex.: 10 mil, 100 mil e
+1 milhão de usuários) e, em cada uma, mede as operações do caminho quente do app:
+login (verify_user), tela inicial (get_user_workouts), ficha
+(get_user_workout_details), salvar ficha (update_workout) e biblioteca de
+exercícios (get_all_master_exercises). Para cada operação informa p50/p95/p99
+e operações por segundo.
+
+Os primeiros usuários são criados pelo caminho real (add_user, que hasheia a senha
+e chama create_default_workouts_for_user); o restante por um caminho em lote, que
+reaproveita um único hash de senha e grava milhares de usuários por transação.
+
+Os resultados são gravados em JSON; com --compare, um resultado anterior (de
+outro commit) é usado como referência para as variações de p50/p99.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.bench_database [--scales 10000,100000,1000000]
+        [--iterations 200] [--db caminho.db] [--output resultado.json]
+        [--compare anterior.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import database
+import password_hashing
+
+PASSWORD = "senha-benchmark"
+BULK_CHUNK_SIZE = 5000
+
+
+def username_for(index):
+    return f"bench{index:07d}"
+
+
+def email_for(index):
+    return f"bench{index:07d}@bench.local"
+
+
+# --- Gerador de dados sintéticos ---
+
+def count_users():
+    with database.db_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+
+def provision_real_path(start, stop):
+    """Cria usuários pelo caminho do app: add_user -> create_user -> treinos padrão."""
+    for index in range(start, stop):
+        database.add_user(username_for(index), email_for(index), PASSWORD)
+
+
+def provision_bulk_path(start, stop, progress=None):
+    """
+    Cria usuários em lote: um único hash de senha para todos e BULK_CHUNK_SIZE
+    usuários (com seus treinos padrão) por transação.
+    """
+    salt = password_hashing.new_salt()
+    password_hash = password_hashing.hash_password(PASSWORD, salt)
+    templates = database._get_templates()[0]
+
+    with database.db_connection() as conn:
+        cursor = conn.cursor()
+        role_id = database._get_user_role_id(cursor)
+        for chunk_start in range(start, stop, BULK_CHUNK_SIZE):
+            chunk_stop = min(chunk_start + BULK_CHUNK_SIZE, stop)
+            cursor.execute("BEGIN IMMEDIATE")
+            for index in range(chunk_start, chunk_stop):
+                user_id = database._insert_user(cursor, username_for(index), email_for(index), password_hash, salt)
+                cursor.execute("INSERT INTO user_roles (user_id, role_id) VALUES (?, ?)", (user_id, role_id))
+                database.create_default_workouts_for_user(user_id, cursor, templates)
+            conn.commit()
+            # Como os cadastros do app: já entram no filtro de identidades deste processo
+            database._remember_identities((username_for(index), email_for(index)) for index in range(chunk_start, chunk_stop))
+            if progress:
+                progress(chunk_stop)
+
+
+def grow_to(scale, real_users):
+    """Completa a base até `scale` usuários; retorna (criados, segundos)."""
+    existing = count_users()
+    if existing >= scale:
+        return 0, 0.0
+
+    started = time.perf_counter()
+    real_stop = min(max(existing, real_users), scale)
+    provision_real_path(existing, real_stop)
+
+    def progress(done):
+        print(f"  {done:>9} usuários", end="\r", flush=True)
+
+    provision_bulk_path(real_stop, scale, progress)
+    print(" " * 30, end="\r")
+
+    # Estatísticas atualizadas para o planejador, como numa base em produção
+    with database.db_connection() as conn:
+        conn.execute("ANALYZE")
+        conn.commit()
+    return scale - existing, time.perf_counter() - started
+
+
+# --- Medição ---
+
+def percentile(sorted_samples, fraction):
+    """Percentil pelo método nearest-rank."""
+    index = max(0, min(len(sorted_samples) - 1, int(round(fraction * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+
+def measure(operation, iterations):
+    """Executa `operation(i)` `iterations` vezes e resume as latências."""
+    samples = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        operation(i)
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "ops_per_sec": iterations / elapsed if elapsed else 0.0,
+    }
+
+
+def sample_workout_ids(rng, count):
+    """Sorteia fichas de usuários espalhados pela base inteira."""
+    with database.db_connection() as conn:
+        max_id = conn.execute("SELECT MAX(user_workout_id) FROM user_workouts").fetchone()[0]
+    return [rng.randint(1, max_id) for _ in range(count)]
+
+
+def build_operations(rng, scale, iterations):
+    """Cria as operações medidas, com alvos sorteados de antemão."""
+    user_indexes = [rng.randrange(scale) for _ in range(iterations)]
+    user_ids = [rng.randint(1, scale) for _ in range(iterations)]
+    workout_ids = sample_workout_ids(rng, iterations)
+
+    def verify_user(i):
+        database.verify_user(username_for(user_indexes[i]), PASSWORD)
+
+    def get_user_workouts(i):
+        database.get_user_workouts(user_ids[i])
+
+    def get_user_workout_details(i):
+        database.get_user_workout_details(workout_ids[i])
+
+    def update_workout(i):
+        # Edição típica: muda as séries de um exercício e troca dois de lugar
+        user_workout_id = workout_ids[i]
+        exercises = [dict(row) for row in database.get_user_workout_details(user_workout_id)]
+        if exercises:
+            exercises[0]['series'] = "4x8" if exercises[0]['series'] != "4x8" else "3x10"
+        if len(exercises) > 1:
+            exercises[0], exercises[1] = exercises[1], exercises[0]
+        database.update_workout(user_workout_id, {"details": {"title": f"Treino {i % 3}"}, "exercises": exercises})
+
+    def get_all_master_exercises(i):
+        database.get_all_master_exercises()
+
+    return [
+        ("verify_user", verify_user),
+        ("get_user_workouts", get_user_workouts),
+        ("get_user_workout_details", get_user_workout_details),
+        ("update_workout", update_workout),
+        ("get_all_master_exercises", get_all_master_exercises),
+    ]
+
+
+# --- Relatório ---
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(row["scale"], row["function"]): row for row in baseline["results"]}
+
+    print(f"\nComparação com {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    print(f"{'escala':>9} {'função':<26} {'p50 antes':>10} {'p50 agora':>10} {'p99 antes':>10} {'p99 agora':>10}")
+    for row in results:
+        old = previous.get((row["scale"], row["function"]))
+        if not old:
+            continue
+        print(
+            f"{row['scale']:>9} {row['function']:<26} {old['p50_ms']:>10.3f} {row['p50_ms']:>10.3f}"
+            f" {old['p99_ms']:>10.3f} {row['p99_ms']:>10.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="10000,100000,1000000", help="número de usuários de cada escala, em ordem crescente")
+    parser.add_argument("--iterations", type=int, default=200, help="repetições por operação")
+    parser.add_argument("--login-iterations", type=int, default=30, help="repetições de verify_user (dominado pela KDF)")
+    parser.add_argument("--real-users", type=int, default=100, help="usuários criados pelo caminho real (add_user)")
+    parser.add_argument("--db", help="arquivo do banco; reaproveitado entre execuções (padrão: arquivo temporário)")
+    parser.add_argument("--output", default="bench_database.json", help="arquivo JSON com os resultados")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    scales = sorted(int(value) for value in args.scales.split(","))
+    database.DB_FILE = args.db or os.path.join(tempfile.mkdtemp(prefix="champs-bench-"), "bench.db")
+    database.init_db()
+    rng = random.Random(args.seed)
+
+    generation = []
+    results = []
+    print(f"Banco: {database.DB_FILE}")
+    for scale in scales:
+        created, seconds = grow_to(scale, args.real_users)
+        generation.append({"scale": scale, "created": created, "seconds": seconds})
+        if created:
+            print(f"Escala {scale}: {created} usuários gerados em {seconds:.1f}s ({created / seconds:.0f}/s)")
+        else:
+            print(f"Escala {scale}: base já existente")
+
+        print(f"{'função':<26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10}")
+        for name, operation in build_operations(rng, scale, args.iterations):
+            iterations = args.login_iterations if name == "verify_user" else args.iterations
+            summary = measure(operation, iterations)
+            results.append({"scale": scale, "function": name, **summary})
+            print(
+                f"{name:<26} {summary['p50_ms']:>9.3f} {summary['p95_ms']:>9.3f}"
+                f" {summary['p99_ms']:>9.3f} {summary['ops_per_sec']:>10.1f}"
+            )
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "db_file": database.DB_FILE,
+            "seed": args.seed,
+        },
+        "generation": generation,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados gravados em {args.output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
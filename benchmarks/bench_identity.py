@@ -0,0 +1,174 @@
+"""
+Benchmark das buscas por identidade sob uma carga de credential stuffing.
+
+Gera uma base com N alunos (pelo caminho em lote do bench_database) e dispara
+tentativas de login com listas "vazadas": a maioria com usuários ou e-mails que
+não existem na base, e uma fração (--known-ratio) com contas reais escritas com
+outras maiúsculas e senha errada. Cada cenário roda com o filtro de identidades
+(Bloom) ligado e desligado:
+
+    credenciais   database.get_user_credentials, a busca do login
+    cadastro      database.identity_exists, a checagem de nome livre do cadastro
+    login         auth.login de ponta a ponta, --concurrency tentativas por vez
+                  (a KDF das contas reais roda nos dois casos)
+
+Para cada um informa p50/p99, tentativas por segundo e consultas ao SQLite por
+tentativa; com o filtro, também o tempo de montagem, o tamanho e a taxa de
+falsos positivos observada.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.bench_identity [--members 100000] [--attempts 20000]
+        [--known-ratio 0.02] [--concurrency 64] [--db caminho.db]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import async_database
+import auth
+import database
+import db_instrumentation
+import password_hashing
+from benchmarks.bench_database import count_users, email_for, percentile, provision_bulk_path, username_for
+
+
+def build_attempts(members, attempts, known_ratio, seed):
+    """Lista de (identificador, senha) no estilo de uma lista vazada."""
+    rng = random.Random(seed)
+    result = []
+    for i in range(attempts):
+        if rng.random() < known_ratio:
+            index = rng.randrange(members)
+            identifier = (username_for(index) if rng.random() < 0.5 else email_for(index)).upper()
+        elif rng.random() < 0.5:
+            identifier = f"user{rng.randrange(10 ** 9)}"
+        else:
+            identifier = f"leak{rng.randrange(10 ** 9)}@mail.example"
+        result.append((identifier, f"senha-vazada-{i}"))
+    return result
+
+
+def wait_for_identity_filter(members):
+    """Espera a thread do filtro de identidades ler os `members` usuários."""
+    while True:
+        state = database._identity_filter
+        if state is not None and state.last_user_id >= members:
+            return
+        time.sleep(0.01)
+
+
+def queries_of(function_name):
+    functions = db_instrumentation.snapshot()["functions"]
+    return functions.get(function_name, {}).get("queries", 0)
+
+
+def measure_sync(name, operation, attempts):
+    db_instrumentation.reset()
+    samples = []
+    started = time.perf_counter()
+    for identifier, _ in attempts:
+        t0 = time.perf_counter()
+        operation(identifier)
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "ops_per_sec": len(samples) / elapsed,
+        "queries_per_op": queries_of(name) / len(samples),
+    }
+
+
+async def run_logins(attempts, concurrency):
+    samples = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def attempt(identifier, password):
+        async with semaphore:
+            t0 = time.perf_counter()
+            await auth.login(identifier, password)
+            samples.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(attempt(identifier, password) for identifier, password in attempts))
+    return samples
+
+
+def measure_logins(attempts, concurrency):
+    db_instrumentation.reset()
+    started = time.perf_counter()
+    samples = asyncio.run(run_logins(attempts, concurrency))
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "ops_per_sec": len(samples) / elapsed,
+        "queries_per_op": queries_of("get_user_credentials") / len(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--attempts", type=int, default=20_000, help="tentativas por cenário")
+    parser.add_argument("--known-ratio", type=float, default=0.02, help="fração de tentativas com contas reais")
+    parser.add_argument("--concurrency", type=int, default=64, help="logins simultâneos no cenário de ponta a ponta")
+    parser.add_argument("--db", help="arquivo do banco; reaproveitado entre execuções (padrão: arquivo temporário)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    database.DB_FILE = args.db or os.path.join(tempfile.mkdtemp(prefix="champs-identity-"), "identity.db")
+    database.init_db()
+    existing = count_users()
+    if existing < args.members:
+        started = time.perf_counter()
+        provision_bulk_path(existing, args.members)
+        print(f"{args.members - existing} alunos gerados em {time.perf_counter() - started:.1f}s")
+
+    # Remonta o filtro (como na inicialização de um worker) e espera a thread terminar
+    started = time.perf_counter()
+    database._identity_filter = None
+    database._start_identity_filter()
+    wait_for_identity_filter(args.members)
+    bloom = database._identity_filter.bloom
+    print(
+        f"Filtro de identidades: {len(bloom)} chaves, {len(bloom._bits) / 2 ** 20:.1f} MiB, "
+        f"{bloom.num_hashes} hashes, montado em {time.perf_counter() - started:.2f}s"
+    )
+
+    attempts = build_attempts(args.members, args.attempts, args.known_ratio, args.seed)
+    unknown = [identifier for identifier, _ in attempts if not identifier.startswith("BENCH")]
+    false_positives = sum(1 for identifier in unknown if database._identity_may_exist(database.normalize_identity(identifier)))
+    print(f"Falsos positivos: {false_positives}/{len(unknown)} ({false_positives / max(1, len(unknown)):.3%})")
+
+    db_instrumentation.enable()
+    password_hashing.warm_up()
+    print(f"\n{'cenário':<14} {'filtro':<9} {'p50 ms':>9} {'p99 ms':>9} {'tentativas/s':>13} {'consultas/tent.':>16}")
+    try:
+        for enabled in (True, False):
+            database.IDENTITY_FILTER_ENABLED = enabled
+            label = "ligado" if enabled else "desligado"
+            results = [
+                ("credenciais", measure_sync("get_user_credentials", database.get_user_credentials, attempts)),
+                ("cadastro", measure_sync(
+                    "identity_exists", lambda identifier: database.identity_exists(identifier, identifier + "@novo.example"), attempts
+                )),
+                ("login", measure_logins(attempts, args.concurrency)),
+            ]
+            for name, result in results:
+                print(
+                    f"{name:<14} {label:<9} {result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f}"
+                    f" {result['ops_per_sec']:>13.0f} {result['queries_per_op']:>16.3f}"
+                )
+    finally:
+        database.IDENTITY_FILTER_ENABLED = True
+        async_database.shutdown()
+        password_hashing.shutdown()
+
+
+if __name__ == "__main__":
+    main()
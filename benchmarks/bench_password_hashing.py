@@ -0,0 +1,71 @@
+"""
+Benchmark do custo de login por configuração da KDF de senhas.
+
+Para cada configuração mede quantas verificações de senha (o trabalho de um
+login) um núcleo consegue fazer por segundo e, em seguida, a vazão usando o pool
+de processos com todos os workers.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.bench_password_hashing [--duration 2] [--workers N]
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import password_hashing
+
+COST_SETTINGS = [
+    ("scrypt", (2 ** 12, 8, 1)),
+    ("scrypt", (2 ** 14, 8, 1)),
+    ("scrypt", (2 ** 15, 8, 1)),
+    ("pbkdf2_sha256", (100_000,)),
+    ("pbkdf2_sha256", (310_000,)),
+    ("pbkdf2_sha256", (600_000,)),
+]
+
+PASSWORD = "senha-de-teste"
+SALT = "0123456789abcdef0123456789abcdef"
+
+
+def _verify_batch(stored_hash, count):
+    for _ in range(count):
+        password_hashing.verify_password(PASSWORD, stored_hash, SALT)
+    return count
+
+
+def logins_per_second_single_core(stored_hash, duration):
+    """Verificações sequenciais por segundo em um único processo."""
+    done = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        password_hashing.verify_password(PASSWORD, stored_hash, SALT)
+        done += 1
+    return done / (time.perf_counter() - started)
+
+
+def logins_per_second_pool(executor, workers, stored_hash, per_core_rate, duration):
+    """Vazão total distribuindo lotes entre os processos do pool."""
+    batch = max(1, int(per_core_rate * duration))
+    started = time.perf_counter()
+    done = sum(executor.map(_verify_batch, [stored_hash] * workers, [batch] * workers))
+    return done / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=2.0, help="segundos por medição")
+    parser.add_argument("--workers", type=int, default=password_hashing.HASH_WORKERS)
+    args = parser.parse_args()
+
+    print(f"{'algoritmo':<15} {'parâmetros':<20} {'logins/s/núcleo':>16} {'logins/s (' + str(args.workers) + ' proc.)':>20}")
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for algorithm, params in COST_SETTINGS:
+            stored_hash = password_hashing.hash_password(PASSWORD, SALT, algorithm, params)
+            per_core = logins_per_second_single_core(stored_hash, args.duration)
+            pooled = logins_per_second_pool(executor, args.workers, stored_hash, per_core, args.duration)
+            label = ",".join(str(value) for value in params)
+            print(f"{algorithm:<15} {label:<20} {per_core:>16.1f} {pooled:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Teste de carga com sessões simultâneas percorrendo o fluxo das telas do app.
+
+Cada sessão simulada faz o que um aluno faz no Flet, chamando as mesmas funções
+que as telas chamam, no mesmo loop de eventos e executores de um worker:
+
+    login     LoginScreen: auth.login + issue_token_async
+    home      rota protegida + HomeScreen: get_home_payload
+    ficha     WorkoutScreen: get_user_workout_by_id + get_user_workout_details
+    busca     ExercisePickerScreen: primeira página e uma busca por tecla digitada
+              (cada consulta é uma amostra; o intervalo entre teclas não conta)
+    salvar    save_changes: update_workout e a recarga da ficha
+
+Entre os passos há tempos de reflexão aleatórios (exponenciais, com média
+--think). Depois do login a sessão repete o ciclo home -> salvar --rounds vezes.
+Com --processes > 1 as sessões são divididas entre processos independentes,
+como vários workers do Flet sobre o mesmo arquivo do banco.
+
+Relata, por passo, a vazão e as latências p50/p99 (sem contar a reflexão), os
+erros, e a contenção do SQLite: erros "database is locked" (pela instrumentação
+de db_instrumentation, ligada durante o teste), transações desfeitas e esperas
+pelo pool de conexões.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.load_test [--sessions 1000] [--processes 1] [--rounds 3]
+        [--think 2.0] [--ramp-up 30] [--db caminho.db] [--output resultado.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import async_database
+import auth
+import database
+import db_instrumentation
+import password_hashing
+import session_tokens
+from benchmarks.bench_database import PASSWORD, count_users, percentile, provision_bulk_path, username_for
+from screens.exercise_picker_screen import PAGE_SIZE
+from workout_edit_state import WorkoutEditState
+
+STEPS = ("login", "home", "ficha", "busca", "salvar")
+
+# O que o aluno digita na busca, uma consulta por tecla
+SEARCH_TERMS = ("supino", "rosca", "agach", "tríceps", "remada", "elevação", "panturrilha")
+TYPING_DELAY = 0.15
+MAX_EXERCISES = 9
+
+
+class SessionStats:
+    """Latências e erros de todas as sessões de um processo."""
+
+    def __init__(self):
+        self.samples = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.error_messages = {}
+        self.flows = 0
+
+    async def timed(self, step, coro):
+        started = time.perf_counter()
+        try:
+            result = await coro
+        except (sqlite3.Error, OSError) as e:
+            self.errors[step] += 1
+            message = f"{type(e).__name__}: {e}"
+            self.error_messages[message] = self.error_messages.get(message, 0) + 1
+            return None
+        self.samples[step].append(time.perf_counter() - started)
+        return result
+
+
+def think(rng, mean):
+    # Exponencial truncada: a maioria das pausas é curta, algumas bem longas
+    return asyncio.sleep(min(rng.expovariate(1 / mean), mean * 4) if mean > 0 else 0)
+
+
+async def login(identifier):
+    user_id = await auth.login(identifier, PASSWORD)
+    if not user_id:
+        raise OSError(f"login recusado para {identifier}")
+    return user_id, await session_tokens.issue_token_async(user_id)
+
+
+async def open_home(token, user_id):
+    await session_tokens.validate_token_async(token)
+    return await async_database.get_home_payload(user_id)
+
+
+async def open_workout(token, user_workout_id):
+    await session_tokens.validate_token_async(token)
+    workout = await async_database.get_user_workout_by_id(user_workout_id)
+    exercises = await async_database.get_user_workout_details(user_workout_id)
+    return workout['title'], exercises
+
+
+async def search_exercises(token, term):
+    """Uma consulta do seletor: a primeira página ou a busca após uma tecla."""
+    await session_tokens.validate_token_async(token)
+    return await async_database.search_master_exercises(term, PAGE_SIZE + 1, 0)
+
+
+async def save_workout(token, state):
+    await session_tokens.validate_token_async(token)
+    if not await async_database.update_workout(state.user_workout_id, state.to_workout_data()):
+        raise OSError(f"ficha {state.user_workout_id} não foi salva")
+    await async_database.get_user_workout_by_id(state.user_workout_id)
+    return await async_database.get_user_workout_details(state.user_workout_id)
+
+
+def edit(state, rng, picked):
+    """Edição típica: muda as séries de um exercício e adiciona (ou remove) outro."""
+    exercises = list(state)
+    if exercises:
+        target = rng.choice(exercises)
+        state.set_series(target.user_exercise_id, rng.choice(("3x10", "4x8-10", "3x12-15", "5x5")))
+    if len(exercises) >= MAX_EXERCISES:
+        state.remove_exercise(rng.choice(exercises).user_exercise_id)
+    elif picked:
+        choice = rng.choice(picked[:PAGE_SIZE])
+        state.add_exercise(choice['master_exercise_id'], choice['name'])
+
+
+async def run_session(user_index, args, rng, stats):
+    await asyncio.sleep(rng.uniform(0, args.ramp_up))
+
+    logged_in = await stats.timed("login", login(username_for(user_index)))
+    if logged_in is None:
+        return
+    user_id, token = logged_in
+
+    for _ in range(args.rounds):
+        await think(rng, args.think)
+        home = await stats.timed("home", open_home(token, user_id))
+        if not home or not home['workouts']:
+            continue
+
+        await think(rng, args.think)
+        user_workout_id = rng.choice(home['workouts'])['user_workout_id']
+        opened = await stats.timed("ficha", open_workout(token, user_workout_id))
+        if opened is None:
+            continue
+        state = WorkoutEditState.from_rows(user_workout_id, *opened)
+
+        await think(rng, args.think)
+        picked = await stats.timed("busca", search_exercises(token, ""))
+        term = rng.choice(SEARCH_TERMS)
+        for length in range(2, len(term) + 1):
+            await asyncio.sleep(TYPING_DELAY)
+            picked = await stats.timed("busca", search_exercises(token, term[:length])) or picked
+
+        await think(rng, args.think)
+        edit(state, rng, picked)
+        if await stats.timed("salvar", save_workout(token, state)) is not None:
+            stats.flows += 1
+
+
+async def run_sessions(user_indexes, args, seed):
+    rng = random.Random(seed)
+    stats = SessionStats()
+    await asyncio.gather(*(
+        run_session(user_index, args, random.Random(rng.random()), stats) for user_index in user_indexes
+    ))
+    return stats
+
+
+def run_worker(db_file, user_indexes, args, seed):
+    """Roda um grupo de sessões em um processo (um "worker"); retorna as medições."""
+    database.DB_FILE = db_file
+    if args.pool_size:
+        database.configure_pool(size=args.pool_size)
+        async_database.DB_EXECUTOR_WORKERS = args.pool_size
+    db_instrumentation.enable()
+    db_instrumentation.reset()
+    password_hashing.warm_up()
+
+    started = time.perf_counter()
+    try:
+        stats = asyncio.run(run_sessions(user_indexes, args, seed))
+    finally:
+        async_database.shutdown()
+        password_hashing.shutdown()
+    elapsed = time.perf_counter() - started
+
+    metrics = db_instrumentation.snapshot()
+    result = {
+        "elapsed": elapsed,
+        "samples": stats.samples,
+        "errors": stats.errors,
+        "error_messages": stats.error_messages,
+        "flows": stats.flows,
+        "lock_errors": metrics["lock_errors"],
+        "rolled_back": metrics["transactions"]["rolled_back"],
+        "pool": database.get_pool_stats(),
+    }
+    database.close_pool()
+    return result
+
+
+# --- Relatório ---
+
+def merge(results):
+    merged = {
+        "elapsed": max(result["elapsed"] for result in results),
+        "samples": {step: [] for step in STEPS},
+        "errors": {step: 0 for step in STEPS},
+        "error_messages": {},
+        "flows": 0, "lock_errors": 0, "rolled_back": 0,
+        "pool_waits": 0, "pool_timeouts": 0, "pool_wait_seconds": 0.0,
+    }
+    for result in results:
+        for step in STEPS:
+            merged["samples"][step].extend(result["samples"][step])
+            merged["errors"][step] += result["errors"][step]
+        for message, count in result["error_messages"].items():
+            merged["error_messages"][message] = merged["error_messages"].get(message, 0) + count
+        for key in ("flows", "lock_errors", "rolled_back"):
+            merged[key] += result[key]
+        merged["pool_waits"] += result["pool"].get("waits", 0)
+        merged["pool_timeouts"] += result["pool"].get("timeouts", 0)
+        merged["pool_wait_seconds"] += result["pool"].get("wait_seconds", 0.0)
+    return merged
+
+
+def summarize(merged):
+    rows = []
+    for step in STEPS:
+        samples = sorted(merged["samples"][step])
+        rows.append({
+            "step": step,
+            "count": len(samples),
+            "errors": merged["errors"][step],
+            "p50_ms": percentile(samples, 0.50) * 1000 if samples else None,
+            "p99_ms": percentile(samples, 0.99) * 1000 if samples else None,
+            "ops_per_sec": len(samples) / merged["elapsed"] if merged["elapsed"] else 0.0,
+        })
+    return rows
+
+
+def print_report(args, merged, rows):
+    elapsed = merged["elapsed"]
+    print(f"\n{args.sessions} sessões em {args.processes} processo(s), {elapsed:.1f}s")
+    print(f"{'passo':<8} {'chamadas':>9} {'erros':>6} {'p50 ms':>9} {'p99 ms':>9} {'ops/s':>9}")
+    for row in rows:
+        p50 = f"{row['p50_ms']:.2f}" if row["p50_ms"] is not None else "-"
+        p99 = f"{row['p99_ms']:.2f}" if row["p99_ms"] is not None else "-"
+        print(f"{row['step']:<8} {row['count']:>9} {row['errors']:>6} {p50:>9} {p99:>9} {row['ops_per_sec']:>9.1f}")
+    print(f"Fluxos completos: {merged['flows']} ({merged['flows'] / elapsed:.1f}/s)")
+    print(f"Contenção: {merged['lock_errors']} erros 'database is locked', "
+          f"{merged['rolled_back']} transações desfeitas, "
+          f"{merged['pool_waits']} esperas pelo pool ({merged['pool_wait_seconds']:.2f}s, "
+          f"{merged['pool_timeouts']} estouros)")
+    for message, count in sorted(merged["error_messages"].items(), key=lambda item: -item[1]):
+        print(f"  {count:>6}x {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000, help="sessões simultâneas (uma por aluno)")
+    parser.add_argument("--processes", type=int, default=1, help="processos (workers) entre os quais as sessões são divididas")
+    parser.add_argument("--rounds", type=int, default=3, help="ciclos home -> salvar por sessão após o login")
+    parser.add_argument("--think", type=float, default=2.0, help="tempo médio de reflexão entre passos, em segundos")
+    parser.add_argument("--ramp-up", type=float, default=30.0, help="segundos ao longo dos quais as sessões começam")
+    parser.add_argument("--pool-size", type=int, help="conexões do pool (e threads do executor) por processo")
+    parser.add_argument("--db", help="arquivo do banco; reaproveitado entre execuções (padrão: arquivo temporário)")
+    parser.add_argument("--output", help="grava o resultado em JSON")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    database.DB_FILE = args.db or os.path.join(tempfile.mkdtemp(prefix="champs-load-"), "load.db")
+    database.init_db()
+    existing = count_users()
+    if existing < args.sessions:
+        started = time.perf_counter()
+        provision_bulk_path(existing, args.sessions)
+        print(f"{args.sessions - existing} alunos gerados em {time.perf_counter() - started:.1f}s")
+    database.close_pool()
+    print(f"Banco: {database.DB_FILE}")
+
+    groups = [list(range(index, args.sessions, args.processes)) for index in range(args.processes)]
+    if args.processes == 1:
+        results = [run_worker(database.DB_FILE, groups[0], args, args.seed)]
+    else:
+        # spawn: os processos não herdam conexões SQLite abertas do processo pai
+        with ProcessPoolExecutor(max_workers=args.processes, mp_context=get_context("spawn")) as executor:
+            futures = [
+                executor.submit(run_worker, database.DB_FILE, group, args, args.seed + index)
+                for index, group in enumerate(groups)
+            ]
+            results = [future.result() for future in futures]
+
+    merged = merge(results)
+    rows = summarize(merged)
+    print_report(args, merged, rows)
+
+    if args.output:
+        report = {
+            "config": vars(args),
+            "elapsed": merged["elapsed"],
+            "flows": merged["flows"],
+            "steps": rows,
+            "contention": {
+                key: merged[key] for key in ("lock_errors", "rolled_back", "pool_waits", "pool_timeouts", "pool_wait_seconds")
+            },
+            "error_messages": merged["error_messages"],
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Resultados gravados em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Filtro de Bloom: conjunto aproximado em memória, usado para responder "com
+certeza não existe" sem consultar o banco (ver o filtro de identidades em
+database.py).
+
+`key in filtro` nunca dá falso negativo para uma chave adicionada; falsos
+positivos acontecem com a taxa configurada enquanto o filtro tiver no máximo
+`capacity` chaves. As posições vêm de um único BLAKE2b por chave, combinado
+por hashing duplo (Kirsch-Mitzenmacher).
+"""
+import hashlib
+import math
+
+
+class BloomFilter:
+    """Filtro de Bloom dimensionado para `capacity` chaves com taxa de falsos positivos `error_rate`."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        num_bits = self.num_bits
+        return [(first + i * second) % num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        bits = self._bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def __len__(self):
+        """Chaves adicionadas (com repetições)."""
+        return self.count
+
+    @property
+    def is_full(self):
+        """True quando o número de chaves passou da capacidade (a taxa de erro sobe)."""
+        return self.count > self.capacity
@@ -0,0 +1,310 @@
+"""
+Exportação e importação em lote de alunos e fichas de treino.
+
+Exportação: percorre o banco com um gerador (database.iter_member_export_rows,
+que lê com fetchmany) e grava em NDJSON (um aluno por linha, com as fichas
+aninhadas) ou CSV (uma linha por exercício). A memória usada não depende do
+tamanho da base: no máximo um aluno é montado por vez.
+
+Importação: lê o mesmo formato (ou o de outra academia, com os mesmos campos),
+valida cada aluno, resolve os nomes dos exercícios pelo mapa do catálogo já
+carregado em memória e grava em lotes, cada lote em uma transação
+(database.import_members), informando o progresso a cada lote.
+
+Campos de um aluno (NDJSON):
+    {"username": ..., "email": ..., "is_active": 1, "created_at": "AAAA-MM-DD HH:MM:SS",
+     "password_hash": ..., "salt": ...,  (ou "password" em texto puro, para migrações)
+     "workouts": [{"title": ..., "exercises": [{"name": ..., "series": "3x10"}, ...]}, ...]}
+
+password_hash só é aceito nos formatos que password_hashing confere (SHA-256
+legado em hex ou scrypt/pbkdf2_sha256 com os parâmetros); alunos com hash de
+outro sistema precisam vir com "password", ou são relatados como inválidos.
+
+No CSV as linhas de um mesmo aluno devem ser consecutivas, como na exportação.
+"""
+import csv
+import itertools
+import json
+from collections import namedtuple
+from contextlib import closing
+
+import database
+import password_hashing
+
+FORMATS = ("ndjson", "csv")
+
+CSV_FIELDS = ["username", "email", "is_active", "created_at", "workout", "exercise", "series"]
+CSV_CREDENTIAL_FIELDS = ["password_hash", "salt"]
+
+# Resultado de uma importação; `invalid` lista (número do aluno na entrada, erros)
+ImportReport = namedtuple("ImportReport", ["read", "imported", "skipped_existing", "invalid"])
+
+
+def _check_format(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato desconhecido: {fmt!r} (use {' ou '.join(FORMATS)}).")
+
+
+# --- Exportação ---
+
+def iter_member_records(include_credentials=False):
+    """Gera um dicionário por aluno (formato NDJSON), montando um aluno por vez."""
+    with closing(database.iter_member_export_rows()) as rows:
+        yield from _group_member_records(rows, include_credentials)
+
+
+def _group_member_records(rows, include_credentials):
+    for _, member_rows in itertools.groupby(rows, key=lambda row: row['user_id']):
+        first = next(member_rows)
+        record = {
+            "username": first['username'],
+            "email": first['email'],
+            "is_active": first['is_active'],
+            "created_at": first['created_at'],
+        }
+        if include_credentials:
+            record["password_hash"] = first['password_hash']
+            record["salt"] = first['salt']
+
+        workouts = []
+        current_workout_id = None
+        for row in itertools.chain([first], member_rows):
+            if row['user_workout_id'] is None:
+                continue
+            if row['user_workout_id'] != current_workout_id:
+                current_workout_id = row['user_workout_id']
+                workouts.append({"title": row['title'], "exercises": []})
+            if row['exercise_name'] is not None:
+                workouts[-1]["exercises"].append({"name": row['exercise_name'], "series": row['series']})
+        record["workouts"] = workouts
+        yield record
+
+
+def iter_csv_rows(include_credentials=False):
+    """Gera uma linha de CSV (lista de valores) por exercício, sem agrupar nada em memória."""
+    with closing(database.iter_member_export_rows()) as rows:
+        for row in rows:
+            values = [row['username'], row['email'], row['is_active'], row['created_at'],
+                      row['title'] or "", row['exercise_name'] or "", row['series'] or ""]
+            if include_credentials:
+                values += [row['password_hash'], row['salt']]
+            yield values
+
+
+def export_members(out, fmt="ndjson", include_credentials=False, progress=None, progress_every=1000):
+    """
+    Grava todos os alunos e fichas em `out` (arquivo de texto aberto para escrita).
+
+    Hashes de senha só são exportados com `include_credentials` (ex.: migração
+    entre instalações). `progress(n)` é chamada a cada `progress_every` registros
+    escritos (alunos no NDJSON, linhas no CSV). Retorna o total de registros.
+    """
+    _check_format(fmt)
+    written = 0
+    if fmt == "ndjson":
+        for record in iter_member_records(include_credentials):
+            out.write(json.dumps(record, ensure_ascii=False))
+            out.write("\n")
+            written += 1
+            if progress and written % progress_every == 0:
+                progress(written)
+    else:
+        writer = csv.writer(out)
+        writer.writerow(CSV_FIELDS + (CSV_CREDENTIAL_FIELDS if include_credentials else []))
+        for values in iter_csv_rows(include_credentials):
+            writer.writerow(values)
+            written += 1
+            if progress and written % progress_every == 0:
+                progress(written)
+    if progress:
+        progress(written)
+    return written
+
+
+# --- Leitura da entrada ---
+
+def read_members(source, fmt="ndjson"):
+    """Gera um dicionário por aluno lido de `source` (arquivo de texto aberto)."""
+    _check_format(fmt)
+    if fmt == "ndjson":
+        for line in source:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield {"_error": f"JSON inválido: {e.msg}"}
+        return
+
+    reader = csv.DictReader(source)
+    for _, rows in itertools.groupby(reader, key=lambda row: (row.get("username"), row.get("email"))):
+        rows = list(rows)
+        first = rows[0]
+        record = {field: first.get(field) for field in ("username", "email", "is_active", "created_at", "password_hash", "salt", "password")}
+        workouts = []
+        for row in rows:
+            title = row.get("workout")
+            if not title:
+                continue
+            if not workouts or workouts[-1]["title"] != title:
+                workouts.append({"title": title, "exercises": []})
+            if row.get("exercise"):
+                workouts[-1]["exercises"].append({"name": row["exercise"], "series": row.get("series")})
+        record["workouts"] = workouts
+        yield record
+
+
+# --- Validação ---
+
+class ExerciseResolver:
+    """
+    Resolve nomes de exercícios para master_exercise_id pelo catálogo em memória.
+    Aceita diferenças de maiúsculas e acentos ("supino reto (barra)").
+    """
+
+    def __init__(self):
+        self.ids_by_name = database._get_master_exercise_ids()
+        self.ids_by_normalized = {
+            database.normalize_search_text(name): master_id for name, master_id in self.ids_by_name.items()
+        }
+
+    def resolve(self, name):
+        master_id = self.ids_by_name.get(name)
+        if master_id is None:
+            master_id = self.ids_by_normalized.get(database.normalize_search_text(name))
+        return master_id
+
+
+def _text(value):
+    return value.strip() if isinstance(value, str) else ""
+
+
+def validate_member(record, resolver):
+    """
+    Valida um aluno lido da entrada. Retorna (membro, erros): o membro no formato
+    de database.import_members (com a senha ainda por hashear, se vier em texto)
+    ou None se houver erros.
+    """
+    if "_error" in record:
+        return None, [record["_error"]]
+
+    errors = []
+    username = _text(record.get("username"))
+    email = _text(record.get("email"))
+    if not username:
+        errors.append("username vazio")
+    if "@" not in email:
+        errors.append(f"e-mail inválido: {record.get('email')!r}")
+
+    password_hash = _text(record.get("password_hash"))
+    salt = _text(record.get("salt"))
+    password = record.get("password") or None
+    if password_hash and not password_hashing.is_supported_hash(password_hash):
+        # Hash de outro sistema (ex.: bcrypt): só a senha em texto puro serve
+        if not password:
+            errors.append(
+                "password_hash em formato não suportado (use SHA-256 legado em hex ou "
+                f"{' / '.join(password_hashing.SUPPORTED_ALGORITHMS)}), ou informe password"
+            )
+        password_hash = salt = ""
+    elif not (password_hash and salt) and not password:
+        errors.append("sem senha: informe password_hash e salt, ou password")
+
+    is_active = record.get("is_active", 1)
+    if is_active in ("", None):
+        is_active = 1
+    try:
+        is_active = 1 if int(is_active) else 0
+    except (TypeError, ValueError):
+        errors.append(f"is_active inválido: {is_active!r}")
+
+    workouts = []
+    raw_workouts = record.get("workouts") or []
+    if not isinstance(raw_workouts, list):
+        errors.append("workouts deve ser uma lista")
+        raw_workouts = []
+    for workout in raw_workouts:
+        title = _text(workout.get("title")) if isinstance(workout, dict) else ""
+        if not title:
+            errors.append("ficha sem título")
+            continue
+        exercises = []
+        for exercise in workout.get("exercises") or []:
+            name = _text(exercise.get("name")) if isinstance(exercise, dict) else ""
+            series = _text(exercise.get("series")) if isinstance(exercise, dict) else ""
+            master_id = resolver.resolve(name) if name else None
+            if master_id is None:
+                errors.append(f"exercício desconhecido em {title!r}: {name!r}")
+            elif not series:
+                errors.append(f"séries vazias para {name!r} em {title!r}")
+            else:
+                exercises.append((master_id, series))
+        workouts.append((title, exercises))
+
+    if errors:
+        return None, errors
+    created_at = _text(record.get("created_at")) or None
+    # A senha em texto puro fica no lugar do hash até o lote ser hasheado
+    return [username, email, is_active, created_at, password_hash or None, salt or None, workouts, password], []
+
+
+def _hash_plain_passwords(members):
+    """Hasheia, em paralelo, as senhas em texto puro do lote."""
+    pending = [member for member in members if member[4] is None]
+    if not pending:
+        return
+    salts = [password_hashing.new_salt() for _ in pending]
+    hashes = password_hashing.hash_passwords([member[7] for member in pending], salts)
+    for member, password_hash, salt in zip(pending, hashes, salts):
+        member[4], member[5] = password_hash, salt
+
+
+# --- Importação ---
+
+def import_members(source, fmt="ndjson", chunk_size=500, progress=None):
+    """
+    Importa alunos e fichas de `source` (arquivo de texto aberto).
+
+    Alunos inválidos são pulados e relatados; os já cadastrados (mesmo nome de
+    usuário ou e-mail) são ignorados. Os válidos são gravados em lotes de
+    `chunk_size`, um lote por transação; `progress(report)` é chamada após cada
+    lote com um ImportReport parcial. Retorna o ImportReport final.
+    """
+    resolver = ExerciseResolver()
+    read = imported = skipped = 0
+    invalid = []
+    chunk = []
+    chunk_indexes = []
+
+    def flush():
+        nonlocal imported, skipped
+        _hash_plain_passwords(chunk)
+        user_ids = database.import_members([tuple(member[:7]) for member in chunk])
+        if user_ids is None:
+            # Erro do banco: o lote inteiro foi desfeito
+            invalid.extend((index, ["erro do banco ao gravar o lote"]) for index in chunk_indexes)
+        else:
+            created = sum(1 for user_id in user_ids if user_id)
+            imported += created
+            skipped += len(user_ids) - created
+        chunk.clear()
+        chunk_indexes.clear()
+        if progress:
+            progress(ImportReport(read, imported, skipped, list(invalid)))
+
+    for index, record in enumerate(read_members(source, fmt), start=1):
+        read += 1
+        if not isinstance(record, dict):
+            invalid.append((index, ["registro não é um objeto"]))
+            continue
+        member, errors = validate_member(record, resolver)
+        if errors:
+            invalid.append((index, errors))
+            continue
+        chunk.append(member)
+        chunk_indexes.append(index)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    return ImportReport(read, imported, skipped, invalid)
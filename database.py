@@ -1,197 +1,867 @@
 import sqlite3
-import hashlib
 import os
 import logging
+import queue
+import re
+import threading
+import time
+import unicodedata
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from types import MappingProxyType
+
+import db_instrumentation
+import password_hashing
+from bloom_filter import BloomFilter
+from db_instrumentation import instrumented
+from series_parser import parse_series
 
 DB_FILE = "champs_gym.db"
 
-def get_db_connection():
-    """Cria e retorna uma conexão com o banco de dados."""
-    conn = sqlite3.connect(DB_FILE)
+# --- Configuração do pool de conexões ---
+# Os valores podem ser ajustados por variáveis de ambiente ou por configure_pool().
+DB_POOL_SIZE = int(os.environ.get("CHAMPS_DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.environ.get("CHAMPS_DB_POOL_TIMEOUT", "10"))
+DB_BUSY_TIMEOUT_MS = 5000
+DB_MMAP_SIZE = 64 * 1024 * 1024      # 64 MiB
+DB_CACHE_SIZE_KIB = 16 * 1024        # 16 MiB de page cache por conexão
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Nenhuma conexão do pool ficou livre dentro do tempo limite."""
+
+
+def get_db_connection(db_file=None):
+    """
+    Cria e retorna uma nova conexão com o banco de dados, já configurada.
+
+    Normalmente as funções deste módulo usam db_connection(), que reaproveita
+    conexões do pool; esta função é a fábrica usada pelo próprio pool.
+    """
+    conn = sqlite3.connect(
+        db_file or DB_FILE,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,  # o pool garante uso exclusivo por uma thread de cada vez
+        factory=db_instrumentation.connection_factory(),  # instrumentada só se habilitada
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KIB}")
     return conn
 
-def init_db():
+
+class ConnectionPool:
     """
-    Inicializa o banco de dados, criando as tabelas e os papéis (roles) iniciais
-    se ainda não existirem.
+    Pool de conexões SQLite de longa duração, seguro para várias threads.
+
+    Cada conexão é configurada uma única vez (ver get_db_connection) e depois
+    reutilizada. Uma thread que já possui uma conexão recebe a mesma conexão em
+    chamadas aninhadas, evitando deadlock quando o pool está esgotado.
     """
-    conn = None
-    try:
-        logging.info(f"Conectando ao banco de dados: {DB_FILE}")
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        logging.info("Conexão com o banco de dados estabelecida.")
 
-        # --- Criação das Tabelas ---
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL UNIQUE,
-            email TEXT NOT NULL UNIQUE,
-            password_hash TEXT NOT NULL,
-            salt TEXT NOT NULL,
-            is_verified INTEGER NOT NULL DEFAULT 0,
-            is_active INTEGER NOT NULL DEFAULT 1,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
+    def __init__(self, db_file, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.db_file = db_file
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._created = 0
+        self._closed = False
+        self._stats = {"hits": 0, "misses": 0, "waits": 0, "timeouts": 0, "wait_seconds": 0.0}
 
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS roles (
-            role_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            role_name TEXT NOT NULL UNIQUE
-        )
-        """)
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _acquire(self):
+        # 1. Conexão ociosa disponível: caminho rápido
+        try:
+            conn = self._idle.get_nowait()
+            self._count("hits")
+            return conn
+        except queue.Empty:
+            pass
+
+        # 2. Ainda há espaço no pool: cria uma nova conexão
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                conn = get_db_connection(self.db_file)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+            self._count("misses")
+            return conn
+
+        # 3. Pool esgotado: espera alguém devolver uma conexão
+        self._count("waits")
+        started = time.perf_counter()
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            self._count("timeouts")
+            raise PoolTimeoutError(
+                f"Nenhuma conexão livre no pool após {self.timeout}s (tamanho={self.size})."
+            )
+        finally:
+            self._count("wait_seconds", time.perf_counter() - started)
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _release(self, conn):
+        if self._closed:
+            self._discard(conn)
+            return
+        try:
+            # Nunca devolve ao pool uma transação pendente
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Empresta uma conexão do pool durante o bloco `with`."""
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            yield held
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    def stats(self):
+        """Retorna um retrato das métricas do pool."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["created"] = self._created
+        snapshot["size"] = self.size
+        snapshot["idle"] = self._idle.qsize()
+        snapshot["in_use"] = snapshot["created"] - snapshot["idle"]
+        return snapshot
+
+    def close(self):
+        """Fecha todas as conexões ociosas; as emprestadas são fechadas ao voltar."""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Retorna o pool do processo, recriando-o se DB_FILE tiver mudado."""
+    global _pool
+    pool = _pool
+    if pool is None or pool.db_file != DB_FILE:
+        with _pool_lock:
+            if _pool is None or _pool.db_file != DB_FILE:
+                if _pool is not None:
+                    _pool.close()
+                _pool = ConnectionPool(DB_FILE, DB_POOL_SIZE, DB_POOL_TIMEOUT)
+            pool = _pool
+    return pool
+
+
+def configure_pool(size=None, timeout=None):
+    """Ajusta o tamanho e o tempo limite do pool, recriando-o."""
+    global _pool, DB_POOL_SIZE, DB_POOL_TIMEOUT
+    with _pool_lock:
+        if size is not None:
+            DB_POOL_SIZE = size
+        if timeout is not None:
+            DB_POOL_TIMEOUT = timeout
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def close_pool():
+    """Fecha o pool do processo (ex.: ao encerrar o app ou trocar de banco)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def get_pool_stats():
+    """Métricas do pool: hits, misses, waits, timeouts e conexões em uso."""
+    return get_pool().stats()
+
+
+def db_connection():
+    """Atalho para `get_pool().connection()`, usado por todas as consultas."""
+    return get_pool().connection()
+
+# --- Biblioteca de exercícios (master_exercises) semeada pelas migrações ---
+MASTER_EXERCISE_LIST = [
+    # Peito
+    ('Supino Reto (Barra)', 'Peito'),
+    ('Supino Reto (Halteres)', 'Peito'),
+    ('Supino Inclinado (Barra)', 'Peito'),
+    ('Supino Inclinado (Halteres)', 'Peito'),
+    ('Supino Declinado (Barra)', 'Peito'),
+    ('Crucifixo (Halteres)', 'Peito'),
+    ('Crucifixo (Polia)', 'Peito'),
+    ('Peck Deck (Máquina)', 'Peito'),
+    ('Paralelas (Dips)', 'Peito'),
+    ('Flexão', 'Peito'),
+    # Costas
+    ('Barra Fixa', 'Costas'),
+    ('Puxada Alta (Frontal)', 'Costas'),
+    ('Remada Curvada (Barra)', 'Costas'),
+    ('Remada Cavalinho', 'Costas'),
+    ('Remada Unilateral (Serrote)', 'Costas'),
+    ('Pulldown (Braços Estendidos)', 'Costas'),
+    ('Remada Sentada (Polia)', 'Costas'),
+    # Pernas (Quadríceps)
+    ('Agachamento Livre', 'Pernas'),
+    ('Leg Press 45°', 'Pernas'),
+    ('Afundo (Passada)', 'Pernas'),
+    ('Agachamento Búlgaro', 'Pernas'),
+    ('Cadeira Extensora', 'Pernas'),
+    # Pernas (Posterior e Glúteos)
+    ('Stiff (Romeno)', 'Pernas'),
+    ('Cadeira Flexora', 'Pernas'),
+    ('Mesa Flexora', 'Pernas'),
+    ('Elevação Pélvica', 'Pernas'),
+    # Panturrilhas
+    ('Panturrilha em Pé (Gêmeos)', 'Pernas'),
+    ('Panturrilha Sentado (Sóleo)', 'Pernas'),
+    # Ombros
+    ('Desenvolvimento (Halteres)', 'Ombros'),
+    ('Desenvolvimento (Barra)', 'Ombros'),
+    ('Elevação Lateral (Halteres)', 'Ombros'),
+    ('Elevação Lateral (Polia)', 'Ombros'),
+    ('Elevação Frontal (Halteres)', 'Ombros'),
+    ('Crucifixo Invertido (Halteres)', 'Ombros'),
+    ('Crucifixo Invertido (Peck Deck)', 'Ombros'),
+    ('Remada Alta', 'Ombros'),
+    # Bíceps
+    ('Rosca Direta (Barra)', 'Bíceps'),
+    ('Rosca Direta (Barra W)', 'Bíceps'),
+    ('Rosca Alternada (Halteres)', 'Bíceps'),
+    ('Rosca Scott', 'Bíceps'),
+    ('Rosca Concentrada', 'Bíceps'),
+    # Tríceps
+    ('Tríceps Testa (Polia)', 'Tríceps'),
+    ('Tríceps Testa (Barra W)', 'Tríceps'),
+    ('Tríceps Corda (Polia)', 'Tríceps'),
+    ('Mergulho no Banco', 'Tríceps'),
+    ('Tríceps Francês (Halter)', 'Tríceps'),
+    # Abdômen
+    ('Abdominal Supra', 'Abdômen'),
+    ('Abdominal Infra (na paralela)', 'Abdômen'),
+    ('Prancha', 'Abdômen'),
+    ('Elevação de Pernas', 'Abdômen'),
+]
 
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_roles (
-            user_id INTEGER NOT NULL,
-            role_id INTEGER NOT NULL,
-            PRIMARY KEY (user_id, role_id),
-            FOREIGN KEY (user_id) REFERENCES users(user_id),
-            FOREIGN KEY (role_id) REFERENCES roles(role_id)
-        )
-        """)
 
+# --- Migrações de schema ---
+# Cada migração roda uma única vez, dentro de uma transação própria, e a versão
+# aplicada fica registrada em PRAGMA user_version. Para alterar o schema, acrescente
+# uma nova função ao final de MIGRATIONS; nunca edite uma migração já publicada.
+
+def _migration_001_initial_schema(cursor):
+    """Schema inicial: usuários, papéis, tokens e fichas de treino."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        email TEXT NOT NULL UNIQUE,
+        password_hash TEXT NOT NULL,
+        salt TEXT NOT NULL,
+        is_verified INTEGER NOT NULL DEFAULT 0,
+        is_active INTEGER NOT NULL DEFAULT 1,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS roles (
+        role_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        role_name TEXT NOT NULL UNIQUE
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS user_roles (
+        user_id INTEGER NOT NULL,
+        role_id INTEGER NOT NULL,
+        PRIMARY KEY (user_id, role_id),
+        FOREIGN KEY (user_id) REFERENCES users(user_id),
+        FOREIGN KEY (role_id) REFERENCES roles(role_id)
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS user_tokens (
+        token_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        token_hash TEXT NOT NULL UNIQUE,
+        token_type TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        expires_at DATETIME NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    )
+    """)
+
+    # Tabela mestre de todos os exercícios disponíveis
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS master_exercises (
+        master_exercise_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        muscle_group TEXT NOT NULL
+    )
+    """)
+
+    # Fichas de treino personalizadas para cada usuário
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS user_workouts (
+        user_workout_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    )
+    """)
+
+    # Exercícios específicos dentro da ficha de um usuário
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS user_exercises (
+        user_exercise_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_workout_id INTEGER NOT NULL,
+        master_exercise_id INTEGER NOT NULL,
+        series TEXT NOT NULL,
+        FOREIGN KEY (user_workout_id) REFERENCES user_workouts(user_workout_id),
+        FOREIGN KEY (master_exercise_id) REFERENCES master_exercises(master_exercise_id)
+    )
+    """)
+
+    # Bancos criados antes da coluna 'salt' existir
+    cursor.execute("PRAGMA table_info(users)")
+    columns = [row['name'] for row in cursor.fetchall()]
+    if 'salt' not in columns:
+        logging.info("Adicionando a coluna 'salt' à tabela 'users'.")
+        cursor.execute("ALTER TABLE users ADD COLUMN salt TEXT NOT NULL DEFAULT ''")
+
+    # Papéis (roles) e biblioteca de exercícios; OR IGNORE preserva bancos já populados
+    cursor.executemany("INSERT OR IGNORE INTO roles (role_name) VALUES (?)", [('user',), ('admin',)])
+    cursor.executemany(
+        "INSERT OR IGNORE INTO master_exercises (name, muscle_group) VALUES (?, ?)",
+        MASTER_EXERCISE_LIST
+    )
+
+
+def _migration_002_lookup_indexes(cursor):
+    """Índices secundários para as buscas por usuário e por ficha de treino."""
+    # (user_id, title) cobre get_user_workouts sem tocar a tabela
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_workouts_user ON user_workouts (user_id, title)")
+    # Entradas do índice ficam em ordem de user_exercise_id, dispensando ordenação
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_exercises_workout ON user_exercises (user_workout_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_tokens_user ON user_tokens (user_id, expires_at)")
+    # Catálogo lido já na ordem de exibição, sem B-tree temporária
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_master_exercises_group ON master_exercises (muscle_group, name)")
+
+
+def _migration_003_exercise_position(cursor):
+    """Coluna explícita de ordem dos exercícios dentro da ficha."""
+    cursor.execute("ALTER TABLE user_exercises ADD COLUMN position INTEGER NOT NULL DEFAULT 0")
+    # Preserva a ordem atual, que até aqui dependia da ordem de inserção
+    cursor.execute("""
+    UPDATE user_exercises
+    SET position = (
+        SELECT COUNT(*) FROM user_exercises AS earlier
+        WHERE earlier.user_workout_id = user_exercises.user_workout_id
+          AND earlier.user_exercise_id < user_exercises.user_exercise_id
+    )
+    """)
+    cursor.execute("CREATE INDEX idx_user_exercises_workout_position ON user_exercises (user_workout_id, position)")
+    cursor.execute("DROP INDEX IF EXISTS idx_user_exercises_workout")
+
+
+def _migration_004_exercise_search(cursor):
+    """Índice de busca textual (FTS5) sobre nome e grupo muscular dos exercícios."""
+    try:
+        # remove_diacritics: "triceps" encontra "Tríceps"; prefix: busca enquanto digita
         cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_tokens (
-            token_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            token_hash TEXT NOT NULL UNIQUE,
-            token_type TEXT NOT NULL,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            expires_at DATETIME NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        CREATE VIRTUAL TABLE master_exercises_fts USING fts5(
+            name, muscle_group,
+            content='master_exercises', content_rowid='master_exercise_id',
+            tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
         )
         """)
+    except sqlite3.OperationalError as e:
+        # SQLite sem FTS5: search_master_exercises filtra o catálogo em memória
+        logging.warning(f"FTS5 indisponível, busca de exercícios usará o catálogo em memória: {e}")
+        return
 
-        # Tabela mestre de todos os exercícios disponíveis
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS master_exercises (
-            master_exercise_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL UNIQUE,
-            muscle_group TEXT NOT NULL
+    cursor.execute("INSERT INTO master_exercises_fts (master_exercises_fts) VALUES ('rebuild')")
+    cursor.execute("""
+    CREATE TRIGGER master_exercises_fts_insert AFTER INSERT ON master_exercises BEGIN
+        INSERT INTO master_exercises_fts (rowid, name, muscle_group)
+        VALUES (new.master_exercise_id, new.name, new.muscle_group);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER master_exercises_fts_delete AFTER DELETE ON master_exercises BEGIN
+        INSERT INTO master_exercises_fts (master_exercises_fts, rowid, name, muscle_group)
+        VALUES ('delete', old.master_exercise_id, old.name, old.muscle_group);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER master_exercises_fts_update AFTER UPDATE ON master_exercises BEGIN
+        INSERT INTO master_exercises_fts (master_exercises_fts, rowid, name, muscle_group)
+        VALUES ('delete', old.master_exercise_id, old.name, old.muscle_group);
+        INSERT INTO master_exercises_fts (rowid, name, muscle_group)
+        VALUES (new.master_exercise_id, new.name, new.muscle_group);
+    END
+    """)
+
+
+def _migration_005_foreign_key_indexes(cursor):
+    """Índices nas chaves estrangeiras filhas ainda sem índice (exigidos por foreign_keys=ON)."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_exercises_master ON user_exercises (master_exercise_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_roles_role ON user_roles (role_id)")
+
+
+def _migration_006_token_expiry_index(cursor):
+    """Índice para a limpeza em lotes dos tokens expirados."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_tokens_expires ON user_tokens (expires_at)")
+
+
+def _migration_007_training_log(cursor):
+    """
+    Registro das séries realizadas (somente inserção) e os agregados mantidos a
+    cada inserção: volume semanal por grupo muscular e melhor série por exercício.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS workout_sets (
+        set_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        user_exercise_id INTEGER,
+        master_exercise_id INTEGER NOT NULL,
+        reps INTEGER NOT NULL CHECK (reps > 0),
+        load_kg REAL NOT NULL CHECK (load_kg >= 0),
+        performed_at DATETIME NOT NULL,
+        iso_week TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(user_id),
+        FOREIGN KEY (user_exercise_id) REFERENCES user_exercises(user_exercise_id) ON DELETE SET NULL,
+        FOREIGN KEY (master_exercise_id) REFERENCES master_exercises(master_exercise_id)
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_workout_sets_user_time ON workout_sets (user_id, performed_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_workout_sets_user_exercise ON workout_sets (user_exercise_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_workout_sets_master ON workout_sets (master_exercise_id)")
+    # Os agregados dependem de o histórico nunca mudar; só o vínculo com a ficha pode virar NULL
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS workout_sets_append_only
+    BEFORE UPDATE OF user_id, master_exercise_id, reps, load_kg, performed_at, iso_week ON workout_sets
+    BEGIN
+        SELECT RAISE(ABORT, 'workout_sets é somente inserção');
+    END
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS weekly_muscle_volume (
+        user_id INTEGER NOT NULL,
+        iso_week TEXT NOT NULL,
+        muscle_group TEXT NOT NULL,
+        sets INTEGER NOT NULL,
+        reps INTEGER NOT NULL,
+        volume_kg REAL NOT NULL,
+        PRIMARY KEY (user_id, iso_week, muscle_group),
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS exercise_best_sets (
+        user_id INTEGER NOT NULL,
+        master_exercise_id INTEGER NOT NULL,
+        reps INTEGER NOT NULL,
+        load_kg REAL NOT NULL,
+        estimated_1rm REAL NOT NULL,
+        performed_at DATETIME NOT NULL,
+        PRIMARY KEY (user_id, master_exercise_id),
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    ) WITHOUT ROWID
+    """)
+
+
+def _migration_008_parsed_series(cursor):
+    """
+    Colunas numéricas com a prescrição de séries já interpretada (ver
+    series_parser), preenchidas para as linhas existentes em lotes.
+    """
+    cursor.execute("ALTER TABLE user_exercises ADD COLUMN sets INTEGER")
+    cursor.execute("ALTER TABLE user_exercises ADD COLUMN rep_min INTEGER")
+    cursor.execute("ALTER TABLE user_exercises ADD COLUMN rep_max INTEGER")
+    cursor.execute("ALTER TABLE user_exercises ADD COLUMN series_modifiers TEXT")
+
+    # Lotes pela chave primária: memória constante mesmo com milhões de linhas
+    last_id = 0
+    while True:
+        cursor.execute(
+            "SELECT user_exercise_id, series FROM user_exercises WHERE user_exercise_id > ? ORDER BY user_exercise_id LIMIT 1000",
+            (last_id,)
         )
-        """)
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        cursor.executemany(
+            "UPDATE user_exercises SET sets = ?, rep_min = ?, rep_max = ?, series_modifiers = ? WHERE user_exercise_id = ?",
+            [(*parse_series(series), user_exercise_id) for user_exercise_id, series in rows]
+        )
+        last_id = rows[-1][0]
 
-        # Fichas de treino personalizadas para cada usuário
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_workouts (
-            user_workout_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            title TEXT NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users(user_id)
+
+def _migration_009_workout_templates(cursor):
+    """
+    Fichas modelo compartilhadas. Uma ficha de usuário com template_id aponta
+    para o modelo e não tem linhas próprias em user_exercises até ser editada
+    (cópia na escrita); as fichas já copiadas continuam como estão.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS workout_templates (
+        template_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL UNIQUE
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS template_exercises (
+        template_exercise_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        template_id INTEGER NOT NULL,
+        master_exercise_id INTEGER NOT NULL,
+        series TEXT NOT NULL,
+        sets INTEGER,
+        rep_min INTEGER,
+        rep_max INTEGER,
+        series_modifiers TEXT,
+        position INTEGER NOT NULL,
+        FOREIGN KEY (template_id) REFERENCES workout_templates(template_id),
+        FOREIGN KEY (master_exercise_id) REFERENCES master_exercises(master_exercise_id)
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_template_exercises_template ON template_exercises (template_id, position)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_template_exercises_master ON template_exercises (master_exercise_id)")
+    cursor.execute("ALTER TABLE user_workouts ADD COLUMN template_id INTEGER REFERENCES workout_templates(template_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_workouts_template ON user_workouts (template_id)")
+
+    # Os modelos são os treinos padrão; nomes resolvidos aqui, sem o cache do catálogo
+    cursor.execute("SELECT name, master_exercise_id FROM master_exercises")
+    exercise_ids = {row['name']: row['master_exercise_id'] for row in cursor.fetchall()}
+    for title, exercises in DEFAULT_WORKOUTS.items():
+        cursor.execute("INSERT INTO workout_templates (title) VALUES (?)", (title,))
+        template_id = cursor.lastrowid
+        resolved = [(exercise_ids[ex_name], series) for ex_name, series in exercises if ex_name in exercise_ids]
+        cursor.executemany(
+            """
+            INSERT INTO template_exercises (template_id, master_exercise_id, series, sets, rep_min, rep_max, series_modifiers, position)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (template_id, master_id, *_series_fields(series), position)
+                for position, (master_id, series) in enumerate(resolved)
+            ]
         )
-        """)
 
-        # Exercícios específicos dentro da ficha de um usuário
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_exercises (
-            user_exercise_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_workout_id INTEGER NOT NULL,
-            master_exercise_id INTEGER NOT NULL,
-            series TEXT NOT NULL,
-            FOREIGN KEY (user_workout_id) REFERENCES user_workouts(user_workout_id),
-            FOREIGN KEY (master_exercise_id) REFERENCES master_exercises(master_exercise_id)
+
+def _migration_010_normalized_identity(cursor):
+    """
+    Nome de usuário e e-mail normalizados (ver normalize_identity), com um índice
+    cada: login e checagem de cadastro viram sondagens de índice que não
+    diferenciam maiúsculas. Os índices não são UNIQUE porque bases antigas
+    podem ter contas que só diferem em maiúsculas; contas novas são barradas
+    pela própria inserção (_insert_user).
+    """
+    cursor.execute("ALTER TABLE users ADD COLUMN username_normalized TEXT")
+    cursor.execute("ALTER TABLE users ADD COLUMN email_normalized TEXT")
+
+    last_id = 0
+    while True:
+        cursor.execute(
+            "SELECT user_id, username, email FROM users WHERE user_id > ? ORDER BY user_id LIMIT 1000",
+            (last_id,)
         )
-        """)
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        cursor.executemany(
+            "UPDATE users SET username_normalized = ?, email_normalized = ? WHERE user_id = ?",
+            [(normalize_identity(username), normalize_identity(email), user_id) for user_id, username, email in rows]
+        )
+        last_id = rows[-1][0]
 
-        # --- Schema Migration ---
-        cursor.execute("PRAGMA table_info(users)")
-        columns = [row['name'] for row in cursor.fetchall()]
-        if 'salt' not in columns:
-            logging.info("Adicionando a coluna 'salt' à tabela 'users'.")
-            cursor.execute("ALTER TABLE users ADD COLUMN salt TEXT NOT NULL DEFAULT ''")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username_normalized ON users (username_normalized)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email_normalized ON users (email_normalized)")
 
-        # --- Pré-popular a tabela de papéis (roles) ---
-        try:
-            roles_to_add = [('user',), ('admin',)]
-            cursor.executemany("INSERT INTO roles (role_name) VALUES (?)", roles_to_add)
-        except sqlite3.IntegrityError:
-            # Papéis já existem, ignorar o erro
-            pass
 
-        # --- Popular a biblioteca de exercícios (master_exercises) ---
-        master_exercise_list = [
-            # Peito
-            ('Supino Reto (Barra)', 'Peito'),
-            ('Supino Reto (Halteres)', 'Peito'),
-            ('Supino Inclinado (Barra)', 'Peito'),
-            ('Supino Inclinado (Halteres)', 'Peito'),
-            ('Supino Declinado (Barra)', 'Peito'),
-            ('Crucifixo (Halteres)', 'Peito'),
-            ('Crucifixo (Polia)', 'Peito'),
-            ('Peck Deck (Máquina)', 'Peito'),
-            ('Paralelas (Dips)', 'Peito'),
-            ('Flexão', 'Peito'),
-            # Costas
-            ('Barra Fixa', 'Costas'),
-            ('Puxada Alta (Frontal)', 'Costas'),
-            ('Remada Curvada (Barra)', 'Costas'),
-            ('Remada Cavalinho', 'Costas'),
-            ('Remada Unilateral (Serrote)', 'Costas'),
-            ('Pulldown (Braços Estendidos)', 'Costas'),
-            ('Remada Sentada (Polia)', 'Costas'),
-            # Pernas (Quadríceps)
-            ('Agachamento Livre', 'Pernas'),
-            ('Leg Press 45°', 'Pernas'),
-            ('Afundo (Passada)', 'Pernas'),
-            ('Agachamento Búlgaro', 'Pernas'),
-            ('Cadeira Extensora', 'Pernas'),
-            # Pernas (Posterior e Glúteos)
-            ('Stiff (Romeno)', 'Pernas'),
-            ('Cadeira Flexora', 'Pernas'),
-            ('Mesa Flexora', 'Pernas'),
-            ('Elevação Pélvica', 'Pernas'),
-            # Panturrilhas
-            ('Panturrilha em Pé (Gêmeos)', 'Pernas'),
-            ('Panturrilha Sentado (Sóleo)', 'Pernas'),
-            # Ombros
-            ('Desenvolvimento (Halteres)', 'Ombros'),
-            ('Desenvolvimento (Barra)', 'Ombros'),
-            ('Elevação Lateral (Halteres)', 'Ombros'),
-            ('Elevação Lateral (Polia)', 'Ombros'),
-            ('Elevação Frontal (Halteres)', 'Ombros'),
-            ('Crucifixo Invertido (Halteres)', 'Ombros'),
-            ('Crucifixo Invertido (Peck Deck)', 'Ombros'),
-            ('Remada Alta', 'Ombros'),
-            # Bíceps
-            ('Rosca Direta (Barra)', 'Bíceps'),
-            ('Rosca Direta (Barra W)', 'Bíceps'),
-            ('Rosca Alternada (Halteres)', 'Bíceps'),
-            ('Rosca Scott', 'Bíceps'),
-            ('Rosca Concentrada', 'Bíceps'),
-            # Tríceps
-            ('Tríceps Testa (Polia)', 'Tríceps'),
-            ('Tríceps Testa (Barra W)', 'Tríceps'),
-            ('Tríceps Corda (Polia)', 'Tríceps'),
-            ('Mergulho no Banco', 'Tríceps'),
-            ('Tríceps Francês (Halter)', 'Tríceps'),
-            # Abdômen
-            ('Abdominal Supra', 'Abdômen'),
-            ('Abdominal Infra (na paralela)', 'Abdômen'),
-            ('Prancha', 'Abdômen'),
-            ('Elevação de Pernas', 'Abdômen'),
-        ]
-        try:
-            cursor.executemany("INSERT INTO master_exercises (name, muscle_group) VALUES (?, ?)", master_exercise_list)
-        except sqlite3.IntegrityError:
-            # Dados já existem
-            pass
+MIGRATIONS = [
+    _migration_001_initial_schema,
+    _migration_002_lookup_indexes,
+    _migration_003_exercise_position,
+    _migration_004_exercise_search,
+    _migration_005_foreign_key_indexes,
+    _migration_006_token_expiry_index,
+    _migration_007_training_log,
+    _migration_008_parsed_series,
+    _migration_009_workout_templates,
+    _migration_010_normalized_identity,
+]
 
-        conn.commit()
-        logging.info("Banco de dados inicializado com sucesso.")
+SCHEMA_VERSION = len(MIGRATIONS)
+
+_init_lock = threading.Lock()
+_initialized_db_file = None
 
-    except sqlite3.Error as e:
-        logging.error(f"Erro no banco de dados durante a inicialização: {e}")
-        if conn:
+
+def _apply_migrations(conn):
+    """Aplica, em ordem, as migrações ainda não registradas em user_version."""
+    while True:
+        # BEGIN IMMEDIATE serializa migrações concorrentes de outros processos
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                conn.rollback()
+                return
+            migration = MIGRATIONS[version]
+            logging.info(f"Aplicando migração {version + 1}: {migration.__name__}")
+            migration(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except Exception:
             conn.rollback()
+            raise
+
+
+def init_db():
+    """
+    Garante que o schema do banco esteja na versão atual.
+
+    Só trabalha de fato na primeira chamada do processo: com o banco já migrado,
+    o custo é uma única leitura de PRAGMA user_version (o filtro de identidades
+    é montado depois, em segundo plano); chamadas seguintes (ex.: uma por sessão
+    do Flet) retornam imediatamente.
+    """
+    global _initialized_db_file
+    if _initialized_db_file == DB_FILE:
+        return
+
+    with _init_lock:
+        if _initialized_db_file == DB_FILE:
+            return
+        with db_connection() as conn:
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version < SCHEMA_VERSION:
+                    logging.info(f"Migrando o banco de dados {DB_FILE} da versão {version} para {SCHEMA_VERSION}.")
+                    _apply_migrations(conn)
+                    invalidate_master_exercise_cache()
+                    logging.info("Banco de dados inicializado com sucesso.")
+            except sqlite3.Error as e:
+                logging.error(f"Erro no banco de dados durante a inicialização: {e}")
+                return
+        _initialized_db_file = DB_FILE
+    # Fora do caminho crítico: até o filtro ficar pronto, as buscas vão ao SQLite
+    _start_identity_filter()
+
+def _hash_new_password(password):
+    """Gera um salt aleatório e o hash da senha; retorna (password_hash, salt)."""
+    salt = password_hashing.new_salt()
+    return password_hashing.hash_password(password, salt), salt
+
+def _get_user_role_id(cursor):
+    """Busca o role_id do papel 'user'."""
+    cursor.execute("SELECT role_id FROM roles WHERE role_name = 'user'")
+    role_result = cursor.fetchone()
+    if not role_result:
+        # Isso não deve acontecer se init_db foi chamado, mas é uma segurança
+        raise Exception("O papel 'user' não foi encontrado no banco de dados.")
+    return role_result['role_id']
+
+# --- Identidades (nome de usuário e e-mail) ---
+# Login e cadastro comparam as formas normalizadas, gravadas ao lado das
+# originais (username_normalized, email_normalized). Um filtro de Bloom com
+# todas as identidades conhecidas responde "não existe" sem ir ao SQLite:
+# logins de usuários inexistentes (ex.: credential stuffing) e nomes livres no
+# cadastro.
+#
+# O filtro é montado por uma thread própria, iniciada pelo init_db depois das
+# migrações (sem atrasar quem espera pelo schema), que depois o mantém em dia:
+# a cada IDENTITY_FILTER_REFRESH segundos confere PRAGMA data_version na sua
+# conexão e, se outro processo gravou algo, lê os usuários novos pela chave
+# primária. Cadastros deste processo entram no filtro na hora. Enquanto o filtro
+# não existe, ou se a última conferência tem mais de IDENTITY_FILTER_MAX_AGE
+# segundos (thread parada, erro do banco), a resposta é sempre "pode existir" e
+# a busca vai ao SQLite. Um cadastro feito em outro processo pode, portanto,
+# ficar fora do filtro por até IDENTITY_FILTER_REFRESH segundos.
+
+IDENTITY_FILTER_ENABLED = os.environ.get("CHAMPS_IDENTITY_FILTER", "1") not in ("", "0")
+IDENTITY_FILTER_REFRESH = float(os.environ.get("CHAMPS_IDENTITY_FILTER_REFRESH", "1"))
+IDENTITY_FILTER_MAX_AGE = 3 * IDENTITY_FILTER_REFRESH
+IDENTITY_FILTER_ERROR_RATE = 0.001
+IDENTITY_FILTER_MIN_CAPACITY = 10_000
+
+_identity_filter = None  # _IdentityFilter do DB_FILE atual, ou None enquanto não foi montado
+_identity_filter_lock = threading.Lock()
+_identity_filter_generation = 0  # muda a cada thread iniciada; as anteriores encerram
+
+
+class _IdentityFilter:
+    __slots__ = ("db_file", "bloom", "last_user_id", "checked_at")
+
+    def __init__(self, db_file, capacity):
+        self.db_file = db_file
+        self.bloom = BloomFilter(capacity, IDENTITY_FILTER_ERROR_RATE)
+        self.last_user_id = 0
+        self.checked_at = 0.0
+
+
+def normalize_identity(text):
+    """Forma de comparação de um nome de usuário ou e-mail: sem espaços nas pontas e sem diferenciar maiúsculas."""
+    return unicodedata.normalize("NFKC", text).strip().casefold()
+
+
+def _load_new_identities(conn, state):
+    """Acrescenta ao filtro os usuários com user_id maior que o último lido."""
+    cursor = conn.execute(
+        "SELECT user_id, username_normalized, email_normalized FROM users WHERE user_id > ? ORDER BY user_id",
+        (state.last_user_id,)
+    )
+    while True:
+        rows = cursor.fetchmany(5000)
+        if not rows:
+            break
+        with _identity_filter_lock:
+            for user_id, username_normalized, email_normalized in rows:
+                state.bloom.add(username_normalized)
+                state.bloom.add(email_normalized)
+        state.last_user_id = rows[-1][0]
+
+
+def _maintain_identity_filter(db_file, generation):
+    """
+    Corpo da thread do filtro: monta o filtro e o atualiza periodicamente,
+    enquanto DB_FILE não mudar e nenhuma thread mais nova for iniciada.
+    """
+    global _identity_filter
+    conn = get_db_connection(db_file)
+    try:
+        state = None
+        data_version = None
+        while generation == _identity_filter_generation and DB_FILE == db_file:
+            try:
+                # Lido antes dos usuários: um commit durante a leitura força outra na próxima volta
+                version = conn.execute("PRAGMA data_version").fetchone()[0]
+                if state is None or state.bloom.is_full:
+                    users = conn.execute("SELECT MAX(user_id) FROM users").fetchone()[0] or 0
+                    state = _IdentityFilter(db_file, max(IDENTITY_FILTER_MIN_CAPACITY, 4 * users))
+                    _load_new_identities(conn, state)
+                elif version != data_version:
+                    _load_new_identities(conn, state)
+                data_version = version
+                state.checked_at = time.monotonic()
+                _identity_filter = state
+            except sqlite3.Error as e:
+                # Sem conferência, o filtro deixa de responder "não existe" após IDENTITY_FILTER_MAX_AGE
+                logging.warning(f"Erro ao atualizar o filtro de identidades: {e}")
+            time.sleep(IDENTITY_FILTER_REFRESH)
     finally:
-        if conn:
-            conn.close()
-            logging.info("Conexão com o banco de dados fechada.")
+        conn.close()
+
+
+def _start_identity_filter():
+    """Inicia (ou reinicia, para o DB_FILE atual) a thread do filtro de identidades."""
+    global _identity_filter_generation
+    if not IDENTITY_FILTER_ENABLED:
+        return
+    with _identity_filter_lock:
+        _identity_filter_generation += 1
+        generation = _identity_filter_generation
+    threading.Thread(
+        target=_maintain_identity_filter, args=(DB_FILE, generation),
+        name="champs-identity-filter", daemon=True,
+    ).start()
+
+
+def _identity_may_exist(*identities):
+    """
+    False se nenhuma das identidades (já normalizadas) está cadastrada, com
+    certeza; True se alguma pode estar, ou se o filtro não está disponível ou
+    em dia. Nunca consulta o banco.
+    """
+    state = _identity_filter
+    if not IDENTITY_FILTER_ENABLED or state is None or state.db_file != DB_FILE:
+        return True
+    if time.monotonic() - state.checked_at > IDENTITY_FILTER_MAX_AGE:
+        return True
+    return any(identity in state.bloom for identity in identities)
 
+
+def _remember_identities(identities):
+    """Acrescenta ao filtro as identidades (username, e-mail) recém-gravadas."""
+    state = _identity_filter
+    if state is None or state.db_file != DB_FILE:
+        return
+    with _identity_filter_lock:
+        for username, email in identities:
+            state.bloom.add(normalize_identity(username))
+            state.bloom.add(normalize_identity(email))
+
+
+def _insert_user(cursor, username, email, password_hash, salt, is_active=1, created_at=None):
+    """
+    Insere um usuário se nem o nome nem o e-mail (normalizados) já existirem;
+    a checagem e a inserção são uma única instrução. Retorna o user_id, ou None
+    se a identidade já estava cadastrada.
+    """
+    username_normalized = normalize_identity(username)
+    email_normalized = normalize_identity(email)
+    cursor.execute(
+        """
+        INSERT OR IGNORE INTO users
+            (username, username_normalized, email, email_normalized, password_hash, salt, is_active, created_at)
+        SELECT ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP)
+        WHERE NOT EXISTS (SELECT 1 FROM users WHERE username_normalized = ?)
+          AND NOT EXISTS (SELECT 1 FROM users WHERE email_normalized = ?)
+        """,
+        (username, username_normalized, email, email_normalized, password_hash, salt, is_active, created_at,
+         username_normalized, email_normalized)
+    )
+    return cursor.lastrowid if cursor.rowcount else None
+
+@instrumented
 def add_user(username, email, password):
     """
     Adiciona um novo usuário ao banco de dados com o papel 'user'.
@@ -199,288 +869,1144 @@ def add_user(username, email, password):
     Retorna True se o usuário for criado com sucesso, False caso contrário
     (ex: usuário ou e-mail já existente).
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Verificar se username ou email já existem
-    cursor.execute("SELECT user_id FROM users WHERE username = ? OR email = ?", (username, email))
-    if cursor.fetchone():
-        conn.close()
+    if identity_exists(username, email):
         return False  # Usuário ou e-mail já cadastrado
 
     # Gerar salt e hashear a senha
-    salt = os.urandom(16).hex()
-    password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
+    password_hash, salt = _hash_new_password(password)
+    return create_user(username, email, password_hash, salt)
 
-    try:
-        # Inserir o novo usuário
+@instrumented
+def identity_exists(username, email):
+    """Verifica se o nome de usuário ou o e-mail já estão cadastrados (sem diferenciar maiúsculas)."""
+    username_normalized = normalize_identity(username)
+    email_normalized = normalize_identity(email)
+    if not _identity_may_exist(username_normalized, email_normalized):
+        return False
+    with db_connection() as conn:
+        cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO users (username, email, password_hash, salt) VALUES (?, ?, ?, ?)",
-            (username, email, password_hash, salt)
+            """
+            SELECT EXISTS (SELECT 1 FROM users WHERE username_normalized = ?)
+                OR EXISTS (SELECT 1 FROM users WHERE email_normalized = ?)
+            """,
+            (username_normalized, email_normalized)
         )
-        user_id = cursor.lastrowid
+        return bool(cursor.fetchone()[0])
+
+@instrumented
+def create_user(username, email, password_hash, salt):
+    """
+    Grava um novo usuário cuja senha já foi hasheada (ver password_hashing),
+    com o papel 'user' e os treinos padrão.
+
+    Retorna True se o usuário for criado com sucesso, False caso contrário.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            # Inserir o novo usuário, se username e e-mail estiverem livres
+            user_id = _insert_user(cursor, username, email, password_hash, salt)
+            if user_id is None:
+                conn.rollback()
+                return False  # Usuário ou e-mail já cadastrado
 
-        # Obter o role_id para 'user'
-        cursor.execute("SELECT role_id FROM roles WHERE role_name = 'user'")
-        role_result = cursor.fetchone()
-        if not role_result:
-            # Isso não deve acontecer se init_db foi chamado, mas é uma segurança
+            # Associar o usuário ao papel 'user'
+            cursor.execute(
+                "INSERT INTO user_roles (user_id, role_id) VALUES (?, ?)",
+                (user_id, _get_user_role_id(cursor))
+            )
+
+            # Criar treinos padrão para o novo usuário
+            create_default_workouts_for_user(user_id, cursor)
+
+            conn.commit()
+            _remember_identities([(username, email)])
+            return True
+        except sqlite3.Error as e:
+            print(f"Erro no banco de dados: {e}")
             conn.rollback()
-            conn.close()
-            raise Exception("O papel 'user' não foi encontrado no banco de dados.")
+            return False
 
-        user_role_id = role_result['role_id']
+@instrumented
+def add_users_bulk(users):
+    """
+    Cadastra vários usuários de uma vez (ex.: a lista de alunos de uma academia),
+    todos em uma única transação.
 
-        # Associar o usuário ao papel 'user'
-        cursor.execute(
-            "INSERT INTO user_roles (user_id, role_id) VALUES (?, ?)",
-            (user_id, user_role_id)
-        )
+    `users` é um iterável de tuplas (username, email, password). Retorna uma lista
+    com o user_id de cada usuário, na ordem de entrada, ou None para os que já
+    existiam. Em caso de erro do banco nada é gravado e a função retorna None.
+    """
+    # As senhas são hasheadas antes, em paralelo no pool de processos: a KDF é
+    # lenta de propósito e não pode rodar com a trava de escrita do banco
+    users = list(users)
+    salts = [password_hashing.new_salt() for _ in users]
+    hashes = password_hashing.hash_passwords([password for _, _, password in users], salts)
 
-        # Criar treinos padrão para o novo usuário
-        create_default_workouts_for_user(user_id, cursor)
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            user_role_id = _get_user_role_id(cursor)
+            templates = _get_templates()[0]
 
-        conn.commit()
-        return True
-    except sqlite3.Error as e:
-        print(f"Erro no banco de dados: {e}")
-        conn.rollback()
-        return False
-    finally:
-        conn.close()
+            cursor.execute("BEGIN IMMEDIATE")
+            user_ids = []
+            created_identities = []
+            for (username, email, _), password_hash, salt in zip(users, hashes, salts):
+                # Username/e-mail repetido não insere nada (None)
+                user_id = _insert_user(cursor, username, email, password_hash, salt)
+                user_ids.append(user_id)
+                if user_id:
+                    created_identities.append((username, email))
 
-# Para testar a criação do banco de dados ao executar este arquivo diretamente
-if __name__ == '__main__':
-    init_db()
+            created = [user_id for user_id in user_ids if user_id]
+            cursor.executemany(
+                "INSERT INTO user_roles (user_id, role_id) VALUES (?, ?)",
+                [(user_id, user_role_id) for user_id in created]
+            )
+            for user_id in created:
+                create_default_workouts_for_user(user_id, cursor, templates)
+
+            conn.commit()
+            _remember_identities(created_identities)
+            return user_ids
+        except sqlite3.Error as e:
+            print(f"Erro no banco de dados durante o cadastro em lote: {e}")
+            conn.rollback()
+            return None
 
+@instrumented
 def verify_user(identifier, password):
     """
     Verifica as credenciais do usuário.
 
     Retorna o user_id se a autenticação for bem-sucedida, None caso contrário.
+    Hashes legados ou com custo desatualizado são refeitos após o login, e contas
+    sem fichas de treino recebem os treinos padrão.
+    Versão síncrona; a tela de login usa auth.login, que roda a KDF fora do loop de eventos.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    user = get_user_credentials(identifier)
+    if not user:
+        return None
 
-    cursor.execute(
-        "SELECT user_id, password_hash, salt FROM users WHERE username = ? OR email = ?",
-        (identifier, identifier)
-    )
-    user = cursor.fetchone()
+    if not password_hashing.verify_password(password, user['password_hash'], user['salt']):
+        return None
 
-    if not user:
-        conn.close()
+    if password_hashing.needs_rehash(user['password_hash']):
+        password_hash, salt = _hash_new_password(password)
+        update_user_password_hash(user['user_id'], password_hash, salt)
+
+    ensure_default_workouts(user['user_id'])
+    return user['user_id']
+
+@instrumented
+def get_user_credentials(identifier):
+    """
+    Busca user_id, password_hash e salt pelo nome de usuário ou e-mail, sem
+    diferenciar maiúsculas. Identificadores fora do filtro de identidades
+    retornam None sem consultar o banco.
+    """
+    key = normalize_identity(identifier)
+    if not _identity_may_exist(key):
+        return None
+    # Com "@" é quase sempre um e-mail: uma sondagem de índice, e a outra coluna
+    # só se a primeira não achar nada. Contas antigas que só diferem em
+    # maiúsculas: vale a que foi digitada exatamente assim.
+    columns = ("email", "username") if "@" in key else ("username", "email")
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for column in columns:
+            cursor.execute(
+                f"SELECT user_id, password_hash, salt FROM users WHERE {column}_normalized = ? ORDER BY {column} = ? DESC LIMIT 1",
+                (key, identifier)
+            )
+            row = cursor.fetchone()
+            if row:
+                return row
         return None
 
-    # Hash da senha fornecida com o salt do usuário para comparação
-    password_hash = hashlib.sha256((password + user['salt']).encode()).hexdigest()
+@instrumented
+def update_user_password_hash(user_id, password_hash, salt):
+    """Substitui o hash e o salt da senha de um usuário (ex.: rehash após login)."""
+    with db_connection() as conn:
+        conn.execute(
+            "UPDATE users SET password_hash = ?, salt = ? WHERE user_id = ?",
+            (password_hash, salt, user_id)
+        )
+        conn.commit()
 
-    if user['password_hash'] == password_hash:
-        conn.close()
-        return user['user_id']
+# --- Tokens (user_tokens) ---
+# Só o hash do token é gravado; a emissão e a validação com cache ficam em session_tokens.py.
+# expires_at usa o mesmo formato UTC de CURRENT_TIMESTAMP ('AAAA-MM-DD HH:MM:SS').
+
+@instrumented
+def add_user_token(user_id, token_hash, token_type, expires_at):
+    """Grava um token (já hasheado) para o usuário."""
+    with db_connection() as conn:
+        conn.execute(
+            "INSERT INTO user_tokens (user_id, token_hash, token_type, expires_at) VALUES (?, ?, ?, ?)",
+            (user_id, token_hash, token_type, expires_at)
+        )
+        conn.commit()
 
-    conn.close()
-    return None
+@instrumented
+def get_user_token(token_hash, token_type, now):
+    """Busca user_id e expires_at de um token válido de usuário ativo, ou None."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT t.user_id, t.expires_at
+            FROM user_tokens t
+            JOIN users u ON u.user_id = t.user_id
+            WHERE t.token_hash = ? AND t.token_type = ? AND t.expires_at > ? AND u.is_active = 1
+            """,
+            (token_hash, token_type, now)
+        )
+        return cursor.fetchone()
 
+@instrumented
+def delete_user_token(token_hash):
+    """Remove um token. Retorna True se ele existia."""
+    with db_connection() as conn:
+        cursor = conn.execute("DELETE FROM user_tokens WHERE token_hash = ?", (token_hash,))
+        conn.commit()
+        return cursor.rowcount > 0
+
+@instrumented
+def delete_user_tokens(user_id, token_type):
+    """Remove todos os tokens de um tipo de um usuário; retorna os hashes removidos."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        # Trava de escrita já no SELECT: nenhum token novo escapa entre a leitura e o DELETE
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            "SELECT token_hash FROM user_tokens WHERE user_id = ? AND token_type = ?",
+            (user_id, token_type)
+        )
+        token_hashes = [row['token_hash'] for row in cursor.fetchall()]
+        cursor.execute("DELETE FROM user_tokens WHERE user_id = ? AND token_type = ?", (user_id, token_type))
+        conn.commit()
+        return token_hashes
+
+@instrumented
+def purge_expired_user_tokens(now, batch_size=500):
+    """
+    Apaga os tokens expirados em lotes de `batch_size`, cada lote em uma transação
+    curta para não segurar a trava de escrita. Retorna quantos foram apagados.
+    """
+    purged = 0
+    with db_connection() as conn:
+        while True:
+            cursor = conn.execute(
+                """
+                DELETE FROM user_tokens WHERE token_id IN (
+                    SELECT token_id FROM user_tokens WHERE expires_at <= ? LIMIT ?
+                )
+                """,
+                (now, batch_size)
+            )
+            conn.commit()
+            purged += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return purged
+
+@instrumented
 def get_user_by_id(user_id):
     """
     Busca um usuário pelo seu ID.
 
     Retorna um dicionário com os dados do usuário ou None se não encontrado.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-    user = cursor.fetchone()
-    conn.close()
-    return user
-
-def create_default_workouts_for_user(user_id, cursor):
-    """Cria a cópia inicial dos treinos padrão para um novo usuário."""
-    default_workouts = {
-        "Treino A: Peito e Tríceps": [
-            ("Supino Reto (Barra)", "4x8-10"),
-            ("Supino Inclinado (Halteres)", "3x10-12"),
-            ("Paralelas (Dips)", "3x10-12"),
-            ("Crucifixo (Polia)", "3x12-15"),
-            ("Tríceps Testa (Polia)", "4x10-12"),
-            ("Tríceps Corda (Polia)", "3x12-15"),
-        ],
-        "Treino B: Quadríceps": [
-            ("Agachamento Livre", "4x8-10"),
-            ("Leg Press 45°", "3x10-12"),
-            ("Afundo (Passada)", "3x10-12 (por perna)"),
-            ("Cadeira Extensora", "3x15"),
-            ("Panturrilha em Pé (Gêmeos)", "4x15-20"),
-            ("Panturrilha Sentado (Sóleo)", "3x15-20"),
-        ],
-        "Treino C: Costas e Bíceps": [
-            ("Barra Fixa", "4x10-12 (ou falha)"),
-            ("Remada Curvada (Barra)", "4x8-10"),
-            ("Remada Unilateral (Serrote)", "3x10-12"),
-            ("Pulldown (Braços Estendidos)", "3x12-15"),
-            ("Rosca Direta (Barra W)", "4x10-12"),
-            ("Rosca Alternada (Halteres)", "3x10-12"),
-        ],
-        "Treino D: Ombro e Posterior": [
-            ("Desenvolvimento (Halteres)", "4x8-10"),
-            ("Elevação Lateral (Halteres)", "4x12-15"),
-            ("Crucifixo Invertido (Halteres)", "3x12-15"),
-            ("Elevação Frontal (Halteres)", "3x10-12"),
-            ("Stiff (Romeno)", "4x10-12"),
-            ("Cadeira Flexora", "3x12-15"),
-        ]
-    }
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
+        return cursor.fetchone()
 
-    for title, exercises in default_workouts.items():
-        cursor.execute("INSERT INTO user_workouts (user_id, title) VALUES (?, ?)", (user_id, title))
-        user_workout_id = cursor.lastrowid
-        for ex_name, series in exercises:
-            cursor.execute("SELECT master_exercise_id FROM master_exercises WHERE name = ?", (ex_name,))
-            master_ex = cursor.fetchone()
-            if master_ex:
-                cursor.execute(
-                    "INSERT INTO user_exercises (user_workout_id, master_exercise_id, series) VALUES (?, ?, ?)",
-                    (user_workout_id, master_ex['master_exercise_id'], series)
-                )
+# Treinos padrão (fichas modelo) de cada novo usuário: título -> [(exercício, séries)].
+# Gravados uma vez em workout_templates (migração 009); alterar esta lista não
+# muda os modelos de um banco já criado.
+DEFAULT_WORKOUTS = {
+    "Treino A: Peito e Tríceps": [
+        ("Supino Reto (Barra)", "4x8-10"),
+        ("Supino Inclinado (Halteres)", "3x10-12"),
+        ("Paralelas (Dips)", "3x10-12"),
+        ("Crucifixo (Polia)", "3x12-15"),
+        ("Tríceps Testa (Polia)", "4x10-12"),
+        ("Tríceps Corda (Polia)", "3x12-15"),
+    ],
+    "Treino B: Quadríceps": [
+        ("Agachamento Livre", "4x8-10"),
+        ("Leg Press 45°", "3x10-12"),
+        ("Afundo (Passada)", "3x10-12 (por perna)"),
+        ("Cadeira Extensora", "3x15"),
+        ("Panturrilha em Pé (Gêmeos)", "4x15-20"),
+        ("Panturrilha Sentado (Sóleo)", "3x15-20"),
+    ],
+    "Treino C: Costas e Bíceps": [
+        ("Barra Fixa", "4x10-12 (ou falha)"),
+        ("Remada Curvada (Barra)", "4x8-10"),
+        ("Remada Unilateral (Serrote)", "3x10-12"),
+        ("Pulldown (Braços Estendidos)", "3x12-15"),
+        ("Rosca Direta (Barra W)", "4x10-12"),
+        ("Rosca Alternada (Halteres)", "3x10-12"),
+    ],
+    "Treino D: Ombro e Posterior": [
+        ("Desenvolvimento (Halteres)", "4x8-10"),
+        ("Elevação Lateral (Halteres)", "4x12-15"),
+        ("Crucifixo Invertido (Halteres)", "3x12-15"),
+        ("Elevação Frontal (Halteres)", "3x10-12"),
+        ("Stiff (Romeno)", "4x10-12"),
+        ("Cadeira Flexora", "3x12-15"),
+    ]
+}
+
+def _get_master_exercise_ids():
+    """Mapa nome -> master_exercise_id de toda a biblioteca (vem do cache do catálogo)."""
+    return _get_catalog()[1]
+
+def _series_fields(series):
+    """(series, sets, rep_min, rep_max, series_modifiers): o texto e os campos interpretados."""
+    return (series, *parse_series(series))
+
+# --- Fichas modelo (cópia na escrita) ---
+# Fichas que apontam para um modelo são lidas do cache abaixo, carregado uma vez
+# por processo. O cache acompanha a versão do catálogo, porque os nomes dos
+# exercícios vêm de master_exercises.
+
+class WorkoutExercise(namedtuple("WorkoutExercise", ["user_exercise_id", "name", "series", "master_exercise_id"])):
+    """Exercício de uma ficha modelo, no formato das linhas de get_user_workout_details (sem user_exercise_id)."""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return super().__getitem__(key)
+
+    def keys(self):
+        # Permite dict(ex), como com sqlite3.Row
+        return self._fields
+
+WorkoutTemplate = namedtuple("WorkoutTemplate", ["template_id", "title", "exercises"])
+
+_template_cache = None  # (db_file, versão do catálogo, modelos por id, id do modelo por exercícios)
+
+def _template_key(exercises):
+    """Chave de comparação de uma lista de exercícios: ((master_exercise_id, séries), ...)."""
+    return tuple((master_id, series) for master_id, series in exercises)
+
+def _get_templates():
+    """Retorna (modelos por template_id, template_id por _template_key), do cache se possível."""
+    global _template_cache
+    cache = _template_cache
+    if cache is not None and cache[0] == DB_FILE and cache[1] == _catalog_version:
+        return cache[2], cache[3]
+
+    version = _catalog_version
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT template_id, title FROM workout_templates ORDER BY template_id")
+        titles = {row['template_id']: row['title'] for row in cursor.fetchall()}
+        cursor.execute("""
+        SELECT template_exercises.template_id, me.name, template_exercises.series, template_exercises.master_exercise_id
+        FROM template_exercises
+        JOIN master_exercises me ON me.master_exercise_id = template_exercises.master_exercise_id
+        ORDER BY template_exercises.template_id, template_exercises.position
+        """)
+        exercises = {template_id: [] for template_id in titles}
+        for row in cursor.fetchall():
+            exercises[row['template_id']].append(WorkoutExercise(None, row['name'], row['series'], row['master_exercise_id']))
+
+    templates = MappingProxyType({
+        template_id: WorkoutTemplate(template_id, title, tuple(exercises[template_id]))
+        for template_id, title in titles.items()
+    })
+    ids_by_key = MappingProxyType({
+        _template_key((ex.master_exercise_id, ex.series) for ex in template.exercises): template.template_id
+        for template in templates.values()
+    })
+    _template_cache = (DB_FILE, version, templates, ids_by_key)
+    return templates, ids_by_key
+
+def _materialize_template(cursor, user_workout_id):
+    """
+    Copia os exercícios do modelo para linhas próprias da ficha e desfaz o
+    vínculo. Deve rodar dentro da transação da escrita que motivou a cópia.
+    Retorna True se a ficha ainda estava no modelo.
+    """
+    cursor.execute("SELECT template_id FROM user_workouts WHERE user_workout_id = ?", (user_workout_id,))
+    row = cursor.fetchone()
+    if row is None or row['template_id'] is None:
+        return False
+    cursor.execute(
+        """
+        INSERT INTO user_exercises (user_workout_id, master_exercise_id, series, sets, rep_min, rep_max, series_modifiers, position)
+        SELECT ?, master_exercise_id, series, sets, rep_min, rep_max, series_modifiers, position
+        FROM template_exercises WHERE template_id = ?
+        ORDER BY position
+        """,
+        (user_workout_id, row['template_id'])
+    )
+    cursor.execute("UPDATE user_workouts SET template_id = NULL WHERE user_workout_id = ?", (user_workout_id,))
+    return True
+
+def create_default_workouts_for_user(user_id, cursor, templates=None):
+    """
+    Cria os treinos padrão de um novo usuário como fichas que apontam para os
+    modelos (uma linha por ficha, nenhuma em user_exercises); os exercícios só
+    são copiados na primeira edição.
+
+    `templates` (o mapa de _get_templates) evita consultar o cache a cada
+    usuário em cadastros em lote.
+    """
+    if templates is None:
+        templates = _get_templates()[0]
+
+    cursor.executemany(
+        "INSERT INTO user_workouts (user_id, title, template_id) VALUES (?, ?, ?)",
+        [(user_id, template.title, template.template_id) for template in templates.values()]
+    )
 
+@instrumented
 def get_user_workouts(user_id):
+    """Busca todas as fichas de treino de um usuário."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT user_workout_id, title FROM user_workouts WHERE user_id = ? ORDER BY user_workout_id",
+            (user_id,)
+        )
+        return cursor.fetchall()
+
+@instrumented
+def ensure_default_workouts(user_id):
     """
-    Busca todas as fichas de treino de um usuário.
-    Se o usuário não tiver treinos, cria os treinos padrão para ele.
+    Cria os treinos padrão para um usuário que ainda não tem nenhuma ficha
+    (ex.: contas anteriores ao cadastro com treinos). Chamado no login, para que
+    as leituras das telas nunca precisem escrever no banco.
+
+    Retorna True se os treinos foram criados.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM user_workouts WHERE user_id = ? LIMIT 1", (user_id,))
+        if cursor.fetchone():
+            return False
 
-    # Verifica se o usuário já tem treinos
-    cursor.execute("SELECT COUNT(*) FROM user_workouts WHERE user_id = ?", (user_id,))
-    workout_count = cursor.fetchone()[0]
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            # Confere de novo já com a trava de escrita (outra sessão pode ter criado)
+            cursor.execute("SELECT 1 FROM user_workouts WHERE user_id = ? LIMIT 1", (user_id,))
+            if cursor.fetchone():
+                conn.rollback()
+                return False
+            print(f"Nenhum treino encontrado para o user_id {user_id}. Criando treinos padrão...")
+            create_default_workouts_for_user(user_id, cursor)
+            conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"Erro ao criar os treinos padrão: {e}")
+            conn.rollback()
+            return False
 
-    # Se não tiver, cria os treinos padrão
-    if workout_count == 0:
-        print(f"Nenhum treino encontrado para o user_id {user_id}. Criando treinos padrão...")
-        create_default_workouts_for_user(user_id, cursor)
-        conn.commit() # Efetiva a criação dos treinos
+@instrumented
+def get_home_payload(user_id):
+    """
+    Busca, em uma única consulta, tudo o que a tela inicial exibe: o nome do
+    usuário e as suas fichas com a quantidade de exercícios de cada uma.
 
-    # Busca os treinos (agora eles devem existir)
-    cursor.execute("SELECT user_workout_id, title FROM user_workouts WHERE user_id = ?", (user_id,))
-    workouts = cursor.fetchall()
+    Retorna {"username": ..., "workouts": (linhas user_workout_id, title,
+    exercise_count)} ou None se o usuário não existir.
+    """
+    query = """
+    SELECT u.username, uw.user_workout_id, uw.title,
+           CASE WHEN uw.template_id IS NULL
+                THEN (SELECT COUNT(*) FROM user_exercises ue WHERE ue.user_workout_id = uw.user_workout_id)
+                ELSE (SELECT COUNT(*) FROM template_exercises te WHERE te.template_id = uw.template_id)
+           END AS exercise_count
+    FROM users u
+    LEFT JOIN user_workouts uw ON uw.user_id = u.user_id
+    WHERE u.user_id = ?
+    ORDER BY uw.user_workout_id
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, (user_id,))
+        rows = cursor.fetchall()
 
-    conn.close()
-    return workouts
+    if not rows:
+        return None
+    return {
+        "username": rows[0]['username'],
+        "workouts": tuple(row for row in rows if row['user_workout_id'] is not None),
+    }
 
+@instrumented
 def get_user_workout_by_id(user_workout_id):
     """Busca os detalhes de uma ficha de treino específica, como o título."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT title FROM user_workouts WHERE user_workout_id = ?", (user_workout_id,))
-    workout = cursor.fetchone()
-    conn.close()
-    return workout
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT title FROM user_workouts WHERE user_workout_id = ?", (user_workout_id,))
+        return cursor.fetchone()
 
+@instrumented
 def get_user_workout_details(user_workout_id):
-    """Busca os detalhes (exercícios) de uma ficha de treino específica."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    """
+    Busca os detalhes (exercícios) de uma ficha de treino específica.
+
+    Fichas que ainda apontam para um modelo retornam os exercícios do modelo
+    (do cache em memória), com user_exercise_id None.
+    """
     query = """
     SELECT ue.user_exercise_id, me.name, ue.series, ue.master_exercise_id
     FROM user_exercises ue
     JOIN master_exercises me ON ue.master_exercise_id = me.master_exercise_id
     WHERE ue.user_workout_id = ?
-    ORDER BY ue.user_exercise_id
+    ORDER BY ue.position, ue.user_exercise_id
     """
-    cursor.execute(query, (user_workout_id,))
-    details = cursor.fetchall()
-    conn.close()
-    return details
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT template_id FROM user_workouts WHERE user_workout_id = ?", (user_workout_id,))
+        row = cursor.fetchone()
+        if row is not None and row['template_id'] is not None:
+            template = _get_templates()[0].get(row['template_id'])
+            return list(template.exercises) if template else []
+        cursor.execute(query, (user_workout_id,))
+        return cursor.fetchall()
 
+@instrumented
 def update_exercise_series(user_exercise_id, new_series):
     """Atualiza as séries de um exercício específico."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE user_exercises SET series = ? WHERE user_exercise_id = ?", (new_series, user_exercise_id))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        conn.execute(
+            "UPDATE user_exercises SET series = ?, sets = ?, rep_min = ?, rep_max = ?, series_modifiers = ? WHERE user_exercise_id = ?",
+            (*_series_fields(new_series), user_exercise_id)
+        )
+        conn.commit()
 
+@instrumented
 def replace_exercise_in_workout(user_exercise_id, new_master_exercise_id):
     """Substitui um exercício em uma ficha de treino."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE user_exercises SET master_exercise_id = ? WHERE user_exercise_id = ?", (new_master_exercise_id, user_exercise_id))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        conn.execute("UPDATE user_exercises SET master_exercise_id = ? WHERE user_exercise_id = ?", (new_master_exercise_id, user_exercise_id))
+        conn.commit()
 
+@instrumented
 def add_exercise_to_workout(user_workout_id, master_exercise_id, series="3x10"):
-    """Adiciona um novo exercício a uma ficha de treino."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO user_exercises (user_workout_id, master_exercise_id, series) VALUES (?, ?, ?)",
-        (user_workout_id, master_exercise_id, series)
-    )
-    conn.commit()
-    conn.close()
+    """Adiciona um novo exercício ao final de uma ficha de treino (copiando o modelo antes, se for o caso)."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            _materialize_template(cursor, user_workout_id)
+            cursor.execute(
+                """
+                INSERT INTO user_exercises (user_workout_id, master_exercise_id, series, sets, rep_min, rep_max, series_modifiers, position)
+                SELECT ?, ?, ?, ?, ?, ?, ?, COALESCE(MAX(position) + 1, 0)
+                FROM user_exercises WHERE user_workout_id = ?
+                """,
+                (user_workout_id, master_exercise_id, *_series_fields(series), user_workout_id)
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Erro ao adicionar o exercício: {e}")
+            conn.rollback()
 
+@instrumented
 def remove_exercise_from_workout(user_exercise_id):
     """Remove um exercício de uma ficha de treino."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM user_exercises WHERE user_exercise_id = ?", (user_exercise_id,))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        conn.execute("DELETE FROM user_exercises WHERE user_exercise_id = ?", (user_exercise_id,))
+        conn.commit()
 
-def get_all_master_exercises():
-    """Busca todos os exercícios da biblioteca, agrupados por músculo."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT master_exercise_id, name, muscle_group FROM master_exercises ORDER BY muscle_group, name")
-    exercises = cursor.fetchall()
-    conn.close()
+# --- Cache do catálogo de exercícios ---
+# O catálogo quase nunca muda, então é carregado uma vez por processo e
+# compartilhado por todas as sessões. Escritas no catálogo incrementam
+# _catalog_version, o que invalida o cache na próxima leitura.
+
+class MasterExercise(namedtuple("MasterExercise", ["master_exercise_id", "name", "muscle_group"])):
+    """Exercício do catálogo: tupla imutável que também aceita ex['name'], como sqlite3.Row."""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return super().__getitem__(key)
+
+_catalog_lock = threading.Lock()
+_catalog_version = 0
+_catalog_cache = None  # (db_file, versão, catálogo agrupado, mapa nome -> id)
+
+def invalidate_master_exercise_cache():
+    """Marca o cache do catálogo como desatualizado (chamar após escrever em master_exercises)."""
+    global _catalog_version
+    with _catalog_lock:
+        _catalog_version += 1
+
+def _get_catalog():
+    """Retorna (catálogo agrupado, mapa nome -> id), recarregando se o cache estiver velho."""
+    global _catalog_cache
+    cache = _catalog_cache
+    if cache is not None and cache[0] == DB_FILE and cache[1] == _catalog_version:
+        return cache[2], cache[3]
+
+    # A versão é lida antes da consulta: uma escrita concorrente apenas força outra recarga
+    version = _catalog_version
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT master_exercise_id, name, muscle_group FROM master_exercises ORDER BY muscle_group, name")
+        exercises = [MasterExercise(*row) for row in cursor.fetchall()]
 
     grouped_exercises = {}
     for ex in exercises:
-        group = ex['muscle_group']
-        if group not in grouped_exercises:
-            grouped_exercises[group] = []
-        grouped_exercises[group].append(ex)
+        grouped_exercises.setdefault(ex.muscle_group, []).append(ex)
+
+    grouped = MappingProxyType({group: tuple(items) for group, items in grouped_exercises.items()})
+    ids_by_name = MappingProxyType({ex.name: ex.master_exercise_id for ex in exercises})
+    _catalog_cache = (DB_FILE, version, grouped, ids_by_name)
+    return grouped, ids_by_name
+
+@instrumented
+def get_all_master_exercises():
+    """
+    Busca todos os exercícios da biblioteca, agrupados por músculo.
+
+    Retorna um mapeamento somente leitura grupo -> tupla de MasterExercise,
+    compartilhado entre as sessões; não modifique o resultado.
+    """
+    return _get_catalog()[0]
+
+@instrumented
+def add_master_exercise(name, muscle_group):
+    """Adiciona um exercício à biblioteca. Retorna o novo id ou None se o nome já existir."""
+    with db_connection() as conn:
+        try:
+            cursor = conn.execute(
+                "INSERT INTO master_exercises (name, muscle_group) VALUES (?, ?)",
+                (name, muscle_group)
+            )
+            conn.commit()
+            return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return None
+        finally:
+            invalidate_master_exercise_cache()
+
+def normalize_search_text(text):
+    """Texto em minúsculas e sem acentos, para comparações de busca."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+def _search_tokens(query):
+    return re.findall(r"\w+", normalize_search_text(query))
+
+_fts_available = {}  # DB_FILE -> bool
+
+def _has_exercise_fts(conn):
+    available = _fts_available.get(DB_FILE)
+    if available is None:
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'master_exercises_fts'"
+        ).fetchone()
+        available = _fts_available[DB_FILE] = row is not None
+    return available
 
-    return grouped_exercises
+@instrumented
+def search_master_exercises(query, limit=30, offset=0):
+    """
+    Busca exercícios da biblioteca por nome ou grupo muscular, sem diferenciar
+    maiúsculas nem acentos ("supino", "triceps" encontram "Supino", "Tríceps").
+    Cada palavra digitada é tratada como prefixo.
+
+    Retorna no máximo `limit` MasterExercise a partir de `offset`, para paginação.
+    Sem termos de busca, pagina o catálogo completo na ordem de exibição.
+    """
+    tokens = _search_tokens(query or "")
+    if not tokens:
+        catalog = [ex for group in get_all_master_exercises().values() for ex in group]
+        return tuple(catalog[offset:offset + limit])
+
+    with db_connection() as conn:
+        if _has_exercise_fts(conn):
+            match = " ".join(f'"{token}"*' for token in tokens)
+            cursor = conn.execute(
+                """
+                SELECT me.master_exercise_id, me.name, me.muscle_group
+                FROM master_exercises_fts
+                JOIN master_exercises me ON me.master_exercise_id = master_exercises_fts.rowid
+                WHERE master_exercises_fts MATCH ?
+                ORDER BY me.muscle_group, me.name
+                LIMIT ? OFFSET ?
+                """,
+                (match, limit, offset)
+            )
+            return tuple(MasterExercise(*row) for row in cursor.fetchall())
 
+    # Sem FTS5: filtra o catálogo em memória pelos mesmos critérios
+    matches = []
+    for group in get_all_master_exercises().values():
+        for ex in group:
+            words = _search_tokens(f"{ex.name} {ex.muscle_group}")
+            if all(any(word.startswith(token) for word in words) for token in tokens):
+                matches.append(ex)
+    return tuple(matches[offset:offset + limit])
+
+WorkoutDiff = namedtuple("WorkoutDiff", ["inserts", "deletes", "updates", "moves"])
+
+def diff_workout_exercises(user_workout_id, stored_rows, edited_exercises):
+    """
+    Calcula a menor sequência de escritas que leva os exercícios gravados
+    (`stored_rows`: user_exercise_id, master_exercise_id, series, position) à lista
+    editada, cuja ordem define as novas posições.
+
+    Retorna um WorkoutDiff com as tuplas de parâmetros de cada instrução:
+    inserts (user_workout_id, master_exercise_id, series, sets, rep_min, rep_max,
+    series_modifiers, position), deletes (user_exercise_id,), updates
+    (master_exercise_id, series, sets, rep_min, rep_max, series_modifiers,
+    position, user_exercise_id) e moves (position, user_exercise_id).
+    """
+    stored = {row['user_exercise_id']: row for row in stored_rows}
+    inserts, updates, moves = [], [], []
+    kept = set()
+
+    position = 0
+    for ex in edited_exercises:
+        # Garante que estamos pegando o ID correto, seja de um exercício existente ou novo
+        master_id = ex.get('master_exercise_id')
+        if not master_id:
+            # Se for um exercício novo, o ID pode estar em 'id'
+            master_id = ex.get('id')
+        if not master_id:
+            continue
+
+        user_exercise_id = ex.get('user_exercise_id')
+        row = stored.get(user_exercise_id)
+        if row is None or user_exercise_id in kept:
+            inserts.append((user_workout_id, master_id, *_series_fields(ex['series']), position))
+        else:
+            kept.add(user_exercise_id)
+            if row['master_exercise_id'] != master_id or row['series'] != ex['series']:
+                updates.append((master_id, *_series_fields(ex['series']), position, user_exercise_id))
+            elif row['position'] != position:
+                moves.append((position, user_exercise_id))
+        position += 1
+
+    deletes = [(user_exercise_id,) for user_exercise_id in stored if user_exercise_id not in kept]
+    return WorkoutDiff(inserts, deletes, updates, moves)
+
+@instrumented
 def update_workout(user_workout_id, edited_data):
     """
     Atualiza uma ficha de treino inteira com base nos dados editados.
     Isso inclui o título do treino e a lista de exercícios (adicionar, remover, reordenar, atualizar séries).
+
+    Apenas a diferença em relação ao que está gravado é escrita, em uma única
+    transação; exercícios mantidos preservam o seu user_exercise_id. Uma ficha
+    que aponta para um modelo só ganha cópia própria dos exercícios se eles
+    mudaram; alterar apenas o título mantém o vínculo.
+
+    Retorna True se a ficha foi gravada, False se a transação foi desfeita.
     """
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        cursor = conn.cursor()
 
-    try:
-        # 1. Atualizar o título do treino
-        new_title = edited_data['details']['title']
-        cursor.execute("UPDATE user_workouts SET title = ? WHERE user_workout_id = ?", (new_title, user_workout_id))
-
-        # 2. Sincronizar os exercícios (delete all and re-insert)
-        # Primeiro, deletamos todos os exercícios associados ao treino
-        cursor.execute("DELETE FROM user_exercises WHERE user_workout_id = ?", (user_workout_id,))
-        # Depois, inserimos todos os exercícios da lista editada na nova ordem
-        for ex in edited_data['exercises']:
-            # Garante que estamos pegando o ID correto, seja de um exercício existente ou novo
-            master_id = ex.get('master_exercise_id')
-            if not master_id:
-                # Se for um exercício novo, o ID pode estar em 'id'
-                master_id = ex.get('id')
-
-            if master_id:
-                 cursor.execute(
-                    "INSERT INTO user_exercises (user_workout_id, master_exercise_id, series) VALUES (?, ?, ?)",
-                    (user_workout_id, master_id, ex['series'])
+        try:
+            # Trava de escrita desde a leitura, para o diff não ficar obsoleto
+            cursor.execute("BEGIN IMMEDIATE")
+
+            # 1. Atualizar o título do treino (só se mudou)
+            new_title = edited_data['details']['title']
+            cursor.execute(
+                "UPDATE user_workouts SET title = ? WHERE user_workout_id = ? AND title IS NOT ?",
+                (new_title, user_workout_id, new_title)
+            )
+
+            # 2. Sincronizar os exercícios aplicando somente o diff
+            cursor.execute("SELECT template_id FROM user_workouts WHERE user_workout_id = ?", (user_workout_id,))
+            row = cursor.fetchone()
+            template_id = row['template_id'] if row else None
+            if template_id is None:
+                cursor.execute(
+                    "SELECT user_exercise_id, master_exercise_id, series, position FROM user_exercises WHERE user_workout_id = ?",
+                    (user_workout_id,)
                 )
+                diff = diff_workout_exercises(user_workout_id, cursor.fetchall(), edited_data['exercises'])
+            else:
+                # Ficha no modelo: nada gravado ainda, então o diff é a lista inteira
+                diff = diff_workout_exercises(user_workout_id, [], edited_data['exercises'])
+                edited_key = _template_key((insert[1], insert[2]) for insert in diff.inserts)
+                if _get_templates()[1].get(edited_key) == template_id:
+                    diff = WorkoutDiff([], [], [], [])
+                else:
+                    cursor.execute("UPDATE user_workouts SET template_id = NULL WHERE user_workout_id = ?", (user_workout_id,))
 
-        conn.commit()
+            if diff.deletes:
+                cursor.executemany("DELETE FROM user_exercises WHERE user_exercise_id = ?", diff.deletes)
+            if diff.updates:
+                cursor.executemany(
+                    """
+                    UPDATE user_exercises
+                    SET master_exercise_id = ?, series = ?, sets = ?, rep_min = ?, rep_max = ?, series_modifiers = ?, position = ?
+                    WHERE user_exercise_id = ?
+                    """,
+                    diff.updates
+                )
+            if diff.moves:
+                cursor.executemany("UPDATE user_exercises SET position = ? WHERE user_exercise_id = ?", diff.moves)
+            if diff.inserts:
+                cursor.executemany(
+                    """
+                    INSERT INTO user_exercises (user_workout_id, master_exercise_id, series, sets, rep_min, rep_max, series_modifiers, position)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    diff.inserts
+                )
+
+            conn.commit()
+            return True
 
-    except sqlite3.Error as e:
-        print(f"Erro ao atualizar o treino: {e}")
-        conn.rollback()
+        except sqlite3.Error as e:
+            print(f"Erro ao atualizar o treino: {e}")
+            conn.rollback()
+            return False
+
+# --- Exportação e importação em lote (ver data_transfer.py) ---
+
+def iter_member_export_rows(page_size=500, fetch_size=1000):
+    """
+    Gera, em memória constante, uma linha por exercício de cada ficha de cada
+    usuário (usuários sem fichas, ou fichas vazias, aparecem com os campos do
+    treino/exercício em NULL), ordenadas por usuário, ficha e posição. Fichas
+    que apontam para um modelo saem com os exercícios do modelo.
+
+    Os usuários são percorridos em páginas de `page_size` pela chave primária, e
+    cada página é lida com fetchmany; todas as páginas rodam na mesma transação
+    de leitura, então a exportação é um retrato consistente do banco.
+
+    A leitura usa uma conexão própria, fora do pool: a transação fica aberta
+    entre um `yield` e outro, e as escritas feitas enquanto a exportação é
+    consumida (na mesma thread ou não) não a afetam. A conexão é fechada ao fim
+    da iteração; quem parar antes deve chamar close() no gerador (ou usar
+    contextlib.closing) para não segurá-la até a coleta de lixo.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN")
+        try:
+            last_user_id = 0
+            while True:
+                cursor = conn.execute(
+                    """
+                    SELECT u.user_id, u.username, u.email, u.is_active, u.created_at, u.password_hash, u.salt,
+                           w.user_workout_id, w.title, me.name AS exercise_name,
+                           COALESCE(e.series, te.series) AS series, COALESCE(e.position, te.position) AS position
+                    FROM (SELECT * FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?) u
+                    LEFT JOIN user_workouts w ON w.user_id = u.user_id
+                    LEFT JOIN user_exercises e ON e.user_workout_id = w.user_workout_id
+                    LEFT JOIN template_exercises te ON te.template_id = w.template_id
+                    LEFT JOIN master_exercises me ON me.master_exercise_id = COALESCE(e.master_exercise_id, te.master_exercise_id)
+                    ORDER BY u.user_id, w.user_workout_id, position, e.user_exercise_id
+                    """,
+                    (last_user_id, page_size)
+                )
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    return
+                while rows:
+                    yield from rows
+                    last_user_id = rows[-1]['user_id']
+                    rows = cursor.fetchmany(fetch_size)
+        finally:
+            conn.rollback()
     finally:
         conn.close()
+
+@instrumented
+def import_members(members):
+    """
+    Grava um lote de usuários já validados, com suas fichas, em uma única transação.
+
+    Cada item é uma tupla (username, email, is_active, created_at, password_hash,
+    salt, workouts), onde created_at pode ser None (agora) e workouts é uma lista
+    de (título, [(master_exercise_id, séries), ...]). Fichas idênticas a um
+    modelo são gravadas apontando para ele, sem copiar os exercícios. Usuários
+    cujo nome ou e-mail já existem são ignorados.
+
+    Retorna uma lista com o user_id de cada item, ou None para os ignorados; em
+    caso de erro do banco nada é gravado e a função retorna None.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            user_role_id = _get_user_role_id(cursor)
+            template_ids = _get_templates()[1]
+
+            user_ids = []
+            created_identities = []
+            exercises = []
+            for username, email, is_active, created_at, password_hash, salt, workouts in members:
+                user_id = _insert_user(cursor, username, email, password_hash, salt, is_active, created_at)
+                user_ids.append(user_id)
+                if user_id is None:
+                    continue
+                created_identities.append((username, email))
+                for title, workout_exercises in workouts:
+                    template_id = template_ids.get(_template_key(workout_exercises))
+                    cursor.execute(
+                        "INSERT INTO user_workouts (user_id, title, template_id) VALUES (?, ?, ?)",
+                        (user_id, title, template_id)
+                    )
+                    if template_id is not None:
+                        continue
+                    user_workout_id = cursor.lastrowid
+                    exercises.extend(
+                        (user_workout_id, master_id, *_series_fields(series), position)
+                        for position, (master_id, series) in enumerate(workout_exercises)
+                    )
+
+            cursor.executemany(
+                "INSERT INTO user_roles (user_id, role_id) VALUES (?, ?)",
+                [(user_id, user_role_id) for user_id in user_ids if user_id]
+            )
+            cursor.executemany(
+                """
+                INSERT INTO user_exercises (user_workout_id, master_exercise_id, series, sets, rep_min, rep_max, series_modifiers, position)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                exercises
+            )
+            conn.commit()
+            _remember_identities(created_identities)
+            return user_ids
+        except sqlite3.Error as e:
+            print(f"Erro no banco de dados durante a importação: {e}")
+            conn.rollback()
+            return None
+
+# --- Registro de treinos (workout_sets) e agregados ---
+# O histórico só recebe inserções; cada lote de séries atualiza, na mesma
+# transação, os agregados lidos pelas telas de progresso, que assim nunca
+# percorrem o histórico inteiro.
+
+LoggedSet = namedtuple("LoggedSet", ["user_exercise_id", "master_exercise_id", "reps", "load_kg", "performed_at"])
+LoggedSet.__new__.__defaults__ = (None,)
+
+_groups_by_id_cache = (None, None)  # (catálogo agrupado de origem, mapa id -> grupo muscular)
+
+def _get_muscle_groups_by_id():
+    """Mapa master_exercise_id -> grupo muscular, derivado do cache do catálogo."""
+    global _groups_by_id_cache
+    grouped = _get_catalog()[0]
+    source, groups_by_id = _groups_by_id_cache
+    if source is not grouped:
+        groups_by_id = {ex.master_exercise_id: group for group, items in grouped.items() for ex in items}
+        _groups_by_id_cache = (grouped, groups_by_id)
+    return groups_by_id
+
+def iso_week(moment):
+    """Semana ISO no formato 'AAAA-Www' (ordenável como texto)."""
+    year, week, _ = moment.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def estimated_1rm(reps, load_kg):
+    """Estimativa de carga máxima para uma repetição (fórmula de Epley)."""
+    if reps == 1:
+        return load_kg
+    return load_kg * (1 + reps / 30)
+
+@instrumented
+def log_workout_sets(user_id, sets):
+    """
+    Registra as séries de uma sessão de treino, todas em uma única transação.
+
+    `sets` é um iterável de LoggedSet (ou tuplas na mesma ordem): user_exercise_id
+    (pode ser None), master_exercise_id, reps, load_kg e performed_at (datetime em
+    UTC; o padrão é agora). O volume semanal por grupo muscular e a melhor série de
+    cada exercício são atualizados no mesmo commit.
+
+    Retorna o número de séries gravadas, ou None em caso de erro (nada é gravado).
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    groups_by_id = _get_muscle_groups_by_id()
+
+    rows = []
+    volume = {}  # (iso_week, grupo) -> [séries, repetições, volume]
+    best = {}    # master_exercise_id -> (1RM estimado, reps, carga, data)
+    for logged in sets:
+        user_exercise_id, master_exercise_id, reps, load_kg, performed_at = LoggedSet(*logged)
+        performed_at = performed_at or now
+        week = iso_week(performed_at)
+        performed_at_text = performed_at.strftime("%Y-%m-%d %H:%M:%S")
+        rows.append((user_id, user_exercise_id, master_exercise_id, reps, load_kg, performed_at_text, week))
+
+        totals = volume.setdefault((week, groups_by_id.get(master_exercise_id, "Outros")), [0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += reps
+        totals[2] += reps * load_kg
+
+        candidate = (estimated_1rm(reps, load_kg), reps, load_kg, performed_at_text)
+        if master_exercise_id not in best or candidate[0] > best[master_exercise_id][0]:
+            best[master_exercise_id] = candidate
+
+    if not rows:
+        return 0
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.executemany(
+                """
+                INSERT INTO workout_sets (user_id, user_exercise_id, master_exercise_id, reps, load_kg, performed_at, iso_week)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows
+            )
+            cursor.executemany(
+                """
+                INSERT INTO weekly_muscle_volume (user_id, iso_week, muscle_group, sets, reps, volume_kg)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, iso_week, muscle_group) DO UPDATE SET
+                    sets = sets + excluded.sets,
+                    reps = reps + excluded.reps,
+                    volume_kg = volume_kg + excluded.volume_kg
+                """,
+                [(user_id, week, group, *totals) for (week, group), totals in volume.items()]
+            )
+            cursor.executemany(
+                """
+                INSERT INTO exercise_best_sets (user_id, master_exercise_id, estimated_1rm, reps, load_kg, performed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, master_exercise_id) DO UPDATE SET
+                    estimated_1rm = excluded.estimated_1rm,
+                    reps = excluded.reps,
+                    load_kg = excluded.load_kg,
+                    performed_at = excluded.performed_at
+                WHERE excluded.estimated_1rm > exercise_best_sets.estimated_1rm
+                """,
+                [(user_id, master_exercise_id, *candidate) for master_exercise_id, candidate in best.items()]
+            )
+            conn.commit()
+            return len(rows)
+        except sqlite3.Error as e:
+            print(f"Erro ao registrar as séries do treino: {e}")
+            conn.rollback()
+            return None
+
+@instrumented
+def get_weekly_muscle_volume(user_id, from_week=None, to_week=None):
+    """
+    Volume semanal por grupo muscular (agregado), entre as semanas ISO
+    `from_week` e `to_week` ('AAAA-Www'), inclusive. Ordenado por semana e grupo.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT iso_week, muscle_group, sets, reps, volume_kg
+            FROM weekly_muscle_volume
+            WHERE user_id = ? AND iso_week >= ? AND iso_week <= ?
+            ORDER BY iso_week, muscle_group
+            """,
+            (user_id, from_week or "", to_week or "9999")
+        )
+        return cursor.fetchall()
+
+@instrumented
+def get_exercise_best_sets(user_id):
+    """Melhor série (maior 1RM estimado) de cada exercício já registrado pelo usuário."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT b.master_exercise_id, me.name, me.muscle_group, b.reps, b.load_kg, b.estimated_1rm, b.performed_at
+            FROM exercise_best_sets b
+            JOIN master_exercises me ON me.master_exercise_id = b.master_exercise_id
+            WHERE b.user_id = ?
+            ORDER BY me.muscle_group, me.name
+            """,
+            (user_id,)
+        )
+        return cursor.fetchall()
+
+@instrumented
+def get_planned_sets_by_muscle_group(user_id):
+    """
+    Total de séries planejadas por grupo muscular em todas as fichas do usuário
+    (inclusive as que ainda apontam para um modelo), somado em SQL a partir das
+    colunas interpretadas (sets). Exercícios cuja
+    prescrição não pôde ser lida entram na contagem mas não na soma.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT me.muscle_group, SUM(planned.sets) AS planned_sets, COUNT(*) AS exercises
+            FROM (
+                SELECT ue.master_exercise_id, ue.sets
+                FROM user_workouts w
+                JOIN user_exercises ue ON ue.user_workout_id = w.user_workout_id
+                WHERE w.user_id = ?
+                UNION ALL
+                SELECT te.master_exercise_id, te.sets
+                FROM user_workouts w
+                JOIN template_exercises te ON te.template_id = w.template_id
+                WHERE w.user_id = ?
+            ) planned
+            JOIN master_exercises me ON me.master_exercise_id = planned.master_exercise_id
+            GROUP BY me.muscle_group
+            ORDER BY planned_sets DESC
+            """,
+            (user_id, user_id)
+        )
+        return cursor.fetchall()
+
+@instrumented
+def get_workout_set_columns(first_user_id, last_user_id, since=None):
+    """
+    Carrega em lote o histórico de séries dos usuários com id entre
+    `first_user_id` e `last_user_id` (inclusive), a partir de `since`
+    ('AAAA-MM-DD HH:MM:SS', opcional), para as análises de analytics.py.
+
+    Retorna colunas, não linhas: uma tupla de listas (user_id,
+    master_exercise_id, reps, load_kg, performed_at em segundos desde a época),
+    ordenadas por usuário e data.
+    """
+    columns = ([], [], [], [], [])
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT user_id, master_exercise_id, reps, load_kg, CAST(strftime('%s', performed_at) AS INTEGER)
+            FROM workout_sets
+            WHERE user_id BETWEEN ? AND ? AND performed_at >= ?
+            ORDER BY user_id, performed_at, set_id
+            """,
+            (first_user_id, last_user_id, since or "")
+        )
+        while True:
+            rows = cursor.fetchmany(5000)
+            if not rows:
+                break
+            for column, values in zip(columns, zip(*rows)):
+                column.extend(values)
+    return columns
+
+@instrumented
+def get_workout_set_user_range():
+    """Menor e maior user_id com séries registradas, ou (None, None)."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        # Duas subconsultas: juntos no mesmo SELECT, MIN e MAX perdem a otimização pelo índice
+        cursor.execute(
+            "SELECT (SELECT MIN(user_id) FROM workout_sets), (SELECT MAX(user_id) FROM workout_sets)"
+        )
+        return tuple(cursor.fetchone())
+
+# Para testar a criação do banco de dados ao executar este arquivo diretamente
+if __name__ == '__main__':
+    init_db()
@@ -0,0 +1,417 @@
+"""
+Instrumentação opcional da camada de dados.
+
+Desligada por padrão. Quando ligada (CHAMPS_DB_INSTRUMENTATION=1 ou enable()),
+as conexões do pool passam a ser InstrumentedConnection, que medem cada
+instrução SQL (contagem, histograma de latência, linhas lidas) e, pelo trace
+callback do sqlite3, a duração de cada transação (BEGIN até COMMIT/ROLLBACK)
+e quantas vezes o banco estava travado por outra conexão ("database is locked").
+As funções públicas de database.py marcadas com @instrumented registram a
+própria latência e quantas consultas cada chamada fez.
+
+Desligada, o custo é uma checagem de flag por chamada de função pública: as
+conexões são sqlite3.Connection comuns.
+
+snapshot() retorna as métricas acumuladas; to_prometheus() as formata no formato
+texto do Prometheus, e start_periodic_export() as grava (ou registra no log)
+periodicamente.
+"""
+import bisect
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Limites dos buckets dos histogramas, em segundos
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_enabled = os.environ.get("CHAMPS_DB_INSTRUMENTATION", "") not in ("", "0")
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Histogram:
+    """Histograma cumulativo de latências, no estilo do Prometheus."""
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # o último é o +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def as_dict(self):
+        cumulative = []
+        total = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return {"count": self.count, "sum": self.sum, "buckets": cumulative}
+
+
+class QueryStats:
+    __slots__ = ("latency", "rows", "fetch_seconds")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.rows = 0
+        self.fetch_seconds = 0.0
+
+
+class FunctionStats:
+    __slots__ = ("latency", "queries", "errors")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.queries = 0
+        self.errors = 0
+
+
+_queries = {}       # SQL normalizado -> QueryStats
+_query_aliases = {} # SQL como foi escrito -> QueryStats (evita normalizar a cada execução)
+_functions = {}     # nome da função -> FunctionStats
+_transactions = {"latency": Histogram(), "rolled_back": 0}
+_lock_errors = [0]  # "database is locked"/"busy" vistos em instruções e commits
+
+
+def _count_lock_error(error):
+    message = str(error).lower()
+    if "locked" in message or "busy" in message:
+        with _lock:
+            _lock_errors[0] += 1
+
+
+def _normalize_sql(sql):
+    return " ".join(sql.split())
+
+
+def _query_stats(sql):
+    stats = _query_aliases.get(sql)
+    if stats is None:
+        with _lock:
+            stats = _query_aliases[sql] = _queries.setdefault(_normalize_sql(sql), QueryStats())
+    return stats
+
+
+# --- Liga/desliga ---
+
+def is_enabled():
+    return _enabled
+
+
+def enable():
+    """Liga a instrumentação; as conexões do pool são recriadas já instrumentadas."""
+    global _enabled
+    _enabled = True
+    _recycle_pool()
+
+
+def disable():
+    """Desliga a instrumentação e volta às conexões comuns."""
+    global _enabled
+    _enabled = False
+    _recycle_pool()
+
+
+def _recycle_pool():
+    import database  # importação tardia: database importa este módulo
+    database.close_pool()
+
+
+def connection_factory():
+    """Classe de conexão que database.get_db_connection deve usar."""
+    return InstrumentedConnection if _enabled else sqlite3.Connection
+
+
+# --- Conexão e cursor instrumentados ---
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que mede cada instrução e conta as linhas lidas."""
+
+    def _timed(self, method, sql, *args):
+        stats = _query_stats(sql)
+        started = time.perf_counter()
+        try:
+            return method(self, sql, *args)
+        except sqlite3.OperationalError as e:
+            _count_lock_error(e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with _lock:
+                stats.latency.observe(elapsed)
+                function = getattr(_local, "function", None)
+                if function is not None:
+                    function.queries += 1
+            self._stats = stats
+
+    def execute(self, sql, parameters=()):
+        return self._timed(sqlite3.Cursor.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(sqlite3.Cursor.executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._timed(sqlite3.Cursor.executescript, sql_script)
+
+    def _fetched(self, rows, started):
+        stats = getattr(self, "_stats", None)
+        if stats is not None:
+            with _lock:
+                stats.rows += rows
+                stats.fetch_seconds += time.perf_counter() - started
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(0 if row is None else 1, started)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(len(rows), started)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(len(rows), started)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        row = super().__next__()
+        self._fetched(1, started)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Conexão cujos cursores são instrumentados e cujas transações são cronometradas."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._transaction_started = None
+        self.set_trace_callback(self._trace)
+
+    def _trace(self, statement):
+        # O trace também vê o BEGIN implícito e o COMMIT/ROLLBACK de commit()/rollback()
+        keyword = statement.lstrip()[:8].upper()
+        if keyword.startswith("BEGIN"):
+            self._transaction_started = time.perf_counter()
+        elif keyword.startswith(("COMMIT", "END", "ROLLBACK")) and self._transaction_started is not None:
+            elapsed = time.perf_counter() - self._transaction_started
+            self._transaction_started = None
+            with _lock:
+                _transactions["latency"].observe(elapsed)
+                if keyword.startswith("ROLLBACK"):
+                    _transactions["rolled_back"] += 1
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def commit(self):
+        try:
+            return super().commit()
+        except sqlite3.OperationalError as e:
+            _count_lock_error(e)
+            raise
+
+    # Connection.execute* não passa por self.cursor(); redireciona para o cursor instrumentado
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+# --- Funções públicas de database.py ---
+
+def instrumented(func):
+    """Registra latência, erros e número de consultas de cada chamada da função."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+
+        stats = _functions.get(name)
+        if stats is None:
+            with _lock:
+                stats = _functions.setdefault(name, FunctionStats())
+        outer = getattr(_local, "function", None)
+        _local.function = stats
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            with _lock:
+                stats.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            _local.function = outer
+            with _lock:
+                stats.latency.observe(elapsed)
+    return wrapper
+
+
+# --- Leitura e exportação ---
+
+def snapshot():
+    """Retrato das métricas acumuladas até agora."""
+    with _lock:
+        queries = {
+            sql: {**stats.latency.as_dict(), "rows": stats.rows, "fetch_seconds": stats.fetch_seconds}
+            for sql, stats in _queries.items()
+        }
+        functions = {
+            name: {**stats.latency.as_dict(), "queries": stats.queries, "errors": stats.errors}
+            for name, stats in _functions.items()
+        }
+        transactions = {**_transactions["latency"].as_dict(), "rolled_back": _transactions["rolled_back"]}
+        lock_errors = _lock_errors[0]
+    return {
+        "enabled": _enabled, "queries": queries, "functions": functions,
+        "transactions": transactions, "lock_errors": lock_errors,
+    }
+
+
+def reset():
+    """Zera todas as métricas."""
+    with _lock:
+        _queries.clear()
+        _query_aliases.clear()
+        _functions.clear()
+        _transactions["latency"] = Histogram()
+        _transactions["rolled_back"] = 0
+        _lock_errors[0] = 0
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _histogram_lines(metric, label_name, label_value, data):
+    labels = f'{label_name}="{_label(label_value)}",' if label_name else ""
+    lines = []
+    for bound, count in data["buckets"]:
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        lines.append(f'{metric}_bucket{{{labels}le="{le}"}} {count}')
+    labels = f'{{{labels.rstrip(",")}}}' if labels else ""
+    lines.append(f"{metric}_sum{labels} {data['sum']}")
+    lines.append(f"{metric}_count{labels} {data['count']}")
+    return lines
+
+
+def to_prometheus(data=None):
+    """Formata um snapshot (o atual, por padrão) no formato texto do Prometheus."""
+    data = data or snapshot()
+    lines = [
+        "# HELP champs_db_query_duration_seconds Tempo de execução de cada instrução SQL.",
+        "# TYPE champs_db_query_duration_seconds histogram",
+    ]
+    for sql, stats in sorted(data["queries"].items()):
+        lines.extend(_histogram_lines("champs_db_query_duration_seconds", "query", sql, stats))
+    lines += [
+        "# HELP champs_db_query_rows_total Linhas lidas de cada instrução SQL.",
+        "# TYPE champs_db_query_rows_total counter",
+    ]
+    for sql, stats in sorted(data["queries"].items()):
+        lines.append(f'champs_db_query_rows_total{{query="{_label(sql)}"}} {stats["rows"]}')
+
+    lines += [
+        "# HELP champs_db_function_duration_seconds Latência das funções públicas de database.py.",
+        "# TYPE champs_db_function_duration_seconds histogram",
+    ]
+    for name, stats in sorted(data["functions"].items()):
+        lines.extend(_histogram_lines("champs_db_function_duration_seconds", "function", name, stats))
+    lines += [
+        "# HELP champs_db_function_queries_total Consultas feitas por cada função pública.",
+        "# TYPE champs_db_function_queries_total counter",
+    ]
+    for name, stats in sorted(data["functions"].items()):
+        lines.append(f'champs_db_function_queries_total{{function="{name}"}} {stats["queries"]}')
+    lines += [
+        "# HELP champs_db_function_errors_total Exceções levantadas por cada função pública.",
+        "# TYPE champs_db_function_errors_total counter",
+    ]
+    for name, stats in sorted(data["functions"].items()):
+        lines.append(f'champs_db_function_errors_total{{function="{name}"}} {stats["errors"]}')
+
+    lines += [
+        "# HELP champs_db_transaction_duration_seconds Duração das transações (BEGIN até COMMIT/ROLLBACK).",
+        "# TYPE champs_db_transaction_duration_seconds histogram",
+    ]
+    lines.extend(_histogram_lines("champs_db_transaction_duration_seconds", None, None, data["transactions"]))
+    lines += [
+        "# HELP champs_db_transactions_rolled_back_total Transações desfeitas.",
+        "# TYPE champs_db_transactions_rolled_back_total counter",
+        f"champs_db_transactions_rolled_back_total {data['transactions']['rolled_back']}",
+        "# HELP champs_db_lock_errors_total Instruções ou commits que falharam com o banco travado.",
+        "# TYPE champs_db_lock_errors_total counter",
+        f"champs_db_lock_errors_total {data['lock_errors']}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+# --- Exportação periódica ---
+
+_exporter = None
+
+
+def _export(path):
+    text = to_prometheus()
+    if path:
+        # Grava em um arquivo temporário e troca, para o coletor nunca ler pela metade
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temp_path, path)
+    else:
+        logging.info("Métricas do banco de dados:\n%s", text)
+
+
+def start_periodic_export(interval=60.0, path=None):
+    """
+    Exporta as métricas a cada `interval` segundos em uma thread daemon: para o
+    arquivo `path` (ex.: lido pelo textfile collector do node_exporter) ou, sem
+    `path`, para o log.
+    """
+    global _exporter
+    stop_periodic_export()
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                _export(path)
+            except OSError as e:
+                logging.warning(f"Falha ao exportar as métricas do banco de dados: {e}")
+
+    thread = threading.Thread(target=loop, name="champs-db-metrics", daemon=True)
+    thread.start()
+    _exporter = (thread, stop)
+
+
+def stop_periodic_export():
+    global _exporter
+    if _exporter is not None:
+        _exporter[1].set()
+        _exporter = None
+
+
+if _enabled and os.environ.get("CHAMPS_DB_METRICS_INTERVAL"):
+    start_periodic_export(
+        float(os.environ["CHAMPS_DB_METRICS_INTERVAL"]), os.environ.get("CHAMPS_DB_METRICS_FILE")
+    )
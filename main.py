@@ -1,15 +1,58 @@
+import startup_profiler  # primeiro: o perfil da inicialização mede a partir daqui
+import importlib
+import threading
+import time
 import flet as ft
-from database import init_db, get_user_workouts
-from screens.login_screen import LoginScreen
-from screens.register_screen import RegisterScreen
-from screens.home_screen import HomeScreen
-from screens.workout_screen import WorkoutScreen
-from screens.exercise_picker_screen import ExercisePickerScreen
+import password_hashing
+from async_database import schema_ready, start_schema_check
+from session_tokens import validate_token_async, SESSION_TOKEN_KEY
+from view_cache import cached_view
+
+startup_profiler.record("importações de main.py")
+
+# Telas por nome: (módulo, função). Cada módulo só é importado na primeira vez
+# em que a tela é aberta, e não na inicialização do app.
+SCREENS = {
+    "login": ("screens.login_screen", "LoginScreen"),
+    "register": ("screens.register_screen", "RegisterScreen"),
+    "home": ("screens.home_screen", "HomeScreen"),
+    "workout": ("screens.workout_screen", "WorkoutScreen"),
+    "pick-exercise": ("screens.exercise_picker_screen", "ExercisePickerScreen"),
+    "progress": ("screens.progress_screen", "ProgressScreen"),
+}
+
+_loaded_screens = {}
+
+
+def load_screen(name):
+    """Retorna a função que monta a tela, importando o módulo dela na primeira chamada."""
+    screen = _loaded_screens.get(name)
+    if screen is None:
+        module_name, function_name = SCREENS[name]
+        with startup_profiler.phase(f"importação de {module_name}"):
+            screen = getattr(importlib.import_module(module_name), function_name)
+        _loaded_screens[name] = screen
+    return screen
+
+
+def start_background_schema_check():
+    """Verifica (ou migra) o schema em segundo plano; o perfil registra quanto levou."""
+    started = time.perf_counter()
+    check = start_schema_check()
+    if not check.done():
+        check.add_done_callback(lambda _: startup_profiler.record("init_db (em segundo plano)", started))
+    return check
+
 
 def main(page: ft.Page):
     """
     Função principal que configura e executa o aplicativo Flet.
     """
+    global _app_started
+    if _app_started is not None:
+        startup_profiler.record("Flet até a primeira sessão", _app_started)
+        _app_started = None
+
     # --- Configuração da Página/Janela ---
     page.title = "Champs Gym App"
     page.window_width = 400
@@ -17,39 +60,79 @@ def main(page: ft.Page):
     page.theme_mode = ft.ThemeMode.DARK # Tema escuro
 
     # --- Inicialização do Banco de Dados ---
-    init_db()
+    # Verifica o schema em segundo plano (um no-op depois da primeira sessão do
+    # processo). A tela de login não depende do banco e é desenhada sem esperar;
+    # o que consulta o banco espera por schema_ready().
+    start_background_schema_check()
 
     # --- Gerenciamento de Rotas ---
-    def route_change(route):
+    async def authenticated_user_id():
         """
-        Altera a view (tela) da página com base na rota atual.
+        Valida o token de sessão (da sessão ou, após reconexão, do armazenamento do
+        cliente) e retorna o user_id dono dele, ou None.
         """
+        token = page.session.get("session_token") or page.client_storage.get(SESSION_TOKEN_KEY)
+        if token:
+            # Só quem já tem token consulta o banco antes de desenhar a tela
+            await schema_ready()
+        user_id = await validate_token_async(token)
+        if user_id:
+            page.session.set("session_token", token)
+            page.session.set("user_id", user_id)
+        elif page.session.contains_key("user_id"):
+            page.session.remove("user_id")
+        return user_id
+
+    first_render = True
+
+    async def route_change(route):
+        """
+        Altera a view (tela) da página com base na rota atual. As telas das rotas
+        protegidas saem do cache de views da sessão quando já foram montadas.
+        """
+        nonlocal first_render
+        started = time.perf_counter()
         page.views.clear()
         if page.route == "/":
-            page.views.append(LoginScreen(page))
+            # Token ainda válido: pula o login
+            if await authenticated_user_id():
+                page.go("/home")
+                return
+            page.views.append(load_screen("login")(page))
         elif page.route == "/register":
-            page.views.append(RegisterScreen(page))
+            page.views.append(load_screen("register")(page))
         elif page.route == "/home":
-            # Proteção de rota: só permite acesso se o user_id estiver na sessão
-            if not page.session.get("user_id"):
+            # Proteção de rota: só permite acesso com um token de sessão válido
+            if not await authenticated_user_id():
                 page.go("/")
             else:
-                page.views.append(HomeScreen(page))
+                page.views.append(await cached_view(page, page.route, lambda: load_screen("home")(page)))
         elif page.route == "/pick-exercise":
-            if not page.session.get("user_id"):
+            if not await authenticated_user_id():
                 page.go("/")
             else:
-                page.views.append(ExercisePickerScreen(page))
+                page.views.append(await cached_view(page, page.route, lambda: load_screen("pick-exercise")(page)))
+        elif page.route == "/progress":
+            if not await authenticated_user_id():
+                page.go("/")
+            else:
+                page.views.append(await cached_view(page, page.route, lambda: load_screen("progress")(page)))
         # Rota dinâmica para as telas de treino do usuário
         elif page.route.startswith("/workout/"):
-            if not page.session.get("user_id"):
+            if not await authenticated_user_id():
                 page.go("/")
             else:
                 parts = page.route.split("/")
                 user_workout_id = int(parts[2])
-                page.views.append(WorkoutScreen(page, user_workout_id))
+                page.views.append(await cached_view(
+                    page, page.route, lambda: load_screen("workout")(page, user_workout_id)
+                ))
 
         page.update()
+        if first_render:
+            first_render = False
+            startup_profiler.record(f"primeira rota ({page.route})", started)
+            startup_profiler.report()
 
     def view_pop(view):
         """
@@ -65,6 +148,14 @@ def main(page: ft.Page):
     # --- Inicia o app na rota raiz ---
     page.go("/")
 
+
+# Momento em que ft.app foi chamado (para o perfil da inicialização)
+_app_started = None
+
 if __name__ == "__main__":
-    init_db()
-    ft.app(target=main, port=8550)
\ No newline at end of file
+    # A verificação do schema e a subida do pool de hash de senhas correm
+    # enquanto o Flet sobe o servidor
+    start_background_schema_check()
+    threading.Thread(target=password_hashing.warm_up, name="champs-hash-warm-up", daemon=True).start()
+    _app_started = time.perf_counter()
+    ft.app(target=main, port=8550)
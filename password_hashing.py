@@ -0,0 +1,200 @@
+"""
+Serviço de hash de senhas.
+
+As senhas são derivadas com uma KDF de custo configurável (scrypt ou PBKDF2) e o
+resultado é gravado junto com o algoritmo e os parâmetros usados, no formato:
+
+    scrypt$<n>$<r>$<p>$<hash hex>
+    pbkdf2_sha256$<iterações>$<hash hex>
+
+O salt continua na coluna `users.salt`. Hashes antigos (SHA-256 simples, sem '$')
+ainda são aceitos por verify_password e marcados por needs_rehash. Hashes em
+qualquer outro formato (ex.: bcrypt ou argon2 vindos de outro sistema) nunca
+conferem e também são marcados por needs_rehash.
+
+Como a KDF é cara de propósito, as versões assíncronas rodam em um pool de
+processos para não travar o loop de eventos do Flet durante um pico de logins.
+"""
+import asyncio
+import hashlib
+import hmac
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# --- Parâmetros de custo (ajustáveis por variáveis de ambiente) ---
+ALGORITHM = os.environ.get("CHAMPS_PASSWORD_ALGORITHM", "scrypt")
+SCRYPT_N = int(os.environ.get("CHAMPS_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.environ.get("CHAMPS_SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("CHAMPS_SCRYPT_P", "1"))
+PBKDF2_ITERATIONS = int(os.environ.get("CHAMPS_PBKDF2_ITERATIONS", "600000"))
+HASH_WORKERS = int(os.environ.get("CHAMPS_HASH_WORKERS", str(os.cpu_count() or 1)))
+
+SUPPORTED_ALGORITHMS = ("scrypt", "pbkdf2_sha256")
+
+# Quantos parâmetros de custo cada algoritmo grava no hash
+_PARAMETER_COUNTS = {"scrypt": 3, "pbkdf2_sha256": 1}
+
+_HEX_DIGITS = frozenset("0123456789abcdef")
+
+
+def new_salt():
+    """Gera um salt aleatório em hexadecimal."""
+    return os.urandom(16).hex()
+
+
+def current_parameters(algorithm=None):
+    """Parâmetros de custo em vigor para o algoritmo informado (ou o padrão)."""
+    algorithm = algorithm or ALGORITHM
+    if algorithm == "scrypt":
+        return (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    if algorithm == "pbkdf2_sha256":
+        return (PBKDF2_ITERATIONS,)
+    raise ValueError(f"Algoritmo de hash não suportado: {algorithm}")
+
+
+def _derive(password, salt, algorithm, params):
+    if algorithm == "scrypt":
+        n, r, p = params
+        return hashlib.scrypt(
+            password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+            maxmem=256 * n * r + 1024 * 1024,
+        ).hex()
+    if algorithm == "pbkdf2_sha256":
+        (iterations,) = params
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), iterations).hex()
+    raise ValueError(f"Algoritmo de hash não suportado: {algorithm}")
+
+
+def hash_password(password, salt, algorithm=None, params=None):
+    """Calcula o hash da senha e o retorna já codificado com algoritmo e custo."""
+    algorithm = algorithm or ALGORITHM
+    params = tuple(params) if params else current_parameters(algorithm)
+    digest = _derive(password, salt, algorithm, params)
+    return "$".join([algorithm, *(str(value) for value in params), digest])
+
+
+def _is_hex(value):
+    return bool(value) and set(value) <= _HEX_DIGITS
+
+
+def _parse(password_hash):
+    """
+    Separa um hash codificado em (algoritmo, parâmetros, digest); None se for
+    legado (SHA-256 em hex). Levanta ValueError para qualquer outro formato.
+    """
+    if not isinstance(password_hash, str):
+        raise ValueError("Hash de senha deve ser um texto.")
+    if "$" not in password_hash:
+        if len(password_hash) == 64 and _is_hex(password_hash):
+            return None
+        raise ValueError("Formato de hash de senha desconhecido.")
+    algorithm, *fields = password_hash.split("$")
+    if algorithm not in _PARAMETER_COUNTS:
+        raise ValueError(f"Algoritmo de hash não suportado: {algorithm}")
+    *params, digest = fields
+    if len(params) != _PARAMETER_COUNTS[algorithm] or not _is_hex(digest):
+        raise ValueError(f"Hash {algorithm} malformado.")
+    if not all(value.isascii() and value.isdigit() and int(value) > 0 for value in params):
+        raise ValueError(f"Parâmetros de custo inválidos no hash {algorithm}.")
+    return algorithm, tuple(int(value) for value in params), digest
+
+
+def is_supported_hash(password_hash):
+    """True se verify_password sabe conferir o hash (legado ou de um algoritmo suportado)."""
+    try:
+        _parse(password_hash)
+    except ValueError:
+        return False
+    return True
+
+
+def verify_password(password, password_hash, salt):
+    """
+    Confere a senha contra um hash codificado ou legado (SHA-256). Um hash em
+    formato desconhecido nunca confere.
+    """
+    try:
+        parsed = _parse(password_hash)
+        if parsed is None:
+            candidate = hashlib.sha256((password + salt).encode()).hexdigest()
+            return hmac.compare_digest(candidate, password_hash)
+
+        algorithm, params, digest = parsed
+        candidate = _derive(password, salt, algorithm, params)
+    except ValueError:
+        return False
+    return hmac.compare_digest(candidate, digest)
+
+
+def needs_rehash(password_hash):
+    """True se o hash for legado, de formato desconhecido ou usar algoritmo/custo diferentes dos atuais."""
+    try:
+        parsed = _parse(password_hash)
+    except ValueError:
+        return True
+    if parsed is None:
+        return True
+    algorithm, params, _ = parsed
+    return algorithm != ALGORITHM or params != current_parameters()
+
+
+# --- Execução fora do loop de eventos ---
+
+_executor = None
+
+
+def _mp_context():
+    """
+    Contexto dos processos do pool: forkserver (ou spawn, onde não existe), nunca
+    fork. O pool nasce no primeiro login, dentro de um processo com threads,
+    sockets abertos e conexões SQLite no pool; um fork ali herdaria travas e
+    descritores. O servidor do forkserver já começa com exec e só pré-carrega
+    este módulo.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=_mp_context())
+    return _executor
+
+
+async def hash_password_async(password, salt):
+    """Versão assíncrona de hash_password, executada no pool de processos."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), hash_password, password, salt)
+
+
+async def verify_password_async(password, password_hash, salt):
+    """Versão assíncrona de verify_password, executada no pool de processos."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), verify_password, password, password_hash, salt)
+
+
+def hash_passwords(passwords, salts):
+    """Hash de várias senhas em paralelo no pool de processos (ex.: importação em lote)."""
+    chunksize = max(1, len(passwords) // (HASH_WORKERS * 4))
+    return list(_get_executor().map(hash_password, passwords, salts, chunksize=chunksize))
+
+
+def warm_up():
+    """
+    Inicia os processos do pool agora, para que o primeiro login não pague a
+    criação deles. Bloqueia até o pool responder.
+    """
+    _get_executor().submit(int).result()
+
+
+def shutdown():
+    """Encerra o pool de processos (ex.: ao finalizar o app)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,40 +1,29 @@
 import flet as ft
-from database import get_all_master_exercises, replace_exercise_in_workout, add_exercise_to_workout
+from async_database import search_master_exercises
 
-def ExercisePickerScreen(page: ft.Page):
+# Quantidade de exercícios renderizados por vez na lista
+PAGE_SIZE = 30
+
+async def ExercisePickerScreen(page: ft.Page):
     """
-    Tela para selecionar um exercício da biblioteca mestre.
+    Tela para selecionar um exercício da biblioteca mestre, com busca enquanto se digita.
     """
-    # Parâmetros passados pela rota
-    user_workout_id = page.session.get("current_workout_id")
-    user_exercise_id_to_replace = page.session.get("exercise_to_replace")
-
+    # Os parâmetros da rota (ficha atual e exercício a substituir) são lidos da
+    # sessão a cada clique: a view fica no cache e serve a várias aberturas.
     def select_exercise(e):
         """Callback para quando um exercício é selecionado."""
+        user_workout_id = page.session.get("current_workout_id")
+        user_exercise_id_to_replace = page.session.get("exercise_to_replace")
         selected_master_id = e.control.data
         selected_exercise_name = e.control.title.value # Pega o nome do ListTile
 
+        edit_state = page.session.get("workout_in_edit")
         if user_exercise_id_to_replace:
-            # Modo de substituição: Atualiza a cópia na sessão
-            edited_data = page.session.get("workout_in_edit")
-            for ex in edited_data["exercises"]:
-                if ex['user_exercise_id'] == user_exercise_id_to_replace:
-                    ex['master_exercise_id'] = selected_master_id
-                    ex['name'] = selected_exercise_name # Atualiza o nome para UI
-                    break
-            page.session.set("workout_in_edit", edited_data)
+            # Modo de substituição: troca o exercício no estado de edição
+            edit_state.replace_exercise(user_exercise_id_to_replace, selected_master_id, selected_exercise_name)
         else:
-            # Modo de adição: Adiciona à cópia na sessão
-            edited_data = page.session.get("workout_in_edit")
-            new_exercise = {
-                # ID temporário negativo para novos exercícios, para evitar conflitos
-                'user_exercise_id': - (len(edited_data["exercises"]) + 1),
-                'master_exercise_id': selected_master_id,
-                'name': selected_exercise_name,
-                'series': '3x10' # Padrão para novos exercícios
-            }
-            edited_data["exercises"].append(new_exercise)
-            page.session.set("workout_in_edit", edited_data)
+            # Modo de adição: o estado atribui um id temporário único ao novo exercício
+            edit_state.add_exercise(selected_master_id, selected_exercise_name)
 
         # Limpa a variável de substituição e volta
         if page.session.contains_key("exercise_to_replace"):
@@ -46,24 +35,90 @@ def ExercisePickerScreen(page: ft.Page):
         # Garante que a chave só será removida se existir
         if page.session.get("exercise_to_replace"):
             page.session.remove("exercise_to_replace")
-        page.go(f"/workout/{user_workout_id}")
+        page.go(f"/workout/{page.session.get('current_workout_id')}")
 
-    # --- Layout da Tela ---
-    all_exercises = get_all_master_exercises()
-    exercise_list = ft.ListView(expand=True, spacing=10)
+    # --- Busca e paginação ---
+    # Cada busca recebe um número; respostas de buscas já superadas são descartadas
+    # `generation` muda a cada nova busca; `loading` impede que um "Carregar mais"
+    # rode enquanto outra página (ou a primeira página de uma nova busca) chega
+    search_state = {"query": "", "offset": 0, "last_group": None, "generation": 0, "loading": False}
 
-    for group, exercises in all_exercises.items():
-        exercise_list.controls.append(
-            ft.Text(group, size=20, weight=ft.FontWeight.BOLD)
-        )
+    def build_page_controls(exercises):
+        """Cria os controles de uma página de resultados, com o título de cada grupo."""
+        controls = []
         for ex in exercises:
-            exercise_list.controls.append(
+            if ex.muscle_group != search_state["last_group"]:
+                search_state["last_group"] = ex.muscle_group
+                controls.append(ft.Text(ex.muscle_group, size=20, weight=ft.FontWeight.BOLD))
+            controls.append(
                 ft.ListTile(
-                    title=ft.Text(ex['name']),
-                    data=ex['master_exercise_id'],
+                    title=ft.Text(ex.name),
+                    data=ex.master_exercise_id,
                     on_click=select_exercise,
                 )
             )
+        return controls
+
+    async def load_page(reset):
+        """
+        Busca a próxima página (ou a primeira, se `reset`) e a anexa à lista.
+        Resultados de uma busca que já foi substituída por outra são descartados.
+        """
+        if reset:
+            search_state["generation"] += 1
+            search_state["offset"] = 0
+            search_state["last_group"] = None
+        elif search_state["loading"]:
+            return
+        search_state["loading"] = True
+        generation = search_state["generation"]
+
+        # Pede um item a mais só para saber se ainda há outra página
+        try:
+            results = await search_master_exercises(search_state["query"], PAGE_SIZE + 1, search_state["offset"])
+        finally:
+            # Também se a busca falhar, para o "Carregar mais" não ficar travado;
+            # a de uma busca já substituída é da busca nova, que ainda carrega
+            if generation == search_state["generation"]:
+                search_state["loading"] = False
+        if generation != search_state["generation"]:
+            return
+
+        has_more = len(results) > PAGE_SIZE
+        results = results[:PAGE_SIZE]
+        search_state["offset"] += len(results)
+
+        if reset:
+            exercise_list.controls.clear()
+        else:
+            exercise_list.controls.remove(load_more_button)
+        exercise_list.controls.extend(build_page_controls(results))
+        if has_more:
+            exercise_list.controls.append(load_more_button)
+        elif reset and not results:
+            exercise_list.controls.append(ft.Text("Nenhum exercício encontrado."))
+
+    async def on_search_change(e):
+        search_state["query"] = e.control.value or ""
+        await load_page(reset=True)
+        exercise_list.update()
+
+    async def load_more(e):
+        await load_page(reset=False)
+        exercise_list.update()
+
+    # --- Layout da Tela ---
+    search_field = ft.TextField(
+        label="Buscar exercício ou grupo muscular",
+        prefix_icon="search",
+        on_change=on_search_change,
+        autofocus=True,
+    )
+    load_more_button = ft.TextButton("Carregar mais", on_click=load_more)
+    exercise_list = ft.ListView(expand=True, spacing=10)
+
+    # Renderiza só a primeira página; as demais sob demanda
+    await load_page(reset=True)
 
     return ft.View(
         "/pick-exercise",
@@ -72,6 +127,7 @@ def ExercisePickerScreen(page: ft.Page):
                 title=ft.Text("Selecione um Exercício"),
                 leading=ft.IconButton("arrow_back", on_click=go_back),
             ),
+            search_field,
             exercise_list
         ]
     )
@@ -1,7 +1,8 @@
 import flet as ft
-from database import get_user_by_id, get_user_workouts
+from async_database import get_home_payload
+from session_tokens import revoke_token_async, SESSION_TOKEN_KEY
 
-def HomeScreen(page: ft.Page):
+async def HomeScreen(page: ft.Page):
     """
     Cria a tela principal (Fichas de Treino) que o usuário vê após o login.
     """
@@ -10,25 +11,30 @@ def HomeScreen(page: ft.Page):
         page.go("/")
         return ft.View()
 
-    user_data = get_user_by_id(user_id)
-    username = user_data['username'] if user_data else "Usuário"
+    # Nome do usuário, fichas e contagem de exercícios em uma única consulta
+    home_data = await get_home_payload(user_id)
+    username = home_data['username'] if home_data else "Usuário"
 
     def navigate_to_workout(e):
         """Navega para a tela de treino específica."""
         user_workout_id = e.control.data
         page.go(f"/workout/{user_workout_id}")
 
-    def logout_clicked(e):
+    async def logout_clicked(e):
+        token = page.session.get("session_token")
+        if token:
+            await revoke_token_async(token)
+        page.client_storage.remove(SESSION_TOKEN_KEY)
         page.session.clear()
         page.go("/")
 
     # --- Layout da Tela ---
     workout_buttons = []
-    user_workouts = get_user_workouts(user_id)
+    user_workouts = home_data['workouts'] if home_data else ()
     for workout in user_workouts:
         workout_buttons.append(
             ft.ElevatedButton(
-                text=workout['title'],
+                text=f"{workout['title']} ({workout['exercise_count']} exercícios)",
                 on_click=navigate_to_workout,
                 data=workout['user_workout_id'],
                 width=300
@@ -43,6 +49,7 @@ def HomeScreen(page: ft.Page):
                     ft.Text("Fichas de Treino", size=30, weight=ft.FontWeight.BOLD),
                     ft.Text(f"Bem-vindo, {username}!", size=18),
                 ] + workout_buttons + [
+                    ft.OutlinedButton("Progresso", icon="insights", on_click=lambda e: page.go("/progress"), width=300),
                     ft.TextButton("Sair", on_click=logout_clicked)
                 ],
                 alignment=ft.MainAxisAlignment.CENTER,
@@ -1,5 +1,6 @@
 import flet as ft
-from database import verify_user
+from auth import login
+from session_tokens import issue_token_async, SESSION_TOKEN_KEY
 
 def LoginScreen(page: ft.Page):
     """
@@ -10,7 +11,7 @@ def LoginScreen(page: ft.Page):
     password_field = ft.TextField(label="Senha", password=True, width=300)
     error_text = ft.Text(value="", color="red")
 
-    def login_clicked(e):
+    async def login_clicked(e):
         """Função chamada ao clicar no botão de login."""
         identifier = identifier_field.value.strip()
         password = password_field.value
@@ -20,11 +21,15 @@ def LoginScreen(page: ft.Page):
             page.update()
             return
 
-        user_id = verify_user(identifier, password)
+        user_id = await login(identifier, password)
 
         if user_id:
-            # Limpa a tela e armazena o user_id na sessão
+            # Emite o token de sessão; as rotas protegidas validam por ele
+            token = await issue_token_async(user_id)
+            page.session.set("session_token", token)
             page.session.set("user_id", user_id)
+            page.client_storage.set(SESSION_TOKEN_KEY, token)
+            # Limpa a tela
             error_text.value = ""
             identifier_field.value = ""
             password_field.value = ""
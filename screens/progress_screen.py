@@ -0,0 +1,97 @@
+import flet as ft
+from datetime import datetime, timedelta, timezone
+from async_database import get_weekly_muscle_volume, get_exercise_best_sets, get_planned_sets_by_muscle_group
+from database import iso_week
+
+# Quantas semanas de volume são exibidas
+WEEKS_SHOWN = 8
+
+async def ProgressScreen(page: ft.Page):
+    """
+    Tela de progresso: volume semanal por grupo muscular, melhores séries e
+    séries planejadas nas fichas. Lê apenas agregados (os mantidos por
+    log_workout_sets e a soma das colunas interpretadas das fichas), nunca o
+    histórico completo.
+    """
+    user_id = page.session.get("user_id")
+
+    today = datetime.now(timezone.utc)
+    first_week = iso_week(today - timedelta(weeks=WEEKS_SHOWN - 1))
+    weekly_volume = await get_weekly_muscle_volume(user_id, first_week, iso_week(today))
+    best_sets = await get_exercise_best_sets(user_id)
+    planned_sets = await get_planned_sets_by_muscle_group(user_id)
+
+    def go_back(e):
+        page.go("/home")
+
+    # --- Volume semanal (semana mais recente primeiro) ---
+    volume_table = ft.DataTable(
+        columns=[
+            ft.DataColumn(ft.Text("Semana")),
+            ft.DataColumn(ft.Text("Grupo")),
+            ft.DataColumn(ft.Text("Séries"), numeric=True),
+            ft.DataColumn(ft.Text("Volume (kg)"), numeric=True),
+        ],
+        rows=[
+            ft.DataRow(cells=[
+                ft.DataCell(ft.Text(row['iso_week'])),
+                ft.DataCell(ft.Text(row['muscle_group'])),
+                ft.DataCell(ft.Text(str(row['sets']))),
+                ft.DataCell(ft.Text(f"{row['volume_kg']:.0f}")),
+            ])
+            for row in reversed(weekly_volume)
+        ],
+        column_spacing=20,
+    )
+
+    # --- Melhores séries ---
+    best_set_tiles = [
+        ft.ListTile(
+            title=ft.Text(row['name']),
+            subtitle=ft.Text(f"{row['reps']} x {row['load_kg']:g} kg (1RM estimado: {row['estimated_1rm']:.1f} kg)"),
+        )
+        for row in best_sets
+    ]
+
+    # --- Séries planejadas nas fichas ---
+    planned_table = ft.DataTable(
+        columns=[
+            ft.DataColumn(ft.Text("Grupo")),
+            ft.DataColumn(ft.Text("Séries"), numeric=True),
+            ft.DataColumn(ft.Text("Exercícios"), numeric=True),
+        ],
+        rows=[
+            ft.DataRow(cells=[
+                ft.DataCell(ft.Text(row['muscle_group'])),
+                ft.DataCell(ft.Text(str(row['planned_sets'] or 0))),
+                ft.DataCell(ft.Text(str(row['exercises']))),
+            ])
+            for row in planned_sets
+        ],
+        column_spacing=20,
+    )
+
+    if not weekly_volume and not best_sets:
+        content = [ft.Text("Nenhuma série registrada ainda.")]
+    else:
+        content = [
+            ft.Text("Volume semanal", size=20, weight=ft.FontWeight.BOLD),
+            volume_table,
+            ft.Text("Melhores séries", size=20, weight=ft.FontWeight.BOLD),
+        ] + best_set_tiles
+    if planned_sets:
+        content += [
+            ft.Text("Séries planejadas nas fichas", size=20, weight=ft.FontWeight.BOLD),
+            planned_table,
+        ]
+
+    return ft.View(
+        "/progress",
+        [
+            ft.AppBar(
+                title=ft.Text("Progresso"),
+                leading=ft.IconButton("arrow_back", on_click=go_back),
+            ),
+            ft.ListView(controls=content, expand=True, spacing=10),
+        ]
+    )
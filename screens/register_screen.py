@@ -1,5 +1,5 @@
 import flet as ft
-from database import add_user
+from auth import register
 
 def RegisterScreen(page: ft.Page):
     """
@@ -11,7 +11,7 @@ def RegisterScreen(page: ft.Page):
     password_field = ft.TextField(label="Senha", password=True, width=300)
     error_text = ft.Text(value="", color="red")
 
-    def register_clicked(e):
+    async def register_clicked(e):
         """Função chamada ao clicar no botão de registrar."""
         username = username_field.value.strip()
         email = email_field.value.strip()
@@ -22,7 +22,7 @@ def RegisterScreen(page: ft.Page):
             page.update()
             return
 
-        success = add_user(username, email, password)
+        success = await register(username, email, password)
 
         if success:
             # Limpa os campos e redireciona para o login
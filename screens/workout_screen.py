@@ -1,177 +1,255 @@
 import flet as ft
-from database import get_user_workout_details, get_user_workout_by_id, update_workout
-from copy import deepcopy
+from async_database import get_user_workout_details, get_user_workout_by_id, update_workout
+from workout_edit_state import WorkoutEditState
+from view_cache import invalidate
 
-def WorkoutScreen(page: ft.Page, user_workout_id: int):
+async def WorkoutScreen(page: ft.Page, user_workout_id: int):
     """
     Tela que exibe e permite a edição de uma ficha de treino específica do usuário.
     """
     page.session.set("current_workout_id", user_workout_id)
 
+    # Ficha gravada no banco: carregada uma vez e recarregada só depois de salvar
+    saved_workout = {"loaded": False, "title": "", "exercises": []}
+
+    async def load_saved_workout():
+        workout_data = await get_user_workout_by_id(user_workout_id)
+        saved_workout["title"] = workout_data['title'] if workout_data else "Treino"
+        saved_workout["exercises"] = await get_user_workout_details(user_workout_id)
+        saved_workout["loaded"] = True
+
     # --- Funções de manipulação de dados e navegação ---
 
-    def go_back(e):
-        """Volta para a tela principal, limpando o estado de edição."""
+    def end_edit_mode():
         page.session.set("edit_mode", False)
         if page.session.get("workout_in_edit"):
             page.session.remove("workout_in_edit")
-        page.go("/home")
 
-    def save_changes(e):
-        """Salva as alterações e desativa o modo de edição."""
-        if page.session.get("workout_in_edit"):
-            edited_data = page.session.get("workout_in_edit")
-            update_workout(user_workout_id, edited_data)
+    def go_back(e):
+        """Volta para a tela principal, limpando o estado de edição."""
+        end_edit_mode()
+        page.go("/home")
 
-        page.session.set("edit_mode", False)
+    async def save_changes(e):
+        """
+        Salva as alterações e desativa o modo de edição. Na primeira edição de
+        uma ficha que ainda aponta para o modelo, update_workout grava a cópia
+        própria dos exercícios. Se a gravação falhar, continua no modo de edição.
+        """
         if page.session.get("workout_in_edit"):
-            page.session.remove("workout_in_edit")
-        rebuild_view_controls()
-
-    def cancel_changes(e):
+            state = page.session.get("workout_in_edit")
+            if not await update_workout(user_workout_id, state.to_workout_data()):
+                page.snack_bar = ft.SnackBar(ft.Text("Não foi possível salvar o treino."), open=True)
+                page.update()
+                return
+            await load_saved_workout()
+            # Título e contagem de exercícios na tela principal, séries planejadas no progresso
+            invalidate(page, "/home", "/progress")
+
+        end_edit_mode()
+        render()
+        view.update()
+
+    async def cancel_changes(e):
         """Cancela as alterações e desativa o modo de edição."""
-        page.session.set("edit_mode", False)
-        if page.session.get("workout_in_edit"):
-            page.session.remove("workout_in_edit")
-        rebuild_view_controls()
+        end_edit_mode()
+        if not saved_workout["loaded"]:
+            await load_saved_workout()
+        render()
+        view.update()
 
     def on_title_change(e):
-        """Atualiza o título na cópia da sessão."""
+        """Atualiza o título no estado de edição."""
         if page.session.get("workout_in_edit"):
-            edited_data = page.session.get("workout_in_edit")
-            edited_data["details"]['title'] = e.control.value
-            page.session.set("workout_in_edit", edited_data)
+            page.session.get("workout_in_edit").set_title(e.control.value)
+            refresh_history_buttons()
+
+    def undo_clicked(e):
+        """Desfaz a última alteração."""
+        if edit_state().undo():
+            render()
+            view.update()
+
+    def redo_clicked(e):
+        """Refaz a última alteração desfeita."""
+        if edit_state().redo():
+            render()
+            view.update()
 
     def toggle_edit_mode(e):
         """Ativa o modo de edição e atualiza a UI."""
         if not page.session.get("edit_mode"):
             page.session.set("edit_mode", True)
 
-            details_row = get_user_workout_by_id(user_workout_id)
-            details_dict = dict(details_row) if details_row else {}
-            exercises_rows = get_user_workout_details(user_workout_id)
-            exercises_list = [dict(row) for row in exercises_rows]
-
-            workout_copy = {"details": details_dict, "exercises": exercises_list}
-            page.session.set("workout_in_edit", deepcopy(workout_copy))
-
-            rebuild_view_controls()
+            # O estado parte da ficha já carregada; não é preciso consultar o banco de novo
+            page.session.set("workout_in_edit", WorkoutEditState.from_rows(
+                user_workout_id, saved_workout["title"], saved_workout["exercises"]
+            ))
+
+            render()
+            view.update()
+
+    # --- Handlers das linhas (modo de edição) ---
+    # O estado de edição acha cada exercício pelo id; na tabela só as linhas
+    # afetadas são trocadas ou removidas.
+
+    def edit_state():
+        return page.session.get("workout_in_edit")
+
+    def refresh_history_buttons():
+        state = edit_state()
+        undo_button.disabled = not state.can_undo
+        redo_button.disabled = not state.can_redo
+        undo_button.update()
+        redo_button.update()
+
+    def create_series_change_handler(user_exercise_id):
+        def on_series_change(e):
+            if edit_state().set_series(user_exercise_id, e.control.value):
+                row_controls[user_exercise_id].data = (edit_state().get(user_exercise_id).master_exercise_id, e.control.value)
+                refresh_history_buttons()
+            e.control.border_color = "green"
+            e.control.update()
+        return on_series_change
+
+    def create_move_handler(user_exercise_id, direction):
+        def move_exercise(e):
+            neighbor_id = edit_state().move_exercise(user_exercise_id, direction)
+            if neighbor_id is not None:
+                rows = exercise_table.rows
+                idx = rows.index(row_controls[user_exercise_id])
+                new_idx = idx + direction
+                rows[idx], rows[new_idx] = rows[new_idx], rows[idx]
+                exercise_table.update()
+                refresh_history_buttons()
+        return move_exercise
+
+    def create_remove_handler(user_exercise_id):
+        def remove_exercise(e):
+            if edit_state().remove_exercise(user_exercise_id):
+                exercise_table.rows.remove(row_controls.pop(user_exercise_id))
+                exercise_table.update()
+                refresh_history_buttons()
+        return remove_exercise
 
     # --- Controles da UI (definidos uma vez para serem atualizados) ---
-    title_control = ft.Text()
     app_bar = ft.AppBar(
-        title=title_control,
+        title=ft.Text(),
         leading=ft.IconButton("arrow_back", on_click=go_back),
         actions=[]
     )
+    edit_actions = [ft.IconButton("edit", on_click=toggle_edit_mode)]
+    undo_button = ft.IconButton("undo", on_click=undo_clicked, disabled=True)
+    redo_button = ft.IconButton("redo", on_click=redo_clicked, disabled=True)
+    save_actions = [
+        undo_button,
+        redo_button,
+        ft.IconButton("save", on_click=save_changes, icon_color="green"),
+        ft.IconButton("cancel", on_click=cancel_changes),
+    ]
+    add_button = ft.ElevatedButton("Adicionar Exercício", icon="add", on_click=lambda e: page.go("/pick-exercise"))
+    exercise_table = ft.DataTable(
+        columns=[
+            ft.DataColumn(ft.Text("Exercício")),
+            ft.DataColumn(ft.Text("Séries"), numeric=True),
+        ],
+        rows=[],
+        column_spacing=20,
+        expand=True,
+    )
     main_content = ft.Column(controls=[], expand=True)
 
-    # --- Função principal para construir e atualizar a UI ---
-
-    def rebuild_view_controls():
-        """Reconstrói os controles da view com base no estado atual."""
-        is_editing = page.session.get("edit_mode") or False
+    # DataRow já exibido de cada exercício, por user_exercise_id
+    row_controls = {}
+    rows_state = {"editing": None}
 
-        def build_exercise_datatable():
-            exercises_data = []
-            if is_editing and page.session.get("workout_in_edit"):
-                exercises_data = page.session.get("workout_in_edit")["exercises"]
-            elif not is_editing:
-                exercises_data = get_user_workout_details(user_workout_id)
-
-            rows = []
-            for ex in exercises_data:
-                def create_series_change_handler(user_exercise_id):
-                    def on_series_change(e):
-                        edited_exercises = page.session.get("workout_in_edit")["exercises"]
-                        for item in edited_exercises:
-                            if item['user_exercise_id'] == user_exercise_id:
-                                item['series'] = e.control.value
-                                break
-                        page.session.set("workout_in_edit", page.session.get("workout_in_edit"))
-                        e.control.border_color = "green"
-                        page.update()
-                    return on_series_change
-
-                series_control = ft.TextField(
-                    value=str(ex['series']),
-                    on_submit=create_series_change_handler(ex['user_exercise_id']),
-                    width=150
-                ) if is_editing else ft.Text(ex['series'])
-
-                action_buttons = []
-                if is_editing:
-                    def create_move_handler(user_exercise_id, direction):
-                        def move_exercise(e):
-                            data = page.session.get("workout_in_edit")
-                            exercises = data["exercises"]
-                            idx = next((i for i, item in enumerate(exercises) if item['user_exercise_id'] == user_exercise_id), -1)
-                            if idx != -1:
-                                new_idx = idx + direction
-                                if 0 <= new_idx < len(exercises):
-                                    exercises.insert(new_idx, exercises.pop(idx))
-                                    page.session.set("workout_in_edit", data)
-                                    rebuild_view_controls()
-                        return move_exercise
-
-                    def create_remove_handler(user_exercise_id):
-                        def remove_exercise(e):
-                            data = page.session.get("workout_in_edit")
-                            data["exercises"] = [item for item in data["exercises"] if item['user_exercise_id'] != user_exercise_id]
-                            page.session.set("workout_in_edit", data)
-                            rebuild_view_controls()
-                        return remove_exercise
-
-                    action_buttons = [
-                        ft.IconButton("arrow_upward", on_click=create_move_handler(ex['user_exercise_id'], -1)),
-                        ft.IconButton("arrow_downward", on_click=create_move_handler(ex['user_exercise_id'], 1)),
-                        ft.IconButton("delete", on_click=create_remove_handler(ex['user_exercise_id']), icon_color="red"),
-                    ]
-
-                rows.append(ft.DataRow(cells=[
-                    ft.DataCell(ft.Row([ft.Text(ex['name'], expand=True)] + action_buttons)),
-                    ft.DataCell(series_control),
-                ]))
-
-            return ft.DataTable(
-                columns=[
-                    ft.DataColumn(ft.Text("Exercício")),
-                    ft.DataColumn(ft.Text("Séries"), numeric=True),
-                ],
-                rows=rows,
-                column_spacing=20,
-                expand=True,
-            )
-
-        # Atualiza o título e as ações
+    def build_row(ex, is_editing):
+        user_exercise_id = ex['user_exercise_id']
         if is_editing:
-            workout_title = page.session.get("workout_in_edit")["details"].get('title', '')
-            app_bar.title = ft.TextField(value=workout_title, on_change=on_title_change)
-            app_bar.actions = [
-                ft.IconButton("save", on_click=save_changes, icon_color="green"),
-                ft.IconButton("cancel", on_click=cancel_changes),
+            series_control = ft.TextField(
+                value=str(ex['series']),
+                on_submit=create_series_change_handler(user_exercise_id),
+                width=150
+            )
+            action_buttons = [
+                ft.IconButton("arrow_upward", on_click=create_move_handler(user_exercise_id, -1)),
+                ft.IconButton("arrow_downward", on_click=create_move_handler(user_exercise_id, 1)),
+                ft.IconButton("delete", on_click=create_remove_handler(user_exercise_id), icon_color="red"),
             ]
         else:
-            workout_data = get_user_workout_by_id(user_workout_id)
-            app_bar.title = ft.Text(workout_data['title'] if workout_data else "Treino")
-            app_bar.actions = [ft.IconButton("edit", on_click=toggle_edit_mode)]
-
-        # Limpa e reconstrói o conteúdo principal
-        main_content.controls.clear()
-        main_content.controls.append(build_exercise_datatable())
+            series_control = ft.Text(ex['series'])
+            action_buttons = []
+
+        return ft.DataRow(
+            cells=[
+                ft.DataCell(ft.Row([ft.Text(ex['name'], expand=True)] + action_buttons)),
+                ft.DataCell(series_control),
+            ],
+            data=(ex['master_exercise_id'], ex['series']),
+        )
+
+    def row_key(ex, position):
+        # Ficha ainda no modelo: exercícios sem user_exercise_id, identificados pela posição
+        user_exercise_id = ex['user_exercise_id']
+        return ("modelo", position) if user_exercise_id is None else user_exercise_id
+
+    def sync_exercise_rows(exercises, is_editing):
+        """Reconciliação por chave: reaproveita a linha de cada exercício que não mudou."""
+        if rows_state["editing"] != is_editing:
+            row_controls.clear()
+            rows_state["editing"] = is_editing
+
+        rows = []
+        current_keys = set()
+        for position, ex in enumerate(exercises):
+            key = row_key(ex, position)
+            current_keys.add(key)
+            row = row_controls.get(key)
+            if row is None or row.data != (ex['master_exercise_id'], ex['series']):
+                row = row_controls[key] = build_row(ex, is_editing)
+            rows.append(row)
+
+        for key in [key for key in row_controls if key not in current_keys]:
+            del row_controls[key]
+        exercise_table.rows = rows
+
+    def render():
+        """Ajusta a barra e a tabela ao modo atual (visualização ou edição)."""
+        is_editing = page.session.get("edit_mode") or False
         if is_editing:
-            main_content.controls.append(
-                ft.ElevatedButton("Adicionar Exercício", icon="add", on_click=lambda e: page.go("/pick-exercise"))
-            )
-
-        page.update()
+            state = edit_state()
+            app_bar.title = ft.TextField(value=state.title, on_change=on_title_change)
+            app_bar.actions = save_actions
+            undo_button.disabled = not state.can_undo
+            redo_button.disabled = not state.can_redo
+            sync_exercise_rows(list(state), True)
+            main_content.controls = [exercise_table, add_button]
+        else:
+            app_bar.title = ft.Text(saved_workout["title"])
+            app_bar.actions = edit_actions
+            sync_exercise_rows(saved_workout["exercises"], False)
+            main_content.controls = [exercise_table]
+
+    async def refresh():
+        """
+        Reexibição a partir do cache de views (ex.: ao voltar do seletor de
+        exercícios): redesenha a partir do estado de edição, sem consultar o banco.
+        """
+        page.session.set("current_workout_id", user_workout_id)
+        if not page.session.get("edit_mode") and not saved_workout["loaded"]:
+            await load_saved_workout()
+        render()
 
     # --- Construção Inicial da View ---
-    rebuild_view_controls()
+    if not page.session.get("edit_mode"):
+        await load_saved_workout()
+    render()
 
-    return ft.View(
+    view = ft.View(
         f"/workout/{user_workout_id}",
         controls=[main_content],
         appbar=app_bar,
-        horizontal_alignment=ft.CrossAxisAlignment.CENTER
+        horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+        data=refresh,
     )
+    return view
@@ -0,0 +1,58 @@
+"""
+Interpretação da prescrição de séries das fichas (user_exercises.series).
+
+A coluna `series` continua sendo o texto livre exibido e editado pelo aluno
+("4x8-10", "3x10-12 (por perna)", "4x10-12 (ou falha)"); parse_series extrai
+dele os valores numéricos gravados ao lado, nas colunas sets, rep_min, rep_max
+e series_modifiers, para que contas sobre as fichas sejam feitas em SQL.
+
+Formatos aceitos: "<séries>x<reps>" ou "<séries>x<mín>-<máx>" (também com
+"×", "X", espaços e "a" no lugar do hífen: "3 x 8 a 12"), seguidos de um
+complemento opcional, entre parênteses ou não, que vira o modificador. Textos
+fora desse formato ficam com os campos numéricos em None e o texto inteiro no
+modificador.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+ParsedSeries = namedtuple("ParsedSeries", ["sets", "rep_min", "rep_max", "modifiers"])
+
+_SERIES_PATTERN = re.compile(
+    r"""^\s*
+    (?P<sets>\d+)\s*[x×]\s*
+    (?P<first>\d+)
+    (?:\s*(?:-|–|a|até)\s*(?P<second>\d+))?
+    (?P<rest>.*)$""",
+    re.IGNORECASE | re.VERBOSE,
+)
+
+
+def _clean_modifiers(text):
+    text = text.strip()
+    if text.startswith("(") and text.endswith(")"):
+        text = text[1:-1].strip()
+    return text or None
+
+
+@lru_cache(maxsize=1024)
+def parse_series(series):
+    """
+    Interpreta uma prescrição de séries. Retorna ParsedSeries(sets, rep_min,
+    rep_max, modifiers); campos que não puderem ser lidos ficam None.
+
+    >>> parse_series("3x10-12 (por perna)")
+    ParsedSeries(sets=3, rep_min=10, rep_max=12, modifiers='por perna')
+    """
+    if not series:
+        return ParsedSeries(None, None, None, None)
+
+    match = _SERIES_PATTERN.match(series)
+    if not match:
+        return ParsedSeries(None, None, None, _clean_modifiers(series))
+
+    first = int(match.group("first"))
+    second = int(match.group("second")) if match.group("second") else first
+    return ParsedSeries(
+        int(match.group("sets")), min(first, second), max(first, second), _clean_modifiers(match.group("rest")),
+    )
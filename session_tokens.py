@@ -0,0 +1,197 @@
+"""
+Tokens de sessão persistidos em `user_tokens`.
+
+O token entregue ao cliente é aleatório; no banco fica só o seu SHA-256. As
+validações passam por um cache LRU com TTL em memória, de modo que navegações
+repetidas da mesma sessão não consultam o SQLite. Revogar um token remove a
+entrada do cache deste processo na hora; outros processos deixam de aceitá-lo
+quando a entrada deles expira (no máximo CACHE_TTL_SECONDS).
+
+Os tokens expirados são apagados do banco em lotes (purge_expired_tokens), no
+máximo uma vez a cada PURGE_INTERVAL_SECONDS, pela primeira emissão de token
+depois desse intervalo.
+"""
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import async_database
+import database
+
+TOKEN_TYPE = "session"
+# Chave do token de sessão no armazenamento do cliente (sobrevive a reconexões)
+SESSION_TOKEN_KEY = "champs.session_token"
+SESSION_TTL = timedelta(days=int(os.environ.get("CHAMPS_SESSION_TTL_DAYS", "30")))
+CACHE_SIZE = int(os.environ.get("CHAMPS_TOKEN_CACHE_SIZE", "10000"))
+CACHE_TTL_SECONDS = float(os.environ.get("CHAMPS_TOKEN_CACHE_TTL", "60"))
+PURGE_INTERVAL_SECONDS = float(os.environ.get("CHAMPS_TOKEN_PURGE_INTERVAL", "3600"))
+
+# Formato de CURRENT_TIMESTAMP do SQLite, para comparar com expires_at como texto
+_DB_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _db_time(moment):
+    return moment.strftime(_DB_TIME_FORMAT)
+
+
+def hash_token(token):
+    """Hash gravado no banco para um token (tokens já têm 256 bits de entropia)."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """Cache LRU com TTL de token_hash -> user_id, seguro para várias threads."""
+
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token_hash -> (user_id, válido até, em epoch)
+        self._lock = threading.Lock()
+        # Muda a cada revogação; uma consulta ao banco que começou antes dela não
+        # pode devolver ao cache um token que acabou de ser revogado
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token_hash):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[token_hash]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token_hash)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token_hash, user_id, expires_at, generation=None):
+        """Guarda o token; com `generation`, só se nenhuma revogação aconteceu desde então."""
+        # A entrada vence no TTL do cache ou na expiração do token, o que vier antes
+        valid_until = min(time.time() + self.ttl, expires_at.replace(tzinfo=timezone.utc).timestamp())
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[token_hash] = (user_id, valid_until)
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, token_hash):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(token_hash, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = TokenCache()
+
+_purge_lock = threading.Lock()
+_last_purge = None  # time.monotonic() da última limpeza dos tokens expirados
+
+
+def get_cache_stats():
+    """Tamanho do cache e contagem de acertos/falhas."""
+    return {"size": len(_cache._entries), "hits": _cache.hits, "misses": _cache.misses}
+
+
+# --- API síncrona ---
+
+def issue_token(user_id, ttl=None):
+    """Emite um novo token de sessão para o usuário e o retorna (em texto puro)."""
+    token = secrets.token_urlsafe(32)
+    token_hash = hash_token(token)
+    expires_at = _utcnow() + (ttl or SESSION_TTL)
+    database.add_user_token(user_id, token_hash, TOKEN_TYPE, _db_time(expires_at))
+    _cache.put(token_hash, user_id, expires_at)
+    _purge_if_due()
+    return token
+
+
+def _purge_if_due():
+    """Roda purge_expired_tokens se a última limpeza foi há mais de PURGE_INTERVAL_SECONDS."""
+    global _last_purge
+    if not _purge_lock.acquire(blocking=False):
+        return  # outra thread já está limpando
+    try:
+        now = time.monotonic()
+        if _last_purge is not None and now - _last_purge < PURGE_INTERVAL_SECONDS:
+            return
+        _last_purge = now
+        purge_expired_tokens()
+    finally:
+        _purge_lock.release()
+
+
+def _lookup(token_hash):
+    generation = _cache.generation
+    row = database.get_user_token(token_hash, TOKEN_TYPE, _db_time(_utcnow()))
+    if not row:
+        return None
+    _cache.put(token_hash, row['user_id'], datetime.strptime(row['expires_at'], _DB_TIME_FORMAT), generation)
+    return row['user_id']
+
+
+def validate_token(token):
+    """Retorna o user_id dono do token, ou None se ele for inválido, expirado ou revogado."""
+    if not token:
+        return None
+    token_hash = hash_token(token)
+    user_id = _cache.get(token_hash)
+    if user_id is not None:
+        return user_id
+    return _lookup(token_hash)
+
+
+def revoke_token(token):
+    """Revoga um token (ex.: logout)."""
+    token_hash = hash_token(token)
+    # Primeiro o banco: uma validação concorrente ainda pode ler a linha e
+    # recolocá-la no cache antes do discard, mas não depois dele
+    deleted = database.delete_user_token(token_hash)
+    _cache.discard(token_hash)
+    return deleted
+
+
+def revoke_user_tokens(user_id):
+    """Revoga todas as sessões de um usuário (ex.: troca de senha)."""
+    for token_hash in database.delete_user_tokens(user_id, TOKEN_TYPE):
+        _cache.discard(token_hash)
+
+
+def purge_expired_tokens(batch_size=500):
+    """Apaga do banco, em lotes, os tokens já expirados. Retorna quantos foram apagados."""
+    return database.purge_expired_user_tokens(_db_time(_utcnow()), batch_size)
+
+
+# --- API assíncrona (handlers do Flet) ---
+
+async def issue_token_async(user_id, ttl=None):
+    return await async_database.run(issue_token, user_id, ttl)
+
+
+async def validate_token_async(token):
+    """Como validate_token, mas só vai ao executor do banco quando o cache falha."""
+    if not token:
+        return None
+    token_hash = hash_token(token)
+    user_id = _cache.get(token_hash)
+    if user_id is not None:
+        return user_id
+    return await async_database.run(_lookup, token_hash)
+
+
+async def revoke_token_async(token):
+    return await async_database.run(revoke_token, token)
@@ -0,0 +1,78 @@
+"""
+Perfil da inicialização do app, ligado com CHAMPS_STARTUP_PROFILE=1.
+
+Mede as fases até o primeiro quadro: importação dos módulos de main.py,
+verificação do schema (init_db, em segundo plano), espera do Flet até a primeira
+sessão, carga de cada tela na primeira vez em que ela é aberta e a montagem da
+primeira rota. Ao fim da primeira renderização imprime uma tabela com o início
+(desde a importação deste módulo, o primeiro de main.py) e a duração de cada
+fase; fases que terminam depois disso (ex.: a carga de uma tela aberta mais
+tarde) são impressas uma a uma.
+
+Para detalhar a importação módulo a módulo, use também `python -X importtime`.
+Desligado, cada chamada custa só a checagem de ENABLED.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+ENABLED = os.environ.get("CHAMPS_STARTUP_PROFILE", "") not in ("", "0")
+
+_origin = time.perf_counter()
+_lock = threading.Lock()
+# (fase, início em segundos desde _origin, duração em segundos)
+_phases = []
+_reported = False
+
+
+def _print_phase(name, start, duration):
+    print(f"{name:<36} {start * 1000:>10.1f} {duration * 1000:>10.1f}")
+
+
+def record(name, started=None, ended=None):
+    """
+    Registra uma fase que começou em `started` (time.perf_counter; por padrão o
+    início da medição) e terminou em `ended` (por padrão, agora).
+    """
+    if not ENABLED:
+        return
+    started = _origin if started is None else started
+    ended = time.perf_counter() if ended is None else ended
+    with _lock:
+        _phases.append((name, started - _origin, ended - started))
+        if _reported:
+            _print_phase(name, started - _origin, ended - started)
+
+
+@contextmanager
+def phase(name):
+    """Mede o bloco `with` como uma fase."""
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, started)
+
+
+def elapsed():
+    """Segundos desde o início da medição."""
+    return time.perf_counter() - _origin
+
+
+def report(title="primeiro quadro"):
+    """Imprime as fases registradas até agora; só a primeira chamada tem efeito."""
+    global _reported
+    if not ENABLED:
+        return
+    with _lock:
+        if _reported:
+            return
+        _reported = True
+        print(f"\nPerfil da inicialização ({title} em {elapsed() * 1000:.1f} ms)")
+        print(f"{'fase':<36} {'início ms':>10} {'duração ms':>10}")
+        for name, start, duration in sorted(_phases, key=lambda item: item[1]):
+            _print_phase(name, start, duration)
@@ -0,0 +1,188 @@
+"""
+Verificação de regressão dos planos de consulta do database.py.
+
+Executa as funções públicas do módulo contra um banco temporário, captura cada
+instrução SQL emitida (via trace callback do sqlite3) e roda EXPLAIN QUERY PLAN
+em todas elas. Falha se alguma consulta fizer varredura completa de tabela.
+
+Uso (a partir da raiz do repositório):
+    python -m tools.check_query_plans
+"""
+import inspect
+import os
+import sys
+import tempfile
+
+import database
+
+# Tabelas que podem ser lidas por inteiro de propósito (ex.: catálogo exibido
+# completo, fichas modelo carregadas no cache)
+FULL_SCAN_ALLOWED = {"master_exercises", "sqlite_master", "workout_templates", "template_exercises"}
+
+# Funções públicas que não executam consultas de dados
+NOT_QUERIES = {
+    "init_db", "get_db_connection", "get_pool", "configure_pool", "close_pool",
+    "get_pool_stats", "db_connection", "create_default_workouts_for_user",
+    "invalidate_master_exercise_cache", "diff_workout_exercises", "normalize_search_text",
+    "iso_week", "estimated_1rm", "normalize_identity",
+}
+
+# Tabelas internas do FTS5, lidas pelo próprio módulo ao abrir o índice
+FTS_SHADOW_SUFFIXES = ("_fts_config", "_fts_data", "_fts_idx", "_fts_docsize", "_fts_content")
+
+# Instruções sem plano de consulta relevante
+SKIPPED_PREFIXES = ("PRAGMA", "BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE", "--")
+
+
+def exercise_data_layer():
+    """Chama cada função pública com dados realistas; retorna os nomes chamados."""
+    called = set()
+
+    def call(func, *args):
+        called.add(func.__name__)
+        return func(*args)
+
+    call(database.add_user, "plan_check", "plan_check@example.com", "senha")
+    call(database.add_users_bulk, [("plan_bulk", "plan_bulk@example.com", "senha")])
+    call(database.identity_exists, "plan_check", "plan_check@example.com")
+    call(database.create_user, "plan_hashed", "plan_hashed@example.com", "hash", "salt")
+    user_id = call(database.verify_user, "plan_check", "senha")
+    credentials = call(database.get_user_credentials, "plan_check")
+    call(database.get_user_credentials, "Plan_Check@Example.com")
+    call(database.update_user_password_hash, user_id, credentials["password_hash"], credentials["salt"])
+    call(database.get_user_by_id, user_id)
+    call(database.add_user_token, user_id, "a" * 64, "session", "2999-01-01 00:00:00")
+    call(database.get_user_token, "a" * 64, "session", "2000-01-01 00:00:00")
+    call(database.add_user_token, user_id, "b" * 64, "session", "2000-01-01 00:00:00")
+    call(database.purge_expired_user_tokens, "2001-01-01 00:00:00", 100)
+    call(database.delete_user_token, "a" * 64)
+    call(database.delete_user_tokens, user_id, "session")
+    workouts = call(database.get_user_workouts, user_id)
+    call(database.get_home_payload, user_id)
+    call(database.ensure_default_workouts, user_id)
+    user_workout_id = workouts[0]["user_workout_id"]
+    call(database.get_user_workout_by_id, user_workout_id)
+    # Fichas novas apontam para os modelos: a leitura vem do cache e salvar sem
+    # mudar os exercícios não copia nada
+    template_details = call(database.get_user_workout_details, workouts[1]["user_workout_id"])
+    call(database.update_workout, workouts[1]["user_workout_id"], {
+        "details": {"title": "Só o Título"}, "exercises": [dict(row) for row in template_details],
+    })
+    catalog = call(database.get_all_master_exercises)
+    master_id = next(iter(catalog.values()))[0]["master_exercise_id"]
+    call(database.add_master_exercise, "Exercício de Verificação", "Peito")
+    call(database.search_master_exercises, "triceps pol")
+    # A primeira escrita copia o modelo para linhas próprias da ficha
+    call(database.add_exercise_to_workout, user_workout_id, master_id)
+    details = database.get_user_workout_details(user_workout_id)
+    user_exercise_id = details[0]["user_exercise_id"]
+    call(database.update_exercise_series, user_exercise_id, "5x5")
+    call(database.replace_exercise_in_workout, user_exercise_id, master_id)
+    # Duas vezes, para passar também pelo ramo ON CONFLICT dos agregados
+    for _ in range(2):
+        call(database.log_workout_sets, user_id, [
+            (details[-1]["user_exercise_id"], details[-1]["master_exercise_id"], 10, 40.0),
+            (None, master_id, 5, 80.0),
+        ])
+    call(database.get_weekly_muscle_volume, user_id, "2000-W01", "2999-W01")
+    call(database.get_exercise_best_sets, user_id)
+    call(database.get_planned_sets_by_muscle_group, user_id)
+    call(database.get_workout_set_columns, user_id, user_id + 100, "2000-01-01 00:00:00")
+    call(database.get_workout_set_user_range)
+    list(call(database.iter_member_export_rows, 1, 10))
+    call(database.import_members, [
+        ("plan_import", "plan_import@example.com", 1, None, "hash", "salt", [("Treino A", [(master_id, "3x10")])]),
+    ])
+    call(database.remove_exercise_from_workout, details[-1]["user_exercise_id"])
+    # Reordena, altera, remove e adiciona, para cobrir todas as escritas do diff
+    exercises = [dict(row) for row in database.get_user_workout_details(user_workout_id)][::-1]
+    exercises[0]["series"] = "3x12"
+    exercises.pop()
+    exercises.append({"user_exercise_id": -1, "master_exercise_id": master_id, "series": "3x10"})
+    edited = {"details": {"title": "Treino Editado"}, "exercises": exercises}
+    call(database.update_workout, user_workout_id, edited)
+    return called
+
+
+def explain(conn, statement):
+    """Retorna as linhas de detalhe do EXPLAIN QUERY PLAN de uma instrução."""
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + statement)]
+
+
+def full_scans(plan):
+    """Linhas do plano que varrem uma tabela inteira fora da lista permitida."""
+    offending = []
+    # Subconsultas (CO-ROUTINE/MATERIALIZE) são lidas por inteiro, mas já vêm filtradas
+    subqueries = {
+        detail.split()[1] for detail in plan if detail.startswith(("CO-ROUTINE ", "MATERIALIZE "))
+    }
+    for detail in plan:
+        # "SCAN CONSTANT ROW" é um SELECT sem FROM, não uma tabela
+        if not detail.startswith("SCAN ") or detail.startswith("SCAN CONSTANT ROW"):
+            continue
+        table = detail.split()[1]
+        if table in subqueries or table.endswith(FTS_SHADOW_SUFFIXES):
+            continue
+        # Tabelas virtuais (FTS5) são consultadas pelo próprio índice, não varridas
+        if table not in FULL_SCAN_ALLOWED and "VIRTUAL TABLE INDEX" not in detail:
+            offending.append(detail)
+    return offending
+
+
+def main():
+    statements = []
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "plan_check.db")
+        database.configure_pool(size=1)
+        database.init_db()
+
+        with database.db_connection() as conn:
+            conn.set_trace_callback(statements.append)
+
+        # Conexões abertas fora do pool (ex.: a da exportação) também são rastreadas
+        get_db_connection = database.get_db_connection
+
+        def traced_connection(db_file=None):
+            conn = get_db_connection(db_file)
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        database.get_db_connection = traced_connection
+        try:
+            called = exercise_data_layer()
+        finally:
+            database.get_db_connection = get_db_connection
+
+        public = {
+            name for name, func in inspect.getmembers(database, inspect.isfunction)
+            if func.__module__ == database.__name__ and not name.startswith("_")
+        }
+        not_covered = sorted(public - called - NOT_QUERIES)
+
+        failures = []
+        checked = set()
+        with database.db_connection() as conn:
+            conn.set_trace_callback(None)
+            for statement in statements:
+                statement = statement.strip()
+                if statement in checked or statement.upper().startswith(SKIPPED_PREFIXES):
+                    continue
+                checked.add(statement)
+                offending = full_scans(explain(conn, statement))
+                if offending:
+                    failures.append((statement, offending))
+        database.close_pool()
+
+    print(f"{len(checked)} consultas verificadas.")
+    for statement, offending in failures:
+        print(f"\nVARREDURA COMPLETA: {' '.join(statement.split())}")
+        for detail in offending:
+            print(f"    {detail}")
+    if not_covered:
+        print(f"\nFunções públicas sem cobertura nesta verificação: {', '.join(not_covered)}")
+
+    return 1 if failures or not_covered else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
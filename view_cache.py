@@ -0,0 +1,86 @@
+"""
+Cache, por sessão do Flet, das views já montadas, indexado pela rota.
+
+Voltar da busca de exercícios para a ficha, ou da ficha para a tela principal,
+reaproveita a view montada em vez de refazer as consultas e os controles. O
+cache é LRU (no máximo VIEW_CACHE_SIZE views por sessão), pertence ao usuário
+logado (outro login na mesma sessão começa do zero) e é invalidado
+explicitamente quando os dados de uma tela mudam, ex.: depois de salvar uma
+ficha, a contagem de exercícios da tela principal.
+
+Uma tela pode guardar em `view.data` uma função assíncrona sem argumentos; ela
+é chamada sempre que a view sai do cache, para ajustar a tela ao estado atual
+da sessão (ex.: o exercício escolhido no seletor) sem ir ao banco.
+"""
+import os
+from collections import OrderedDict
+
+VIEW_CACHE_SIZE = int(os.environ.get("CHAMPS_VIEW_CACHE_SIZE", "8"))
+
+# Chave da sessão do Flet onde fica o cache
+SESSION_KEY = "view_cache"
+
+
+class ViewCache:
+    """Cache LRU de rota -> ft.View de um usuário."""
+
+    def __init__(self, user_id, max_size=VIEW_CACHE_SIZE):
+        self.user_id = user_id
+        self.max_size = max_size
+        self._views = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, route):
+        view = self._views.get(route)
+        if view is None:
+            self.misses += 1
+            return None
+        self._views.move_to_end(route)
+        self.hits += 1
+        return view
+
+    def put(self, route, view):
+        self._views[route] = view
+        self._views.move_to_end(route)
+        while len(self._views) > self.max_size:
+            self._views.popitem(last=False)
+
+    def invalidate(self, *routes):
+        """Descarta as views das rotas indicadas (ou todas, sem argumentos)."""
+        if not routes:
+            self._views.clear()
+        for route in routes:
+            self._views.pop(route, None)
+
+
+def get_view_cache(page):
+    """Cache de views da sessão, recriado quando o usuário logado muda."""
+    user_id = page.session.get("user_id")
+    cache = page.session.get(SESSION_KEY)
+    if cache is None or cache.user_id != user_id:
+        cache = ViewCache(user_id)
+        page.session.set(SESSION_KEY, cache)
+    return cache
+
+
+def invalidate(page, *routes):
+    """Descarta views da sessão cujos dados mudaram (todas, sem rotas)."""
+    cache = page.session.get(SESSION_KEY)
+    if cache is not None:
+        cache.invalidate(*routes)
+
+
+async def cached_view(page, route, build):
+    """
+    Retorna a view da rota: a do cache, atualizada pela função em `view.data`,
+    ou uma nova, montada por `await build()` e guardada no cache.
+    """
+    cache = get_view_cache(page)
+    view = cache.get(route)
+    if view is None:
+        view = await build()
+        cache.put(route, view)
+    elif callable(view.data):
+        await view.data()
+    return view
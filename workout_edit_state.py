@@ -0,0 +1,257 @@
+"""
+Estado de edição de uma ficha de treino.
+
+Substitui a cópia em dicionários que ficava em page.session: os exercícios são
+indexados por id e encadeados em uma lista duplamente ligada, de modo que cada
+toque (alterar séries, mover, remover, adicionar) custa O(1). Toda alteração é
+registrada em um log de operações, que também serve para desfazer/refazer.
+"""
+from collections import deque
+
+# Quantas operações podem ser desfeitas
+MAX_UNDO = 200
+
+
+class EditedExercise:
+    """Um exercício da ficha em edição."""
+    __slots__ = ("user_exercise_id", "master_exercise_id", "name", "series")
+
+    def __init__(self, user_exercise_id, master_exercise_id, name, series):
+        self.user_exercise_id = user_exercise_id
+        self.master_exercise_id = master_exercise_id
+        self.name = name
+        self.series = series
+
+    def __getitem__(self, key):
+        # Permite ex['series'], como nas linhas vindas do banco
+        return getattr(self, key)
+
+    def as_dict(self):
+        return {
+            'user_exercise_id': self.user_exercise_id,
+            'master_exercise_id': self.master_exercise_id,
+            'name': self.name,
+            'series': self.series,
+        }
+
+
+class WorkoutEditState:
+    """
+    Ficha de treino em edição, com log de operações para desfazer/refazer.
+
+    Exercícios novos recebem ids temporários negativos de um contador próprio,
+    que nunca se repetem dentro da sessão de edição (mesmo após remoções).
+    """
+    __slots__ = (
+        "user_workout_id", "title", "_exercises", "_prev", "_next", "_head", "_tail",
+        "_undo", "_redo", "_next_temp_id",
+    )
+
+    def __init__(self, user_workout_id, title):
+        self.user_workout_id = user_workout_id
+        self.title = title
+        self._exercises = {}   # id -> EditedExercise
+        self._prev = {}        # id -> id anterior (None no início)
+        self._next = {}        # id -> próximo id (None no fim)
+        self._head = None
+        self._tail = None
+        self._undo = deque(maxlen=MAX_UNDO)
+        self._redo = []
+        self._next_temp_id = -1
+
+    @classmethod
+    def from_rows(cls, user_workout_id, title, rows):
+        """Cria o estado a partir das linhas de get_user_workout_details."""
+        state = cls(user_workout_id, title)
+        for row in rows:
+            user_exercise_id = row['user_exercise_id']
+            if user_exercise_id is None:
+                user_exercise_id = state._allocate_temp_id()
+            exercise = EditedExercise(user_exercise_id, row['master_exercise_id'], row['name'], row['series'])
+            state._link_after(state._tail, exercise)
+        return state
+
+    # --- Leitura ---
+
+    def __len__(self):
+        return len(self._exercises)
+
+    def __iter__(self):
+        """Percorre os exercícios na ordem atual."""
+        user_exercise_id = self._head
+        while user_exercise_id is not None:
+            yield self._exercises[user_exercise_id]
+            user_exercise_id = self._next[user_exercise_id]
+
+    def get(self, user_exercise_id):
+        return self._exercises.get(user_exercise_id)
+
+    @property
+    def can_undo(self):
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        return bool(self._redo)
+
+    def to_workout_data(self):
+        """Formato esperado por database.update_workout."""
+        return {
+            "details": {"title": self.title},
+            "exercises": [exercise.as_dict() for exercise in self],
+        }
+
+    # --- Operações de edição (registradas no log) ---
+
+    def set_title(self, title):
+        if title == self.title:
+            return
+        # Digitação contínua vira uma única operação no log
+        if self._undo and self._undo[-1][0] == "title" and not self._redo:
+            _, old, _ = self._undo.pop()
+        else:
+            old = self.title
+        self._record(("title", old, title))
+
+    def set_series(self, user_exercise_id, series):
+        exercise = self._exercises.get(user_exercise_id)
+        if exercise is None or exercise.series == series:
+            return False
+        self._record(("series", user_exercise_id, exercise.series, series))
+        return True
+
+    def replace_exercise(self, user_exercise_id, master_exercise_id, name):
+        exercise = self._exercises.get(user_exercise_id)
+        if exercise is None:
+            return False
+        self._record((
+            "replace", user_exercise_id,
+            (exercise.master_exercise_id, exercise.name), (master_exercise_id, name),
+        ))
+        return True
+
+    def add_exercise(self, master_exercise_id, name, series="3x10"):
+        """Adiciona um exercício ao final da ficha e o retorna."""
+        exercise = EditedExercise(self._allocate_temp_id(), master_exercise_id, name, series)
+        self._record(("add", exercise, self._tail))
+        return exercise
+
+    def remove_exercise(self, user_exercise_id):
+        exercise = self._exercises.get(user_exercise_id)
+        if exercise is None:
+            return False
+        self._record(("remove", exercise, self._prev[user_exercise_id]))
+        return True
+
+    def move_exercise(self, user_exercise_id, direction):
+        """
+        Troca o exercício de lugar com o vizinho (direction -1 sobe, +1 desce).
+        Retorna o id do vizinho trocado, ou None se já estiver na ponta.
+        """
+        if user_exercise_id not in self._exercises:
+            return None
+        links = self._prev if direction < 0 else self._next
+        neighbor_id = links[user_exercise_id]
+        if neighbor_id is None:
+            return None
+        self._record(("swap", user_exercise_id, neighbor_id))
+        return neighbor_id
+
+    def undo(self):
+        """Desfaz a última operação; retorna-a (ou None se não houver)."""
+        if not self._undo:
+            return None
+        operation = self._undo.pop()
+        self._apply(operation, reverse=True)
+        self._redo.append(operation)
+        return operation
+
+    def redo(self):
+        """Refaz a última operação desfeita; retorna-a (ou None se não houver)."""
+        if not self._redo:
+            return None
+        operation = self._redo.pop()
+        self._apply(operation)
+        self._undo.append(operation)
+        return operation
+
+    # --- Internos ---
+
+    def _allocate_temp_id(self):
+        temp_id = self._next_temp_id
+        self._next_temp_id -= 1
+        return temp_id
+
+    def _record(self, operation):
+        self._apply(operation)
+        self._undo.append(operation)
+        self._redo.clear()
+
+    def _apply(self, operation, reverse=False):
+        kind = operation[0]
+        if kind == "title":
+            _, old, new = operation
+            self.title = old if reverse else new
+        elif kind == "series":
+            _, user_exercise_id, old, new = operation
+            self._exercises[user_exercise_id].series = old if reverse else new
+        elif kind == "replace":
+            _, user_exercise_id, old, new = operation
+            exercise = self._exercises[user_exercise_id]
+            exercise.master_exercise_id, exercise.name = old if reverse else new
+        elif kind == "swap":
+            # Trocar dois vizinhos é a sua própria inversa
+            _, first_id, second_id = operation
+            if self._next[first_id] == second_id:
+                self._swap_adjacent(first_id, second_id)
+            else:
+                self._swap_adjacent(second_id, first_id)
+        elif kind in ("add", "remove"):
+            _, exercise, after_id = operation
+            if (kind == "add") != reverse:
+                self._link_after(after_id, exercise)
+            else:
+                self._unlink(exercise.user_exercise_id)
+
+    def _link_after(self, after_id, exercise):
+        user_exercise_id = exercise.user_exercise_id
+        next_id = self._head if after_id is None else self._next[after_id]
+        self._exercises[user_exercise_id] = exercise
+        self._prev[user_exercise_id] = after_id
+        self._next[user_exercise_id] = next_id
+        if after_id is None:
+            self._head = user_exercise_id
+        else:
+            self._next[after_id] = user_exercise_id
+        if next_id is None:
+            self._tail = user_exercise_id
+        else:
+            self._prev[next_id] = user_exercise_id
+
+    def _unlink(self, user_exercise_id):
+        prev_id = self._prev.pop(user_exercise_id)
+        next_id = self._next.pop(user_exercise_id)
+        del self._exercises[user_exercise_id]
+        if prev_id is None:
+            self._head = next_id
+        else:
+            self._next[prev_id] = next_id
+        if next_id is None:
+            self._tail = prev_id
+        else:
+            self._prev[next_id] = prev_id
+
+    def _swap_adjacent(self, first_id, second_id):
+        """Troca dois nós vizinhos, sendo second_id o sucessor de first_id."""
+        before = self._prev[first_id]
+        after = self._next[second_id]
+        self._prev[second_id], self._next[second_id] = before, first_id
+        self._prev[first_id], self._next[first_id] = second_id, after
+        if before is None:
+            self._head = second_id
+        else:
+            self._next[before] = second_id
+        if after is None:
+            self._tail = first_id
+        else:
+            self._prev[after] = first_id